@@ -1,25 +1,54 @@
 import os
+import logging
 from datetime import timedelta
-from flask import Flask, render_template, redirect, url_for
+from flask import Flask, render_template, redirect, request, url_for
 from flask_cors import CORS
-from flask_socketio import join_room
-from extensions import jwt, bcrypt, socketio, init_mongodb
-from models import User, Service
+from flask_socketio import join_room, leave_room
+from extensions import jwt, bcrypt, socketio, init_mongodb, socketio_async_mode, SOCKET_MESSAGE_QUEUE, SOCKET_CHANNEL
+from presence import presence
+from logging_config import configure_logging, init_request_ids
+from metrics import init_metrics
+from realtime import (authenticate_socket, socket_identity, socket_name, can_join_room, can_join_booking,
+                      can_track_provider, resolve_provider_user_id, parse_fixes, record_provider_fixes,
+                      user_room, provider_room, booking_room, tracking_room)
+
+logger = logging.getLogger(__name__)
 
 
 def create_app():
+    """Build the app without touching the network, so gunicorn can preload it before forking
+
+    Mongo connects on the first query in each worker; seed data with `python db_manager.py seed`.
+    """
+    configure_logging()
     app = Flask(__name__)
 
     app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev-secret')
     app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY', 'dev-jwt-secret')
     app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(days=7)
 
+    # Upload limits: MAX_CONTENT_LENGTH bounds every request body (including
+    # each chunk of a resumable upload), UPLOAD_MAX_FILE_SIZE bounds a whole file
+    app.config['MAX_CONTENT_LENGTH'] = int(os.getenv('MAX_CONTENT_LENGTH', 16 * 1024 * 1024))
+    app.config['UPLOAD_MAX_FILE_SIZE'] = int(os.getenv('UPLOAD_MAX_FILE_SIZE', 20 * 1024 * 1024))
+    app.config['UPLOAD_CHUNK_SIZE'] = min(int(os.getenv('UPLOAD_CHUNK_SIZE', 1024 * 1024)),
+                                          app.config['MAX_CONTENT_LENGTH'])
+    # Unfinished resumable uploads: at most UPLOAD_MAX_OPEN per provider, deleted
+    # with their partial files once older than UPLOAD_EXPIRY_HOURS
+    app.config['UPLOAD_MAX_OPEN'] = int(os.getenv('UPLOAD_MAX_OPEN', 10))
+    app.config['UPLOAD_EXPIRY_HOURS'] = int(os.getenv('UPLOAD_EXPIRY_HOURS', 24))
+
     # Init extensions
     CORS(app)
-    init_mongodb()  # Initialize MongoDB connection
+    init_request_ids(app)
+    init_metrics(app)
+    init_mongodb()  # Registers the connection; nothing is opened until the first query
     jwt.init_app(app)
     bcrypt.init_app(app)
-    socketio.init_app(app, async_mode='threading', cors_allowed_origins="*")
+    socketio.init_app(app, async_mode=socketio_async_mode(), cors_allowed_origins="*",
+                      message_queue=SOCKET_MESSAGE_QUEUE, channel=SOCKET_CHANNEL)
+    # A provider with any page open stays online, heartbeat or not
+    presence.is_connected = lambda sid: socketio.server.manager.is_connected(sid, '/')
 
     # Register blueprints
     from routes.auth import auth_bp
@@ -56,65 +85,104 @@ def create_app():
 
     # Socket events
     @socketio.on('connect')
-    def on_connect():
-        print('Client connected')
+    def on_connect(auth=None):
+        user_id = authenticate_socket(auth)
+        if user_id:
+            join_room(user_room(user_id))
+            if socket_identity()[1] == 'provider':
+                presence.connect(user_id, request.sid)
+        logger.debug('Client connected (%s)', user_id or 'anonymous')
     
     @socketio.on('disconnect')
     def on_disconnect():
-        print('Client disconnected')
+        presence.disconnect(request.sid)
+        logger.debug('Client disconnected')
+    
+    @socketio.on('presence_heartbeat')
+    def on_presence_heartbeat(data=None):
+        return {'ok': presence.heartbeat(request.sid)}
     
     @socketio.on('join')
     def on_join(data):
         try:
             room = data.get('room')
-            if room:
-                join_room(room)
-                print(f'Client joined room: {room}')
-        except Exception as e:
-            print(f'Error in join event: {e}')
+            user_id, role = socket_identity()
+            if not can_join_room(user_id, role, room):
+                logger.info('Refused join to room %s for %s', room, user_id or 'anonymous')
+                return {'ok': False, 'message': 'Not allowed to join this room'}
+            join_room(room)
+            logger.debug('Client joined room: %s', room)
+            return {'ok': True}
+        except Exception:
+            logger.exception('Error in join event')
     
     @socketio.on('join_provider_room')
     def on_join_provider_room(data):
         try:
             provider_id = data.get('provider_id')
-            if provider_id:
-                join_room(f"provider_{provider_id}")
-                join_room('all_providers')
-                print(f'Provider {provider_id} joined rooms')
-        except Exception as e:
-            print(f'Error in join_provider_room event: {e}')
+            user_id, role = socket_identity()
+            if not provider_id or role != 'provider' or str(provider_id) != user_id:
+                return {'ok': False, 'message': 'Not allowed to join this room'}
+            join_room(provider_room(provider_id))
+            join_room('all_providers')
+            logger.debug('Provider %s joined rooms', provider_id)
+            return {'ok': True}
+        except Exception:
+            logger.exception('Error in join_provider_room event')
     
     @socketio.on('join_booking_room')
     def on_join_booking_room(data):
         try:
             booking_id = data.get('booking_id')
-            if booking_id:
-                join_room(f"booking_{booking_id}")
-                print(f'Client joined booking room: {booking_id}')
-        except Exception as e:
-            print(f'Error in join_booking_room event: {e}')
-
-    # Seed minimal services if empty
-    with app.app_context():
+            user_id, role = socket_identity()
+            if not booking_id or not can_join_booking(user_id, role, booking_id):
+                return {'ok': False, 'message': 'Not allowed to join this room'}
+            join_room(booking_room(booking_id))
+            logger.debug('Client joined booking room: %s', booking_id)
+            return {'ok': True}
+        except Exception:
+            logger.exception('Error in join_booking_room event')
+    
+    @socketio.on('track_provider')
+    def on_track_provider(data):
         try:
-            if Service.objects.count() == 0:
-                services = [
-                    Service(name='Electrician', category='Electrical', base_price=20.0),
-                    Service(name='Plumber', category='Plumbing', base_price=18.0),
-                    Service(name='Carpenter', category='Woodwork', base_price=22.0),
-                    Service(name='Cleaner', category='Cleaning', base_price=15.0),
-                ]
-                for service in services:
-                    service.save()
-        except Exception as e:
-            print(f"Error seeding services: {e}")
+            provider_user_id = resolve_provider_user_id(data.get('provider_id'))
+            user_id, role = socket_identity()
+            if not can_track_provider(user_id, role, provider_user_id):
+                return {'ok': False, 'message': 'Not allowed to track this provider'}
+            join_room(tracking_room(provider_user_id))
+            return {'ok': True, 'provider_id': provider_user_id}
+        except Exception:
+            logger.exception('Error in track_provider event')
+    
+    @socketio.on('untrack_provider')
+    def on_untrack_provider(data):
+        provider_user_id = resolve_provider_user_id(data.get('provider_id'))
+        if provider_user_id:
+            leave_room(tracking_room(provider_user_id))
+        return {'ok': True}
+
+    @socketio.on('provider_ping')
+    def on_provider_ping(data):
+        """GPS fixes from a provider socket authenticated at connect"""
+        user_id, role = socket_identity()
+        if role != 'provider':
+            return {'ok': False, 'message': 'Only providers can send location pings'}
+        presence.heartbeat(request.sid)
+        try:
+            fixes = parse_fixes(data)
+        except ValueError as e:
+            return {'ok': False, 'message': str(e)}
+        try:
+            position = record_provider_fixes(user_id, socket_name(), fixes)
+            return {'ok': True, 'accepted': len(fixes), 'at': position['at'].isoformat()}
+        except Exception:
+            logger.exception('Error in provider_ping event')
+            return {'ok': False, 'message': 'Could not record location'}
 
     return app
 
 
-app = create_app()
-
-
 if __name__ == '__main__':
     port = int(os.getenv('PORT', 5000))
-    socketio.run(app, host='0.0.0.0', port=port)
+    socketio.run(create_app(), host='0.0.0.0', port=port)
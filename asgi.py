@@ -0,0 +1,19 @@
+"""
+ASGI entry point: the async read tier in front of the Flask app.
+
+    uvicorn asgi:app --workers 4
+
+async_api serves /providers/nearby, /services, /bookings/user and
+/providers/<id>/track on the event loop through motor; every other HTTP
+request runs the Flask app in uvicorn's thread pool. Socket.IO is not served
+here: keep the gunicorn tier (wsgi:app) for /socket.io and route the hot read
+paths to this one at the load balancer, or run this alone for an API-only
+deployment.
+"""
+from asgiref.wsgi import WsgiToAsgi
+
+from app import create_app
+from async_api import AsyncAPI
+
+flask_app = create_app()
+app = AsyncAPI(fallback=WsgiToAsgi(flask_app))
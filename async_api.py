@@ -0,0 +1,365 @@
+"""
+Async read tier: the hottest read endpoints on asyncio and motor.
+
+  GET /providers/nearby
+  GET /services
+  GET /bookings/user
+  GET /providers/<id>/track
+
+Responses match the Flask routes of the same paths. Independent lookups run
+concurrently with asyncio.gather and per-row lookups are batched with $in, so
+a request costs about two round trips to Mongo instead of one per provider or
+booking, and a slow query holds no worker thread. Any other request falls
+through to the Flask app (see asgi.py).
+
+Differences from the Flask routes:
+  - positions come from Mongo only; pings buffered in a gunicorn worker and
+    not yet flushed (LOCATION_FLUSH_INTERVAL) are not visible here
+  - provider online status comes from the other workers over
+    SOCKET_MESSAGE_QUEUE, as this process holds no sockets itself
+"""
+
+import asyncio
+import json
+import os
+import re
+import time
+from datetime import datetime
+from urllib.parse import parse_qs
+
+import jwt
+from bson import ObjectId
+from bson.errors import InvalidId
+from motor.motor_asyncio import AsyncIOMotorClient
+from mongoengine.connection import DEFAULT_CONNECTION_NAME, DEFAULT_DATABASE_NAME
+
+from catalog import CATALOG_CACHE, CatalogSnapshot
+from database import HOT_READ_ALIAS, connection_settings, pool_stats
+from metrics import command_metrics
+from eta import eta
+from models import Booking, CacheVersion, Payment, Provider, Service, User
+from presence import presence
+from routes.provider import hourly_rate_for, rank_nearby, skills_match
+
+DEFAULT_LAT, DEFAULT_LON = 28.6139, 77.2090  # Delhi
+
+
+class HTTPError(Exception):
+    def __init__(self, status, body):
+        super().__init__(body)
+        self.status = status
+        self.body = body
+
+
+class Request:
+    def __init__(self, scope, params):
+        self.scope = scope
+        self.params = params
+        self.args = {k: v[0] for k, v in parse_qs(scope.get('query_string', b'').decode('latin-1')).items()}
+        self.headers = {k.decode('latin-1').lower(): v.decode('latin-1') for k, v in scope.get('headers', [])}
+
+    def header_tokens(self, name):
+        """Comma-separated header values, e.g. If-None-Match or Accept-Encoding"""
+        return [t.strip() for t in self.headers.get(name, '').split(',') if t.strip()]
+
+
+class Response:
+    def __init__(self, body=b'', status=200, content_type='application/json', headers=()):
+        self.body = body
+        self.status = status
+        self.headers = [(b'content-type', content_type.encode())] if body or status != 304 else []
+        self.headers += [(k.encode(), v.encode()) for k, v in headers]
+
+
+def json_response(data, status=200):
+    return Response(json.dumps(data, separators=(',', ':')).encode('utf-8'), status)
+
+
+class Mongo:
+    """One motor client per alias, created on first use inside the running loop"""
+
+    def __init__(self):
+        self._clients = {}
+
+    def db(self, alias=DEFAULT_CONNECTION_NAME):
+        client = self._clients.get(alias)
+        if client is None:
+            # Same URI, pool size and read preference as the mongoengine alias
+            client = AsyncIOMotorClient(event_listeners=[pool_stats[alias], command_metrics],
+                                        **connection_settings(alias))
+            self._clients[alias] = client
+        return client.get_default_database(DEFAULT_DATABASE_NAME)
+
+    def collection(self, model, alias=DEFAULT_CONNECTION_NAME):
+        return self.db(alias)[model._get_collection_name()]
+
+    def close(self):
+        for client in self._clients.values():
+            client.close()
+        self._clients = {}
+
+
+def static_url(path):
+    return f'/static/{path}'
+
+
+class AsyncCatalog:
+    """catalog.ServiceCatalog for the event loop: same version check, same snapshot"""
+
+    def __init__(self, check_interval=None):
+        self.check_interval = float(check_interval if check_interval is not None
+                                    else os.getenv('CATALOG_VERSION_CHECK_INTERVAL', 1.0))
+        self._snapshot = None
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+
+    def _fresh(self):
+        return self._snapshot is not None and time.monotonic() - self._checked_at < self.check_interval
+
+    async def current(self, mongo):
+        if self._fresh():
+            return self._snapshot
+        async with self._lock:
+            if self._fresh():
+                return self._snapshot
+            doc = await mongo.collection(CacheVersion).find_one({'_id': CATALOG_CACHE}, {'version': 1})
+            version = doc['version'] if doc else 0
+            if self._snapshot is None or self._snapshot.version != version:
+                docs = await mongo.collection(Service).find().to_list(None)
+                self._snapshot = CatalogSnapshot(version, [Service._from_son(d) for d in docs], image_url=static_url)
+            self._checked_at = time.monotonic()
+            return self._snapshot
+
+
+def jwt_user_id(request, optional=False):
+    """User id from a Flask-JWT-Extended access token, with its error responses"""
+    header = request.headers.get('authorization', '')
+    if not header.startswith('Bearer '):
+        if optional:
+            return None
+        raise HTTPError(401, {'msg': 'Missing Authorization Header'})
+    try:
+        claims = jwt.decode(header[len('Bearer '):], os.getenv('JWT_SECRET_KEY', 'dev-jwt-secret'),
+                            algorithms=['HS256'])
+    except jwt.ExpiredSignatureError:
+        raise HTTPError(401, {'msg': 'Token has expired'})
+    except jwt.InvalidTokenError as e:
+        raise HTTPError(422, {'msg': str(e)})
+    if claims.get('type') != 'access':
+        raise HTTPError(422, {'msg': 'Only non-refresh tokens are allowed'})
+    ident = claims.get('sub')
+    return str(ident) if isinstance(ident, str) else str(ident.get('id') or ident)
+
+
+def _object_id(value):
+    try:
+        return ObjectId(value)
+    except (InvalidId, TypeError):
+        return None
+
+
+def _iso(value):
+    return value.isoformat() if value else None
+
+
+def serialize_booking(doc, service, payment_status):
+    """routes.booking.serialize_booking for a raw bookings document"""
+    return {
+        'id': str(doc['_id']),
+        'user_id': str(doc['user']) if doc.get('user') else None,
+        'provider_id': str(doc['provider']) if doc.get('provider') else None,
+        'service_id': str(doc['service']) if doc.get('service') else None,
+        'service_name': service.name if service else None,
+        'status': doc.get('status', 'Pending'),
+        'scheduled_time': _iso(doc.get('scheduled_time')),
+        'price': doc.get('price', 0.0),
+        'location_lat': doc.get('location_lat'),
+        'location_lon': doc.get('location_lon'),
+        'notes': doc.get('notes'),
+        'rating': doc.get('rating'),
+        'review': doc.get('review'),
+        'completion_notes': doc.get('completion_notes'),
+        'completion_images': doc.get('completion_images') or [],
+        'completed_at': _iso(doc.get('completed_at')),
+        'created_at': _iso(doc.get('created_at')),
+        'has_payment': doc.get('payment') is not None,
+        'payment_status': payment_status,
+    }
+
+
+class AsyncAPI:
+    """ASGI app for the async read endpoints; everything else goes to `fallback`"""
+
+    def __init__(self, fallback=None):
+        self.fallback = fallback
+        self.mongo = Mongo()
+        self.catalog = AsyncCatalog()
+        self.routes = [
+            (re.compile(r'^/providers/nearby$'), self.providers_nearby),
+            (re.compile(r'^/services$'), self.list_services),
+            (re.compile(r'^/bookings/user$'), self.user_bookings),
+            (re.compile(r'^/providers/(?P<provider_id>[^/]+)/track$'), self.track_provider),
+        ]
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self._lifespan(receive, send)
+        if scope['type'] == 'http' and scope['method'] in ('GET', 'HEAD'):
+            for pattern, handler in self.routes:
+                match = pattern.match(scope['path'])
+                if match:
+                    return await self._handle(handler, Request(scope, match.groupdict()), send)
+        if scope['type'] == 'http' and self.fallback is not None:
+            return await self.fallback(scope, receive, send)
+        if scope['type'] == 'websocket':
+            # Socket.IO stays on the gunicorn tier
+            return await send({'type': 'websocket.close', 'code': 1000})
+        await self._send(send, json_response({'message': 'Not found'}, 404), scope['method'] == 'HEAD')
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.mongo.close()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _handle(self, handler, request, send):
+        try:
+            response = await handler(request)
+        except HTTPError as e:
+            response = json_response(e.body, e.status)
+        await self._send(send, response, request.scope['method'] == 'HEAD')
+
+    @staticmethod
+    async def _send(send, response, head=False):
+        headers = response.headers + [(b'content-length', str(len(response.body)).encode())]
+        await send({'type': 'http.response.start', 'status': response.status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': b'' if head else response.body})
+
+    async def providers_nearby(self, request):
+        jwt_user_id(request, optional=True)
+        try:
+            lat = float(request.args.get('lat'))
+            lon = float(request.args.get('lon'))
+        except Exception:
+            lat, lon = DEFAULT_LAT, DEFAULT_LON
+        service_type = request.args.get('service_type', '').lower()
+        online_only = request.args.get('online') in ('1', 'true')
+
+        # A provider list a few seconds stale is fine; keep this read off the write pool
+        users, providers = await asyncio.gather(
+            self.mongo.collection(User, HOT_READ_ALIAS).find(
+                {'role': 'provider'},
+                {'name': 1, 'latitude': 1, 'longitude': 1, 'rating': 1, 'avatar_path': 1, 'provider_profile': 1}
+            ).to_list(None),
+            self.mongo.collection(Provider, HOT_READ_ALIAS).find({}, {'skills': 1, 'availability': 1}).to_list(None),
+        )
+        profiles = {p['_id']: p for p in providers}
+        online = presence.online_among(u['_id'] for u in users)
+
+        matches = []
+        for u in users:
+            provider = profiles.get(u.get('provider_profile'))
+            if not provider or (online_only and str(u['_id']) not in online):
+                continue
+            skills = provider.get('skills') or []
+            if service_type and not skills_match(service_type, skills):
+                continue
+            matches.append((u, provider, skills))
+
+        jobs = {}
+        if matches:
+            async for row in self.mongo.collection(Booking, HOT_READ_ALIAS).aggregate([
+                {'$match': {'provider': {'$in': [p['_id'] for _, p, _ in matches]}}},
+                {'$group': {'_id': '$provider', 'count': {'$sum': 1}}},
+            ]):
+                jobs[row['_id']] = row['count']
+
+        results = []
+        for u, provider, skills in matches:
+            hourly_rate = hourly_rate_for(skills)
+            results.append({
+                'id': str(provider['_id']),
+                'name': u.get('name'),
+                'skills': skills,
+                'rating': u.get('rating') or 5.0,
+                'hourly_rate': hourly_rate,
+                'price': hourly_rate,  # For backward compatibility
+                'lat': u['latitude'] if u.get('latitude') is not None else DEFAULT_LAT,
+                'lon': u['longitude'] if u.get('longitude') is not None else DEFAULT_LON,
+                'jobs_count': jobs.get(provider['_id'], 0),
+                'avatar': u.get('avatar_path'),
+                'availability': provider.get('availability', True),
+                'online': str(u['_id']) in online,
+            })
+        return json_response(rank_nearby(results, lat, lon))
+
+    async def list_services(self, request):
+        snapshot = await self.catalog.current(self.mongo)
+        etag = f'"{snapshot.etag}"'
+        wanted = [t[2:] if t.startswith('W/') else t for t in request.header_tokens('if-none-match')]
+        headers = [('etag', etag), ('vary', 'Accept-Encoding')]
+        if etag in wanted or '*' in wanted:
+            return Response(status=304, headers=headers)
+        encodings = {t.split(';')[0].strip(): t for t in request.header_tokens('accept-encoding')}
+        if 'gzip' in encodings and not re.search(r';\s*q=0(\.0*)?$', encodings['gzip']):
+            return Response(snapshot.gzip_bytes, headers=headers + [('content-encoding', 'gzip')])
+        return Response(snapshot.json_bytes, headers=headers)
+
+    async def user_bookings(self, request):
+        user_id = _object_id(jwt_user_id(request))
+        if user_id is None:
+            raise HTTPError(404, {'message': 'User not found'})
+        user, bookings, snapshot = await asyncio.gather(
+            self.mongo.collection(User).find_one({'_id': user_id}, {'_id': 1}),
+            self.mongo.collection(Booking).find({'user': user_id}).sort('created_at', -1).to_list(None),
+            self.catalog.current(self.mongo),
+        )
+        if not user:
+            raise HTTPError(404, {'message': 'User not found'})
+
+        payment_ids = [b['payment'] for b in bookings if b.get('payment')]
+        statuses = {}
+        if payment_ids:
+            async for p in self.mongo.collection(Payment).find({'_id': {'$in': payment_ids}}, {'status': 1}):
+                statuses[p['_id']] = p.get('status', 'Pending')
+        return json_response([serialize_booking(b, snapshot.get(b.get('service')), statuses.get(b.get('payment')))
+                              for b in bookings])
+
+    async def track_provider(self, request):
+        user_id = _object_id(jwt_user_id(request))
+        provider_id = _object_id(request.params['provider_id'])
+        if provider_id is None:
+            raise HTTPError(400, {'message': 'Invalid provider ID'})
+        fields = {'name': 1, 'role': 1, 'latitude': 1, 'longitude': 1, 'address': 1}
+        provider_user, current_user = await asyncio.gather(
+            self.mongo.collection(User).find_one({'_id': provider_id}, fields),
+            self.mongo.collection(User).find_one({'_id': user_id}, fields) if user_id else asyncio.sleep(0),
+        )
+        if not provider_user or provider_user.get('role') != 'provider':
+            raise HTTPError(404, {'message': 'Provider not found'})
+        if not current_user:
+            raise HTTPError(404, {'message': 'User not found'})
+
+        if not (provider_user.get('latitude') and provider_user.get('longitude') and
+                current_user.get('latitude') and current_user.get('longitude')):
+            raise HTTPError(400, {'message': 'Location data not available'})
+        distance_km, eta_minutes = eta((provider_user['latitude'], provider_user['longitude']),
+                                       (current_user['latitude'], current_user['longitude']))
+        return json_response({
+            'provider_id': str(provider_user['_id']),
+            'provider_name': provider_user.get('name'),
+            'location': {
+                'lat': provider_user['latitude'],
+                'lon': provider_user['longitude'],
+                'address': provider_user.get('address')
+            },
+            'distance_km': distance_km,
+            'eta_minutes': eta_minutes,
+            'online': presence.is_online(provider_user['_id']),
+            'status': 'On the way',
+            'last_updated': datetime.utcnow().isoformat()
+        })
@@ -0,0 +1,237 @@
+"""
+In-memory prefix trie behind /services/suggest.
+
+The trie indexes service names, categories and provider skills. Services and
+categories are diffed against the catalog snapshot whenever its version moves;
+skills are reference counted (one count per provider offering them) and kept
+current by the add/remove-service endpoints, with a 'skills' version in
+cache_versions telling the other workers to re-count.
+"""
+
+import threading
+import time
+from collections import Counter
+
+from catalog import service_catalog, get_version, bump_version
+from models import Provider
+
+SKILLS_CACHE = 'skills'
+
+# Result order when a term is indexed under several kinds
+KIND_ORDER = {'service': 0, 'category': 1, 'skill': 2}
+
+
+def normalize(text):
+    return ' '.join((text or '').lower().split())
+
+
+class _Node:
+    __slots__ = ('children', 'entries')
+
+    def __init__(self):
+        self.children = {}
+        # (text, kind) -> refcount for terms ending at this node
+        self.entries = None
+
+
+class PrefixTrie:
+    """Prefix trie with reference-counted entries and one-edit fuzzy lookup
+
+    A term is indexed under its full text and under every later word, so
+    'tech' finds 'HVAC Technician'.
+    """
+
+    def __init__(self):
+        self.root = _Node()
+        self.size = 0
+
+    @staticmethod
+    def _keys(text):
+        words = normalize(text).split(' ')
+        return {' '.join(words[i:]) for i in range(len(words)) if words[i]}
+
+    def add(self, text, kind, count=1):
+        for key in self._keys(text):
+            node = self.root
+            for ch in key:
+                child = node.children.get(ch)
+                if child is None:
+                    child = node.children[ch] = _Node()
+                node = child
+            if node.entries is None:
+                node.entries = {}
+            if (text, kind) not in node.entries:
+                self.size += 1
+                node.entries[(text, kind)] = 0
+            node.entries[(text, kind)] += count
+
+    def remove(self, text, kind, count=1):
+        for key in self._keys(text):
+            path = [self.root]
+            for ch in key:
+                node = path[-1].children.get(ch)
+                if node is None:
+                    break
+                path.append(node)
+            else:
+                node = path[-1]
+                if not node.entries or (text, kind) not in node.entries:
+                    continue
+                node.entries[(text, kind)] -= count
+                if node.entries[(text, kind)] > 0:
+                    continue
+                del node.entries[(text, kind)]
+                self.size -= 1
+                if not node.entries:
+                    node.entries = None
+                # Prune branches that no longer lead to any entry
+                for depth in range(len(key), 0, -1):
+                    node = path[depth]
+                    if node.children or node.entries:
+                        break
+                    del path[depth - 1].children[key[depth - 1]]
+
+    def prefix(self, query, limit=10):
+        """Entries with a key starting with query, in key order"""
+        node = self.root
+        for ch in normalize(query):
+            node = node.children.get(ch)
+            if node is None:
+                return []
+        out = []
+        self._collect(node, limit, out, set())
+        return out
+
+    def _collect(self, node, limit, out, seen):
+        # Pre-order walk in key order: 'plumber' comes before 'plumber pipes'
+        stack = [node]
+        while stack:
+            n = stack.pop()
+            if n.entries:
+                for key in sorted(n.entries, key=lambda e: KIND_ORDER.get(e[1], 9)):
+                    if key not in seen:
+                        seen.add(key)
+                        out.append((key[0], key[1], n.entries[key]))
+                        if len(out) >= limit:
+                            return
+            stack.extend(n.children[ch] for ch in sorted(n.children, reverse=True))
+
+    def fuzzy(self, query, limit=10, exclude=()):
+        """Entries whose key starts with something within one edit of query"""
+        query = normalize(query)
+        if not query:
+            return []
+        # Walk the trie as a one-edit automaton: (node, chars of query consumed, edits used)
+        matched = {0: [], 1: []}
+        stack = [(self.root, 0, 0)]
+        visited = set()
+        while stack:
+            state = stack.pop()
+            if state in visited:
+                continue
+            visited.add(state)
+            node, i, edits = state
+            if i == len(query):
+                matched[edits].append(node)
+                continue
+            child = node.children.get(query[i])
+            if child is not None:
+                stack.append((child, i + 1, edits))
+            if edits == 0:
+                stack.append((node, i + 1, 1))  # extra character in the query
+                for ch, child in node.children.items():
+                    stack.append((child, i, 1))  # missing character
+                    if ch != query[i]:
+                        stack.append((child, i + 1, 1))  # wrong character
+        out = []
+        seen = set(exclude)
+        for node in matched[0] + matched[1]:
+            self._collect(node, limit, out, seen)
+            if len(out) >= limit:
+                break
+        return out
+
+
+class SuggestIndex:
+    """Process-wide suggestion index kept in step with the catalog and provider skills"""
+
+    def __init__(self, check_interval=None):
+        self.trie = PrefixTrie()
+        self.check_interval = check_interval if check_interval is not None else service_catalog.check_interval
+        self._catalog_version = None
+        self._catalog_terms = Counter()
+        self._skills_version = None
+        self._skills = Counter()
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _count_skills():
+        pipeline = [
+            {'$unwind': '$skills'},
+            {'$group': {'_id': '$skills', 'count': {'$sum': 1}}},
+        ]
+        return Counter({row['_id']: row['count'] for row in Provider._get_collection().aggregate(pipeline)
+                        if row['_id']})
+
+    def _apply(self, old, new, kind_of):
+        for term in old.keys() | new.keys():
+            delta = new.get(term, 0) - old.get(term, 0)
+            if delta > 0:
+                self.trie.add(*kind_of(term), count=delta)
+            elif delta < 0:
+                self.trie.remove(*kind_of(term), count=-delta)
+
+    def _refresh(self):
+        snapshot = service_catalog.current()
+        if snapshot.version != self._catalog_version:
+            terms = Counter()
+            for s in snapshot.services:
+                if s.name:
+                    terms[(s.name, 'service')] += 1
+                if s.category:
+                    terms[(s.category, 'category')] += 1
+            self._apply(self._catalog_terms, terms, lambda t: t)
+            self._catalog_terms = terms
+            self._catalog_version = snapshot.version
+
+        now = time.monotonic()
+        if self._skills_version is None or now - self._checked_at >= self.check_interval:
+            version = get_version(SKILLS_CACHE)
+            if version != self._skills_version:
+                skills = self._count_skills()
+                self._apply(self._skills, skills, lambda t: (t, 'skill'))
+                self._skills = skills
+                self._skills_version = version
+            self._checked_at = time.monotonic()
+
+    def suggest(self, query, limit=10):
+        """Prefix matches first, then one-edit fuzzy matches to fill up to limit"""
+        with self._lock:
+            self._refresh()
+            results = [dict(text=t, kind=k, count=c, fuzzy=False) for t, k, c in self.trie.prefix(query, limit)]
+            if len(results) < limit and len(normalize(query)) >= 3:
+                exclude = {(r['text'], r['kind']) for r in results}
+                results += [dict(text=t, kind=k, count=c, fuzzy=True)
+                            for t, k, c in self.trie.fuzzy(query, limit - len(results), exclude)]
+            return results
+
+    def skills_changed(self, added=(), removed=()):
+        """Apply one provider's skill edits here and tell the other workers to re-count"""
+        version = bump_version(SKILLS_CACHE)
+        with self._lock:
+            if self._skills_version is None:
+                return
+            for skill in added:
+                self._skills[skill] += 1
+                self.trie.add(skill, 'skill')
+            for skill in removed:
+                if self._skills[skill] > 0:
+                    self._skills[skill] -= 1
+                    self.trie.remove(skill, 'skill')
+            # Skip the re-count only if no other worker changed skills in between
+            if version == self._skills_version + 1:
+                self._skills_version = version
+
+
+suggest_index = SuggestIndex()
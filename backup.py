@@ -0,0 +1,292 @@
+"""
+Streaming backup and restore of the application's collections.
+
+A backup is a directory with one file per collection and a manifest.json:
+
+  <collection>.ndjson[.gz|.zst]  one MongoDB Extended JSON (canonical) document per line
+  <collection>.bson[.gz|.zst]    concatenated BSON documents, as mongodump writes them
+
+Documents stream from a raw pymongo cursor (in batches of page_size) straight
+into the compressor, so memory stays flat however large a collection is, and
+collections are dumped on parallel threads. BSON skips decoding entirely and
+restores byte for byte; NDJSON can be read with anything. zstd needs the
+zstandard package.
+
+Restore reads the manifest, inserts each collection in ordered insert_many
+batches (optionally dropping it first), and then builds the models' indexes,
+rebuilds the booking rollups and invalidates the service catalog cache; those
+are derived data and are not backed up, nor are cache versions or location
+trails (time-series, expiring).
+
+The backup is not a point-in-time snapshot: writes made while it runs may or
+may not be included. Stop writers, or use mongodump --oplog on a replica set,
+when that matters.
+"""
+
+import gzip
+import io
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_EXCEPTION
+from datetime import datetime
+
+from bson import json_util
+from bson.codec_options import CodecOptions
+from bson.raw_bson import RawBSONDocument
+from mongoengine.connection import get_db
+from pymongo.errors import BulkWriteError
+
+from models import (Service, User, Provider, Booking, Payment, ServiceCompletion, PaymentEvent,
+                    CompletionUpload)
+
+BACKUP_MODELS = [Service, User, Provider, Booking, Payment, ServiceCompletion, PaymentEvent, CompletionUpload]
+FORMATS = ('ndjson', 'bson')
+COMPRESSIONS = ('gzip', 'zstd', 'none')
+MANIFEST = 'manifest.json'
+
+_EXTENSIONS = {'gzip': '.gz', 'zstd': '.zst', 'none': ''}
+_RAW = CodecOptions(document_class=RawBSONDocument)
+_JSON_OPTIONS = json_util.CANONICAL_JSON_OPTIONS
+
+
+def default_collections():
+    return [model._get_collection_name() for model in BACKUP_MODELS]
+
+
+class Progress:
+    """Documents and bytes per collection, updated by the worker threads"""
+
+    def __init__(self, totals):
+        self.started = time.monotonic()
+        self.totals = totals  # estimated documents per collection
+        self.documents = {name: 0 for name in totals}
+        self.bytes = {name: 0 for name in totals}
+        self.done = set()
+        self._lock = threading.Lock()
+
+    def add(self, name, documents, nbytes):
+        with self._lock:
+            self.documents[name] += documents
+            self.bytes[name] += nbytes
+
+    def finish(self, name):
+        with self._lock:
+            self.done.add(name)
+
+    def snapshot(self):
+        """[(collection, documents, estimated total, bytes, finished)] and overall docs/sec, MB/sec"""
+        with self._lock:
+            rows = [(name, self.documents[name], self.totals[name], self.bytes[name], name in self.done)
+                    for name in self.totals]
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        return rows, sum(r[1] for r in rows) / elapsed, sum(r[3] for r in rows) / elapsed / 1e6
+
+
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise RuntimeError('zstd compression needs the zstandard package (pip install zstandard)')
+    return zstandard
+
+
+def _open_write(path, compression):
+    if compression == 'gzip':
+        return gzip.open(path, 'wb', compresslevel=6)
+    if compression == 'zstd':
+        return _zstandard().ZstdCompressor(level=3).stream_writer(open(path, 'wb'))
+    return open(path, 'wb')
+
+
+def _open_read(path, compression):
+    if compression == 'gzip':
+        return gzip.open(path, 'rb')
+    if compression == 'zstd':
+        return io.BufferedReader(_zstandard().ZstdDecompressor().stream_reader(open(path, 'rb')))
+    return open(path, 'rb')
+
+
+def _filename(name, fmt, compression):
+    return f'{name}.{fmt}{_EXTENSIONS[compression]}'
+
+
+def _raw_bytes(doc):
+    return doc.raw
+
+
+def _json_line(doc):
+    return (json_util.dumps(doc, json_options=_JSON_OPTIONS) + '\n').encode('utf-8')
+
+
+def _dump_collection(db, name, path, fmt, compression, page_size, progress):
+    if fmt == 'bson':
+        # Undecoded documents: their bytes go to the file as they came off the wire
+        cursor = db.get_collection(name, codec_options=_RAW).find({}, batch_size=page_size)
+        encode = _raw_bytes
+    else:
+        cursor = db[name].find({}, batch_size=page_size)
+        encode = _json_line
+    documents = 0
+    with _open_write(path, compression) as out:
+        chunk, count = [], 0
+        for doc in cursor:
+            chunk.append(encode(doc))
+            count += 1
+            if count == page_size:
+                data = b''.join(chunk)
+                out.write(data)
+                progress.add(name, count, len(data))
+                documents += count
+                chunk, count = [], 0
+        if chunk:
+            data = b''.join(chunk)
+            out.write(data)
+            progress.add(name, count, len(data))
+            documents += count
+    progress.finish(name)
+    return {'file': os.path.basename(path), 'documents': documents, 'bytes': os.path.getsize(path)}
+
+
+def _read_exact(stream, size):
+    data = stream.read(size)
+    while len(data) < size:
+        more = stream.read(size - len(data))
+        if not more:
+            raise ValueError('truncated BSON document')
+        data += more
+    return data
+
+
+def _read_documents(path, fmt, compression):
+    """(document, size in bytes) from a backup file, one at a time"""
+    with _open_read(path, compression) as stream:
+        if fmt == 'bson':
+            while True:
+                header = stream.read(4)
+                if not header:
+                    return
+                if len(header) < 4:
+                    header += _read_exact(stream, 4 - len(header))
+                size = int.from_bytes(header, 'little')
+                yield RawBSONDocument(header + _read_exact(stream, size - 4)), size
+        else:
+            for line in io.TextIOWrapper(stream, encoding='utf-8'):
+                if line.strip():
+                    yield json_util.loads(line, json_options=_JSON_OPTIONS), len(line)
+
+
+def _insert_batch(collection, batch):
+    try:
+        collection.insert_many(batch, ordered=True)
+    except BulkWriteError as e:
+        error = (e.details.get('writeErrors') or [{}])[0]
+        if error.get('code') == 11000:
+            raise RuntimeError(f"{collection.name}: document {error.get('op', {}).get('_id')} already exists "
+                               f"(restore with --drop to replace the collection)")
+        raise
+
+
+def _restore_collection(db, name, path, fmt, compression, page_size, drop, progress):
+    collection = db[name]
+    if drop:
+        collection.drop()
+    documents, batch, batch_bytes = 0, [], 0
+    for doc, size in _read_documents(path, fmt, compression):
+        batch.append(doc)
+        batch_bytes += size
+        if len(batch) == page_size:
+            _insert_batch(collection, batch)
+            progress.add(name, len(batch), batch_bytes)
+            documents += len(batch)
+            batch, batch_bytes = [], 0
+    if batch:
+        _insert_batch(collection, batch)
+        progress.add(name, len(batch), batch_bytes)
+        documents += len(batch)
+    progress.finish(name)
+    return {'documents': documents}
+
+
+def _run(jobs, workers, progress, on_progress, interval):
+    """Run {collection: callable} on a thread pool, reporting progress every `interval` seconds"""
+    results = {}
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = {pool.submit(job): name for name, job in jobs.items()}
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, timeout=interval, return_when=FIRST_EXCEPTION)
+            for future in done:
+                results[futures[future]] = future.result()  # re-raises a worker's error
+            if on_progress:
+                on_progress(progress)
+    return results
+
+
+def backup(path, collections=None, fmt='ndjson', compression='gzip', page_size=1000, workers=4,
+           on_progress=None, interval=2.0):
+    """Dump collections into the directory `path`; returns the manifest"""
+    if fmt not in FORMATS or compression not in COMPRESSIONS:
+        raise ValueError(f'format must be one of {FORMATS} and compression one of {COMPRESSIONS}')
+    if compression == 'zstd':
+        _zstandard()
+    db = get_db()
+    collections = collections or default_collections()
+    os.makedirs(path, exist_ok=True)
+
+    progress = Progress({name: db[name].estimated_document_count() for name in collections})
+    jobs = {name: (lambda name=name: _dump_collection(
+        db, name, os.path.join(path, _filename(name, fmt, compression)), fmt, compression, page_size, progress))
+        for name in collections}
+    started = datetime.utcnow()
+    results = _run(jobs, workers, progress, on_progress, interval)
+
+    manifest = {
+        'created_at': started.isoformat(),
+        'database': db.name,
+        'format': fmt,
+        'compression': compression,
+        'collections': {name: results[name] for name in collections},
+    }
+    with open(os.path.join(path, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def read_manifest(path):
+    with open(os.path.join(path, MANIFEST)) as f:
+        return json.load(f)
+
+
+def restore(path, collections=None, page_size=1000, workers=4, drop=False, on_progress=None, interval=2.0):
+    """Load a backup directory written by backup(); returns {collection: {'documents': n}}"""
+    from catalog import bump_version, CATALOG_CACHE
+    from rollups import rebuild_rollups
+
+    manifest = read_manifest(path)
+    fmt, compression = manifest['format'], manifest['compression']
+    if compression == 'zstd':
+        _zstandard()
+    available = manifest['collections']
+    collections = collections or list(available)
+    missing = [name for name in collections if name not in available]
+    if missing:
+        raise ValueError(f"not in this backup: {', '.join(missing)}")
+
+    db = get_db()
+    progress = Progress({name: available[name]['documents'] for name in collections})
+    jobs = {name: (lambda name=name: _restore_collection(
+        db, name, os.path.join(path, available[name]['file']), fmt, compression, page_size, drop, progress))
+        for name in collections}
+    results = _run(jobs, workers, progress, on_progress, interval)
+
+    # Indexes are cheaper to build once the data is in
+    for model in BACKUP_MODELS:
+        if model._get_collection_name() in collections:
+            model.ensure_indexes()
+    if Booking._get_collection_name() in collections or Service._get_collection_name() in collections:
+        rebuild_rollups()
+    if Service._get_collection_name() in collections:
+        bump_version(CATALOG_CACHE)
+    return results
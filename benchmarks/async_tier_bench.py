@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Hot read endpoints: Flask under gunicorn (wsgi:app) vs. the async tier under
+uvicorn (asgi:app), at the same number of worker processes.
+
+Both servers are started here against the MongoDB in MONGODB_URI, which
+should hold realistic data (providers with bookings, a user with a booking
+history). The benchmark picks the user with the most bookings and a provider
+with a location, mints an access token for the user with JWT_SECRET_KEY, and
+then, per server and endpoint, keeps --concurrency keep-alive connections
+busy for --duration seconds and reports requests/sec, p50, p99 and errors.
+/track needs that user to have a location, or every request is a 400.
+
+Example:
+    MONGODB_URI=mongodb://localhost:27017/hofix python benchmarks/async_tier_bench.py \\
+        --workers 4 --concurrency 64 --duration 20
+"""
+import argparse
+import http.client
+import json
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+SERVERS = {
+    # gunicorn.conf.py reads PORT and GUNICORN_WORKERS from the environment
+    'flask': lambda port, workers: [
+        sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app'],
+    'async': lambda port, workers: [
+        sys.executable, '-m', 'uvicorn', 'asgi:app', '--host', '127.0.0.1', '--port', str(port),
+        '--workers', str(workers), '--no-access-log'],
+}
+
+
+def bench_identity():
+    """(access token of the user with most bookings, a provider user id with a location)"""
+    from mongoengine.connection import DEFAULT_DATABASE_NAME
+    from pymongo import MongoClient
+    from database import connection_settings
+    from models import Booking, User
+
+    settings = connection_settings()
+    db = MongoClient(settings.pop('host'), **settings).get_default_database(DEFAULT_DATABASE_NAME)
+    top = list(db[Booking._get_collection_name()].aggregate([
+        {'$group': {'_id': '$user', 'count': {'$sum': 1}}}, {'$sort': {'count': -1}}, {'$limit': 1}]))
+    provider = db[User._get_collection_name()].find_one({'role': 'provider', 'latitude': {'$ne': None}}, {'_id': 1})
+    if not top or not provider:
+        sys.exit('Need at least one booking and one provider with a location in MONGODB_URI')
+
+    from flask_jwt_extended import create_access_token
+    from app import create_app
+    with create_app().app_context():
+        token = create_access_token(identity=str(top[0]['_id']))
+    return token, str(provider['_id'])
+
+
+def start(name, port, workers, mode):
+    env = dict(os.environ, PORT=str(port), GUNICORN_WORKERS=str(workers), SOCKETIO_ASYNC_MODE=mode)
+    proc = subprocess.Popen(SERVERS[name](port, workers), cwd=ROOT, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(f'http://127.0.0.1:{port}/services', timeout=2) as response:
+                if response.status == 200:
+                    return proc
+        except OSError:
+            time.sleep(0.1)
+    stop(proc)
+    sys.exit(f'{name} server did not start on port {port}')
+
+
+def stop(proc):
+    proc.terminate()
+    try:
+        proc.wait(timeout=15)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait()
+
+
+def load(port, path, headers, concurrency, duration):
+    """Closed-loop load: every connection sends its next request when the last one returns"""
+    latencies, errors, lock = [], [0], threading.Lock()
+    stop_at = time.monotonic() + duration
+
+    def worker():
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        mine, failed = [], 0
+        while time.monotonic() < stop_at:
+            start = time.perf_counter()
+            try:
+                conn.request('GET', path, headers=headers)
+                response = conn.getresponse()
+                response.read()
+                if response.status != 200:
+                    failed += 1
+                    continue
+            except (OSError, http.client.HTTPException):
+                failed += 1
+                conn.close()
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+                continue
+            mine.append((time.perf_counter() - start) * 1000)
+        conn.close()
+        with lock:
+            latencies.extend(mine)
+            errors[0] += failed
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'rps': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(statistics.median(latencies), 2) if latencies else None,
+        'p99_ms': round(latencies[int(len(latencies) * 0.99) - 1], 2) if latencies else None,
+        'requests': len(latencies),
+        'errors': errors[0],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Flask vs. async tier on the hot read endpoints')
+    parser.add_argument('--workers', type=int, default=2, help='processes per server')
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds per endpoint')
+    parser.add_argument('--warmup', type=float, default=2.0)
+    parser.add_argument('--servers', default='flask,async')
+    parser.add_argument('--flask-mode', default='gevent', choices=['gevent', 'threading'],
+                        help='SOCKETIO_ASYNC_MODE, i.e. the gunicorn worker class')
+    parser.add_argument('--port', type=int, default=5077)
+    args = parser.parse_args()
+
+    token, provider_id = bench_identity()
+    auth = {'Authorization': f'Bearer {token}', 'Accept-Encoding': 'gzip'}
+    endpoints = {
+        'nearby': '/providers/nearby?lat=28.6139&lon=77.2090',
+        'services': '/services',
+        'bookings_user': '/bookings/user',
+        'track': f'/providers/{provider_id}/track',
+    }
+
+    report = {}
+    for name in args.servers.split(','):
+        proc = start(name, args.port, args.workers, args.flask_mode)
+        try:
+            report[name] = {}
+            for endpoint, path in endpoints.items():
+                load(args.port, path, auth, args.concurrency, args.warmup)
+                report[name][endpoint] = load(args.port, path, auth, args.concurrency, args.duration)
+                print(f"{name:6} {endpoint:14} {report[name][endpoint]}", file=sys.stderr)
+        finally:
+            stop(proc)
+
+    print(json.dumps({'workers': args.workers, 'concurrency': args.concurrency, 'results': report}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
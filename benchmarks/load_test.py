@@ -0,0 +1,465 @@
+#!/usr/bin/env python3
+"""
+End-to-end load test: virtual users run realistic scenarios against a live server.
+
+  customer  sign up, set a location, list services, look for providers nearby,
+            book one of the simulated providers, join the booking room over
+            Socket.IO, track the provider until the booking is completed, pay
+  provider  log in as a generated provider, open a socket, send provider_ping
+            fixes every --ping-interval seconds, poll the provider dashboard,
+            and accept, start and complete the bookings made with it
+  browser   log in as a generated customer and browse the map: nearby providers
+            around random points of a city, by service type, and suggestions
+
+Providers and browsers use accounts from generate_dataset.py (provider<i>@ and
+user<i>@loadtest.example.com, --password); customers sign up new accounts.
+Every virtual user loops its scenario until --duration is up; they start
+spread over --ramp-up seconds.
+
+Each HTTP request is recorded under its route ("GET /providers/<id>/track")
+and each acknowledged socket event as "WS <event>". The report gives
+requests/sec, p50/p90/p99/max latency and error rate per route, plus
+completed and failed iterations per scenario, and is written to --out with
+the commit it ran against. --compare checks it against an earlier report and
+fails (exit 1) when a route's p99 grew, or its throughput fell, by more than
+--tolerance, or its error rate rose by more than a percentage point.
+
+Example:
+    python generate_dataset.py --users 20000 --providers 2000 --bookings 200000
+    python benchmarks/load_test.py --url http://127.0.0.1:5000 --customers 50 --providers 20 \\
+        --browsers 100 --duration 120 --out load.json
+"""
+if __name__ == '__main__':
+    from gevent import monkey
+    monkey.patch_all()
+
+import argparse
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import time
+import uuid
+from collections import Counter, defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.socketio_bench import BenchClient
+from generate_dataset import CITIES
+
+SUGGEST_QUERIES = ['el', 'plu', 'clea', 'pai', 'car', 'hv', 'lock', 'gar']
+SERVICE_TYPES = ['electrician', 'plumber', 'cleaner', 'painter', 'carpenter', 'ac']
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    return sorted_values[max(0, min(len(sorted_values) - 1, math.ceil(p / 100 * len(sorted_values)) - 1))]
+
+
+class Recorder:
+    """Latencies and errors per route, iterations per scenario (greenlets share it without locks)"""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = Counter()
+        self.statuses = defaultdict(Counter)
+        self.iterations = Counter()
+        self.failures = Counter()
+
+    def record(self, route, ms, ok, status=None):
+        self.latencies[route].append(ms)
+        if not ok:
+            self.errors[route] += 1
+        if status is not None:
+            self.statuses[route][str(status)] += 1
+
+    def report(self, seconds):
+        routes = {}
+        for route, values in sorted(self.latencies.items()):
+            values = sorted(values)
+            routes[route] = {
+                'requests': len(values),
+                'rps': round(len(values) / seconds, 2),
+                'p50_ms': round(percentile(values, 50), 2),
+                'p90_ms': round(percentile(values, 90), 2),
+                'p99_ms': round(percentile(values, 99), 2),
+                'max_ms': round(values[-1], 2),
+                'error_rate': round(self.errors[route] / len(values), 4),
+                'statuses': dict(self.statuses[route]),
+            }
+        scenarios = {name: {'completed': self.iterations[name], 'failed': self.failures[name]}
+                     for name in sorted(set(self.iterations) | set(self.failures))}
+        return {'routes': routes, 'scenarios': scenarios}
+
+
+class ScenarioAbort(Exception):
+    """A step failed; the virtual user starts its next iteration"""
+
+
+class VirtualUser:
+    """One HTTP keep-alive session recording every request"""
+
+    def __init__(self, url, recorder):
+        import requests
+        self.url = url
+        self.recorder = recorder
+        self.session = requests.Session()
+
+    def login(self, token):
+        self.session.headers['Authorization'] = f'Bearer {token}'
+
+    def call(self, method, route, path, required=True, **kwargs):
+        """JSON body of the response; raises ScenarioAbort on failure when `required`"""
+        start = time.perf_counter()
+        try:
+            response = self.session.request(method, self.url + path, timeout=30, **kwargs)
+            body = response.json() if response.content and 'json' in response.headers.get('Content-Type', '') else None
+        except Exception as e:
+            self.recorder.record(f'{method} {route}', (time.perf_counter() - start) * 1000, False, 'exception')
+            if required:
+                raise ScenarioAbort(f'{method} {route}: {e}')
+            return None
+        ok = response.status_code < 400
+        self.recorder.record(f'{method} {route}', (time.perf_counter() - start) * 1000, ok, response.status_code)
+        if not ok and required:
+            raise ScenarioAbort(f'{method} {route}: {response.status_code}')
+        return body
+
+
+class ScenarioSocket(BenchClient):
+    """BenchClient that times acknowledged events and keeps the events pushed to it"""
+
+    def __init__(self, url, token, recorder):
+        start = time.perf_counter()
+        self.recorder = recorder
+        try:
+            super().__init__(url.replace('http', 'ws', 1), auth={'token': token})
+        except Exception as e:
+            recorder.record('WS connect', (time.perf_counter() - start) * 1000, False)
+            raise ScenarioAbort(f'socket connect: {e}')
+        recorder.record('WS connect', (time.perf_counter() - start) * 1000, True)
+        self.next_id = 0
+        self.events = defaultdict(list)
+
+    def _handle(self, packet):
+        """Ack body for '43<id>[...]' packets, None otherwise"""
+        if packet == '2':
+            self.ws.send('3')
+        elif isinstance(packet, str) and packet.startswith('42'):
+            name, *args = json.loads(packet[packet.index('['):])
+            self.events[name].append(args[0] if args else None)
+        elif isinstance(packet, str) and packet.startswith('43'):
+            bracket = packet.index('[')
+            return int(packet[2:bracket]), json.loads(packet[bracket:])
+        return None
+
+    def call(self, event, data, timeout=10.0):
+        """Emit with an ack and wait for it; the ack's first argument"""
+        ack_id = self.next_id
+        self.next_id += 1
+        start = time.perf_counter()
+        deadline = time.monotonic() + timeout
+        try:
+            self.ws.send(f'42{ack_id}' + json.dumps([event, data]))
+            while True:
+                remaining = deadline - time.monotonic()
+                packet = self.ws.receive(timeout=remaining) if remaining > 0 else None
+                if packet is None:
+                    raise TimeoutError('no ack')
+                ack = self._handle(packet)
+                if ack and ack[0] == ack_id:
+                    body = ack[1][0] if ack[1] else None
+                    break
+        except Exception as e:
+            self.recorder.record(f'WS {event}', (time.perf_counter() - start) * 1000, False)
+            raise ScenarioAbort(f'{event}: {e}')
+        ok = not isinstance(body, dict) or body.get('ok', True)
+        self.recorder.record(f'WS {event}', (time.perf_counter() - start) * 1000, ok)
+        if not ok:
+            raise ScenarioAbort(f"{event}: {body.get('message')}")
+        return body
+
+    def wait(self, seconds):
+        """Read pushed events for up to `seconds`"""
+        deadline = time.monotonic() + seconds
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            try:
+                packet = self.ws.receive(timeout=remaining)
+            except Exception:
+                return
+            if packet is None:
+                return
+            self._handle(packet)
+
+    def take(self, name):
+        events, self.events[name] = self.events[name], []
+        return events
+
+
+def _near(lat, lon, spread=0.03):
+    return round(lat + random.uniform(-spread, spread), 6), round(lon + random.uniform(-spread, spread), 6)
+
+
+class LoadTest:
+    def __init__(self, args):
+        self.args = args
+        self.recorder = Recorder()
+        self.stop_at = None
+        self.run_id = uuid.uuid4().hex[:8]
+        # Providers online in this run, for customers to book: {'provider_id', 'user_id', 'skills', 'lat', 'lon'}
+        self.providers = []
+
+    def running(self):
+        return time.monotonic() < self.stop_at
+
+    def scenario(self, name, step, *args):
+        """Run `step` until time is up, counting iterations"""
+        while self.running():
+            try:
+                if step(*args):
+                    self.recorder.iterations[name] += 1
+            except ScenarioAbort:
+                self.recorder.failures[name] += 1
+                time.sleep(self.args.think_time)
+
+    # Scenarios; each call is one iteration and returns whether it completed
+
+    def customer(self, number):
+        args = self.args
+        vu = VirtualUser(args.url, self.recorder)
+        email = f'load-{self.run_id}-{number}-{random.getrandbits(32):08x}@loadtest.example.com'
+        token = vu.call('POST', '/signup', '/signup', json={
+            'name': f'Load Customer {number}', 'email': email, 'phone': '+910000000000',
+            'password': args.password, 'role': 'user'})['access_token']
+        vu.login(token)
+        while not self.providers:
+            if not self.running():
+                return False
+            time.sleep(0.5)
+        provider = random.choice(self.providers)
+        lat, lon = _near(provider['lat'], provider['lon'])
+        vu.call('POST', '/profile/location', '/profile/location', json={'lat': lat, 'lon': lon})
+        services = vu.call('GET', '/services', '/services')
+        time.sleep(args.think_time)
+        vu.call('GET', '/providers/nearby', f'/providers/nearby?lat={lat}&lon={lon}')
+        time.sleep(args.think_time)
+
+        offered = [s for s in services if s.get('name') in provider['skills']] or services
+        service = random.choice(offered)
+        booking = vu.call('POST', '/bookings/create', '/bookings/create', json={
+            'service_id': service['id'], 'provider_id': provider['provider_id'], 'price': service.get('base_price'),
+            'location_lat': lat, 'location_lon': lon, 'notes': 'load test'})
+
+        socket = ScenarioSocket(args.url, token, self.recorder)
+        try:
+            socket.call('join_booking_room', {'booking_id': booking['id']})
+            status, polls, tracking = booking['status'], 0, False
+            deadline = time.monotonic() + args.booking_timeout
+            while status != 'Completed' and self.running() and time.monotonic() < deadline:
+                # Live location is only shared once the provider has accepted
+                if not tracking and status in ('Accepted', 'In Progress'):
+                    socket.call('track_provider', {'provider_id': provider['user_id']})
+                    tracking = True
+                vu.call('GET', '/providers/<id>/track', f"/providers/{provider['user_id']}/track", required=False)
+                socket.wait(args.track_interval)
+                for event in socket.take('booking_status'):
+                    if event and event.get('id') == booking['id']:
+                        status = event['status']
+                socket.events.clear()  # location updates
+                polls += 1
+                if polls % 5 == 0 and status != 'Completed':
+                    for b in vu.call('GET', '/bookings/user', '/bookings/user', required=False) or []:
+                        if b['id'] == booking['id']:
+                            status = b['status']
+        finally:
+            socket.close()
+        if status != 'Completed':
+            if not self.running():
+                return False
+            raise ScenarioAbort('booking not completed in time')
+
+        vu.call('POST', '/payments/mock', '/payments/mock', json={'booking_id': booking['id'], 'method': 'UPI'})
+        vu.call('GET', '/payments/<id>/status', f"/payments/{booking['id']}/status")
+        return True
+
+    def provider(self, index):
+        args = self.args
+        vu = VirtualUser(args.url, self.recorder)
+        token = vu.call('POST', '/login', '/login', json={
+            'email': f'provider{index}@loadtest.example.com', 'password': args.password})['access_token']
+        vu.login(token)
+        me = vu.call('GET', '/me', '/me')
+        if not me.get('provider_profile'):
+            raise ScenarioAbort(f'provider{index} has no provider profile')
+        _, lat, lon, _ = CITIES[index % len(CITIES)]
+        lat, lon = _near(lat, lon)
+
+        socket = ScenarioSocket(args.url, token, self.recorder)
+        entry = {'provider_id': me['provider_profile']['id'], 'user_id': me['id'],
+                 'skills': me['provider_profile']['skills'] or [], 'lat': lat, 'lon': lon}
+        jobs = {}  # booking id -> (stage, since)
+        try:
+            socket.call('join_provider_room', {'provider_id': me['id']})
+            self.providers.append(entry)
+            next_poll = 0.0
+            while self.running():
+                lat, lon = _near(lat, lon, 0.0003)
+                entry['lat'], entry['lon'] = lat, lon
+                socket.call('provider_ping', {'fixes': [[lat, lon, round(time.time(), 3)]]})
+                socket.wait(args.ping_interval)
+                now = time.monotonic()
+                for event in socket.take('booking_created'):
+                    if event and event.get('provider_id') == entry['provider_id']:
+                        jobs.setdefault(event['id'], ('new', now))
+                socket.events.clear()  # broadcasts to all providers
+                if now >= next_poll:
+                    next_poll = now + args.dashboard_interval
+                    for b in vu.call('GET', '/bookings/provider', '/bookings/provider', required=False) or []:
+                        if b.get('provider_id') == entry['provider_id'] and b['status'] == 'Pending':
+                            jobs.setdefault(b['id'], ('new', now))
+                for booking_id, (stage, since) in list(jobs.items()):
+                    if stage == 'new':
+                        vu.call('POST', '/bookings/accept', '/bookings/accept', json={'booking_id': booking_id})
+                        jobs[booking_id] = ('accepted', now)
+                    elif stage == 'accepted' and now - since >= args.job_seconds:
+                        vu.call('POST', '/bookings/update_status', '/bookings/update_status',
+                                json={'booking_id': booking_id, 'status': 'In Progress'})
+                        jobs[booking_id] = ('started', now)
+                    elif stage == 'started' and now - since >= args.job_seconds:
+                        del jobs[booking_id]
+                        vu.call('POST', '/completion/upload', '/completion/upload',
+                                json={'booking_id': booking_id, 'completion_notes': 'Done (load test)'})
+                        self.recorder.iterations['provider_job'] += 1
+        finally:
+            if entry in self.providers:
+                self.providers.remove(entry)
+            socket.close()
+        return False
+
+    def browser(self, index):
+        args = self.args
+        vu = VirtualUser(args.url, self.recorder)
+        token = vu.call('POST', '/login', '/login', json={
+            'email': f'user{index}@loadtest.example.com', 'password': args.password})['access_token']
+        vu.login(token)
+        vu.call('GET', '/services', '/services')
+        _, city_lat, city_lon, _ = random.choice(CITIES)
+        for _ in range(args.pages_per_visit):
+            if not self.running():
+                return False
+            lat, lon = _near(city_lat, city_lon, 0.1)
+            vu.call('GET', '/providers/nearby', f'/providers/nearby?lat={lat}&lon={lon}')
+            time.sleep(args.think_time)
+            vu.call('GET', '/providers/nearby', f'/providers/nearby?lat={lat}&lon={lon}'
+                                                f'&service_type={random.choice(SERVICE_TYPES)}')
+            time.sleep(args.think_time)
+            vu.call('GET', '/services/suggest', f'/services/suggest?q={random.choice(SUGGEST_QUERIES)}')
+            time.sleep(args.think_time)
+        return True
+
+    def run(self):
+        import gevent
+
+        args = self.args
+        users = ([('provider', self.provider, args.provider_offset + i) for i in range(args.providers)]
+                 + [('customer', self.customer, i) for i in range(args.customers)]
+                 + [('browser', self.browser, args.browser_offset + i) for i in range(args.browsers)])
+        random.shuffle(users)
+        started = time.monotonic()
+        self.stop_at = started + args.ramp_up + args.duration
+        greenlets = [gevent.spawn_later(args.ramp_up * i / max(len(users), 1), self.scenario, name, step, n)
+                     for i, (name, step, n) in enumerate(users)]
+        gevent.joinall(greenlets, timeout=args.ramp_up + args.duration + 60)
+        gevent.killall(greenlets, block=False)
+        return self.recorder.report(time.monotonic() - started)
+
+
+def current_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(report, baseline, tolerance):
+    """Lines describing each shared route's change, and whether any regressed"""
+    lines, regressed = [], False
+    for route, now in sorted(report['routes'].items()):
+        before = baseline.get('routes', {}).get(route)
+        if not before:
+            continue
+        problems = []
+        if before['p99_ms'] and now['p99_ms'] > before['p99_ms'] * (1 + tolerance):
+            problems.append('p99')
+        if now['rps'] < before['rps'] * (1 - tolerance):
+            problems.append('rps')
+        if now['error_rate'] > before['error_rate'] + 0.01:
+            problems.append('errors')
+        regressed = regressed or bool(problems)
+        lines.append(f"{route:32} rps {before['rps']:>8} -> {now['rps']:<8} p99 {before['p99_ms']:>8} -> "
+                     f"{now['p99_ms']:<8} errors {before['error_rate']:.2%} -> {now['error_rate']:.2%}"
+                     + (f"  REGRESSED ({', '.join(problems)})" if problems else ''))
+    return lines, regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='End-to-end load test against a live server')
+    parser.add_argument('--url', default='http://127.0.0.1:5000')
+    parser.add_argument('--customers', type=int, default=10, help='virtual users booking and paying')
+    parser.add_argument('--providers', type=int, default=5, help='virtual providers pinging and completing jobs')
+    parser.add_argument('--browsers', type=int, default=20, help='virtual users browsing the map')
+    parser.add_argument('--duration', type=float, default=60.0, help='seconds after ramp-up')
+    parser.add_argument('--ramp-up', type=float, default=10.0, help='seconds over which virtual users start')
+    parser.add_argument('--think-time', type=float, default=0.5, help='pause between a user\'s steps')
+    parser.add_argument('--ping-interval', type=float, default=1.0, help='seconds between provider fixes')
+    parser.add_argument('--dashboard-interval', type=float, default=10.0, help='seconds between provider dashboard polls')
+    parser.add_argument('--job-seconds', type=float, default=5.0, help='accepted-to-started and started-to-done time')
+    parser.add_argument('--track-interval', type=float, default=2.0, help='seconds between a customer\'s track requests')
+    parser.add_argument('--booking-timeout', type=float, default=120.0, help='give up on a booking after this long')
+    parser.add_argument('--pages-per-visit', type=int, default=5, help='map views per browser iteration')
+    parser.add_argument('--password', default='loadtest123', help='password of the generated accounts')
+    parser.add_argument('--provider-offset', type=int, default=0, help='first generated provider to log in as')
+    parser.add_argument('--browser-offset', type=int, default=0, help='first generated customer to log in as')
+    parser.add_argument('--out', default='load_test.json', help='report file')
+    parser.add_argument('--compare', help='earlier report to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed relative p99/rps change with --compare')
+    args = parser.parse_args()
+    if args.customers and not args.providers:
+        parser.error('customers book simulated providers: --providers must be at least 1')
+
+    result = LoadTest(args).run()
+    report = {
+        'commit': current_commit(),
+        'started_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'config': {k: v for k, v in vars(args).items() if k not in ('password', 'out', 'compare')},
+        **result,
+    }
+    with open(args.out, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    for route, stats in report['routes'].items():
+        print(f"{route:32} {stats['requests']:>7} req {stats['rps']:>8}/s  p50 {stats['p50_ms']:>8}  "
+              f"p99 {stats['p99_ms']:>8}  errors {stats['error_rate']:.2%}", file=sys.stderr)
+    for name, counts in report['scenarios'].items():
+        print(f"{name:32} {counts['completed']} completed, {counts['failed']} failed", file=sys.stderr)
+    print(f"Report written to {args.out}", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare) as f:
+            lines, regressed = compare(report, json.load(f), args.tolerance)
+        print('\n'.join(lines))
+        if regressed:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
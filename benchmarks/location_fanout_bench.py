@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Compare location fan-out: global broadcast (old behaviour) vs emitting to the
+provider's tracking and booking rooms.
+
+Runs in-process with Flask-SocketIO test clients, so it measures server-side
+packet fan-out only (no network, no database).
+
+Example:
+    python benchmarks/location_fanout_bench.py --connections 100,1000,5000 --watchers 10 --pings 200
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from flask_socketio import SocketIO, join_room
+
+from realtime import tracking_room, booking_room
+
+
+def run(connections, watchers, pings, scoped):
+    app = Flask(__name__)
+    server = SocketIO(app, async_mode='threading')
+
+    @server.on('join')
+    def on_join(room):
+        join_room(room)
+
+    clients = [server.test_client(app) for _ in range(connections)]
+    # Watchers split between the provider's tracking room and one active booking room
+    for i, c in enumerate(clients[:watchers]):
+        c.emit('join', tracking_room('p1') if i % 2 else booking_room('b1'))
+    for c in clients:
+        c.get_received()
+
+    rooms = [tracking_room('p1'), booking_room('b1')]
+    payload = {'provider_id': 'p1', 'lat': 28.61, 'lon': 77.21}
+    start = time.perf_counter()
+    for _ in range(pings):
+        if scoped:
+            server.emit('provider_location_update', payload, to=rooms)
+        else:
+            server.emit('provider_location_update', payload)
+    elapsed = time.perf_counter() - start
+
+    delivered = sum(len(c.get_received()) for c in clients)
+    for c in clients:
+        c.disconnect()
+    return {
+        'mode': 'rooms' if scoped else 'global',
+        'connections': connections,
+        'watchers': watchers,
+        'pings': pings,
+        'deliveries_per_ping': delivered / pings,
+        'ms_per_ping': round(elapsed * 1000 / pings, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Location fan-out benchmark')
+    parser.add_argument('--connections', default='100,1000,5000')
+    parser.add_argument('--watchers', type=int, default=10)
+    parser.add_argument('--pings', type=int, default=200)
+    args = parser.parse_args()
+
+    for connections in (int(n) for n in args.connections.split(',')):
+        for scoped in (False, True):
+            print(json.dumps(run(connections, min(args.watchers, connections), args.pings, scoped)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Load test the Razorpay gateway adapter against the in-process fake gateway.
+
+Example:
+    python benchmarks/payment_gateway_bench.py --threads 32 --orders 2000 --latency-ms 40 --failure-rate 0.02
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from payment_gateway import FakeRazorpayServer, RazorpayGateway, GatewayUnavailable
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Razorpay gateway adapter load test')
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--orders', type=int, default=1000)
+    parser.add_argument('--latency-ms', type=float, default=20.0)
+    parser.add_argument('--failure-rate', type=float, default=0.0)
+    parser.add_argument('--pool-size', type=int, default=16)
+    parser.add_argument('--read-timeout', type=float, default=2.0)
+    args = parser.parse_args()
+
+    server = FakeRazorpayServer(latency=args.latency_ms / 1000, failure_rate=args.failure_rate, seed=42).start()
+    gateway = RazorpayGateway('rzp_test_bench', 'test_secret_key', base_url=server.base_url,
+                              read_timeout=args.read_timeout, pool_size=args.pool_size)
+
+    def pay_once(i):
+        try:
+            order = gateway.create_order({'amount': 10000, 'currency': 'INR', 'receipt': f'bench_{i}'})
+        except GatewayUnavailable:
+            return False
+        payment_id, signature = server.capture_payment(order['id'])
+        return gateway.verify_payment_signature(order['id'], payment_id, signature)
+
+    print(f"Running {args.orders} orders on {args.threads} threads against {server.base_url}")
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        results = list(pool.map(pay_once, range(args.orders)))
+    elapsed = time.perf_counter() - start
+    server.stop()
+
+    print(f"Completed: {sum(results)}/{args.orders} in {elapsed:.2f}s ({args.orders / elapsed:.1f} orders/sec)")
+    print(f"Circuit breaker: {gateway.breaker.state}")
+    print(json.dumps(gateway.metrics.snapshot(), indent=2))
+
+
+if __name__ == '__main__':
+    main()
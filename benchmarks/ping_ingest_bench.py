@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Provider GPS ingestion: HTTP POST per fix vs. the provider_ping socket event.
+
+Runs against a live server with a provider's JWT. Each simulated device sends
+--fixes fixes in total, either one POST /providers/update-tracking-location
+per fix (http), one provider_ping per fix (socket), or provider_ping
+messages carrying --batch fixes each as JSON (socket-batch) or as a msgpack
+binary attachment (socket-msgpack). Socket senders keep up to --window pings
+awaiting their ack.
+
+Example:
+    python benchmarks/ping_ingest_bench.py --url http://127.0.0.1:5000 --token $PROVIDER_JWT \\
+        --modes http,socket,socket-batch,socket-msgpack --devices 20 --fixes 500 --batch 10
+"""
+if __name__ == '__main__':
+    from gevent import monkey
+    monkey.patch_all()
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.socketio_bench import BenchClient
+
+
+def _fixes(count, start_lat=28.6139, start_lon=77.2090):
+    """A device drifting across the city, one fix per second"""
+    t0 = time.time() - count
+    lat, lon = start_lat + random.uniform(-0.05, 0.05), start_lon + random.uniform(-0.05, 0.05)
+    fixes = []
+    for i in range(count):
+        lat += random.uniform(-0.0002, 0.0002)
+        lon += random.uniform(-0.0002, 0.0002)
+        fixes.append([round(lat, 6), round(lon, 6), round(t0 + i, 3)])
+    return fixes
+
+
+class PingClient(BenchClient):
+    """BenchClient that sends provider_ping with acks, JSON or msgpack"""
+
+    def __init__(self, url, token):
+        super().__init__(url, auth={'token': token})
+        self.next_id = 0
+        self.acked = 0
+        self.rejected = 0
+        self.fixes_acked = 0
+        self._sizes = {}
+
+    def ping(self, fixes, binary=False):
+        ack_id = self.next_id
+        self.next_id += 1
+        self._sizes[ack_id] = len(fixes)
+        if binary:
+            import msgpack
+            self.ws.send(f'451-{ack_id}' + json.dumps(['provider_ping', {'_placeholder': True, 'num': 0}]))
+            self.ws.send(msgpack.packb(fixes))
+        else:
+            self.ws.send(f'42{ack_id}' + json.dumps(['provider_ping', {'fixes': fixes}]))
+
+    def wait_acks(self, outstanding, deadline):
+        """Read until no more than `outstanding` pings lack an ack"""
+        while self.next_id - self.acked - self.rejected > outstanding:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                return False
+            packet = self.ws.receive(timeout=timeout)
+            if packet is None:
+                return False
+            if packet == '2':
+                self.ws.send('3')
+            elif isinstance(packet, str) and packet.startswith('43'):
+                start = packet.index('[')
+                body = json.loads(packet[start:])
+                size = self._sizes.pop(int(packet[2:start]), 0)
+                if body and body[0].get('ok'):
+                    self.acked += 1
+                    self.fixes_acked += size
+                else:
+                    self.rejected += 1
+        return True
+
+
+def run_http(args):
+    import gevent
+    import requests
+
+    def device(_):
+        session = requests.Session()
+        session.headers['Authorization'] = f'Bearer {args.token}'
+        ok = 0
+        for lat, lon, t in _fixes(args.fixes):
+            response = session.post(f'{args.url}/providers/update-tracking-location', json={'lat': lat, 'lon': lon})
+            ok += response.status_code == 200
+        return ok
+
+    start = time.perf_counter()
+    jobs = [gevent.spawn(device, i) for i in range(args.devices)]
+    gevent.joinall(jobs)
+    elapsed = time.perf_counter() - start
+    accepted = sum(j.value or 0 for j in jobs)
+    return {'mode': 'http', 'seconds': round(elapsed, 3), 'messages': accepted,
+            'fixes': accepted, 'fixes_per_sec': round(accepted / elapsed, 1)}
+
+
+def run_socket(args, batch, binary):
+    import gevent
+    from gevent.pool import Pool
+
+    ws_url = args.url.replace('http', 'ws', 1)
+
+    def connect(_):
+        for _attempt in range(3):
+            try:
+                return PingClient(ws_url, args.token)
+            except Exception:
+                continue
+        return None
+
+    # Sockets are long-lived on a device, so connecting is not part of the timing
+    clients = [c for c in Pool(args.devices).imap_unordered(connect, range(args.devices)) if c]
+    deadline = time.monotonic() + args.timeout
+
+    def device(client):
+        fixes = _fixes(args.fixes)
+        for i in range(0, len(fixes), batch):
+            client.ping(fixes[i:i + batch], binary=binary)
+            if not client.wait_acks(args.window, deadline):
+                return
+        client.wait_acks(0, deadline)
+
+    start = time.perf_counter()
+    gevent.joinall([gevent.spawn(device, c) for c in clients])
+    elapsed = time.perf_counter() - start
+    for c in clients:
+        c.close()
+
+    fixes = sum(c.fixes_acked for c in clients)
+    mode = 'socket-msgpack' if binary else ('socket-batch' if batch > 1 else 'socket')
+    return {'mode': mode, 'batch': batch, 'devices': len(clients), 'seconds': round(elapsed, 3),
+            'messages': sum(c.acked for c in clients), 'rejected': sum(c.rejected for c in clients),
+            'fixes': fixes, 'fixes_per_sec': round(fixes / elapsed, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Provider ping ingestion benchmark')
+    parser.add_argument('--url', default='http://127.0.0.1:5000')
+    parser.add_argument('--token', required=True, help="a provider's access token")
+    parser.add_argument('--modes', default='http,socket,socket-batch,socket-msgpack')
+    parser.add_argument('--devices', type=int, default=10)
+    parser.add_argument('--fixes', type=int, default=200, help='fixes sent per device')
+    parser.add_argument('--batch', type=int, default=10, help='fixes per message in batch modes')
+    parser.add_argument('--window', type=int, default=16, help='unacknowledged pings per socket')
+    parser.add_argument('--timeout', type=float, default=120.0)
+    args = parser.parse_args()
+
+    for mode in args.modes.split(','):
+        mode = mode.strip()
+        if mode == 'http':
+            result = run_http(args)
+        elif mode == 'socket':
+            result = run_socket(args, 1, False)
+        elif mode == 'socket-batch':
+            result = run_socket(args, args.batch, False)
+        elif mode == 'socket-msgpack':
+            result = run_socket(args, args.batch, True)
+        else:
+            parser.error(f'unknown mode {mode}')
+        print(json.dumps(result))
+
+
+if __name__ == '__main__':
+    main()
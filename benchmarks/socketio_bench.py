@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Compare Socket.IO async modes: open WebSocket connections and broadcast emits/sec.
+
+For each mode a gunicorn server is started with gunicorn.conf.py and a minimal
+app that shares extensions.socketio (no database needed). The client side runs
+on gevent so thousands of sockets fit in one process.
+
+Example:
+    python benchmarks/socketio_bench.py --modes threading,gevent --clients 500 --emits 200
+"""
+if __name__ == '__main__':
+    from gevent import monkey
+    monkey.patch_all()
+
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def create_bench_app():
+    """App served by gunicorn during a run: one event that broadcasts N messages"""
+    from flask import Flask
+    from extensions import socketio, socketio_async_mode
+
+    app = Flask(__name__)
+    socketio.init_app(app, async_mode=socketio_async_mode(), cors_allowed_origins="*")
+
+    @socketio.on('bench_broadcast')
+    def bench_broadcast(data):
+        payload = 'x' * int(data.get('size', 64))
+        for i in range(int(data.get('count', 100))):
+            socketio.emit('bench', {'i': i, 'payload': payload})
+        return 'ok'
+
+    return app
+
+
+class BenchClient:
+    """Bare engine.io v4 / socket.io v5 client over a single WebSocket"""
+
+    def __init__(self, url, auth=None):
+        import simple_websocket
+        self.ws = simple_websocket.Client(f"{url}/socket.io/?EIO=4&transport=websocket")
+        if not self.ws.receive(timeout=10).startswith('0'):
+            raise RuntimeError('no engine.io open packet')
+        self.ws.send('40' + (json.dumps(auth) if auth else ''))
+        if not self.ws.receive(timeout=10).startswith('40'):
+            raise RuntimeError('namespace connect refused')
+        self.received = 0
+
+    def emit(self, event, data):
+        self.ws.send('42' + json.dumps([event, data]))
+
+    def receive_until(self, count, deadline):
+        while self.received < count:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                return False
+            packet = self.ws.receive(timeout=timeout)
+            if packet is None:
+                return False
+            if packet == '2':
+                self.ws.send('3')
+            elif packet.startswith('42'):
+                self.received += 1
+        return True
+
+    def close(self):
+        try:
+            self.ws.close()
+        except Exception:
+            pass
+
+
+def _wait_for_port(port, timeout=20):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+def run_mode(mode, args):
+    import gevent
+    from gevent.pool import Pool
+
+    env = dict(os.environ, SOCKETIO_ASYNC_MODE=mode, PORT=str(args.port))
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'benchmarks.socketio_bench:create_bench_app()'],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    result = {'mode': mode, 'clients': args.clients, 'emits': args.emits}
+    clients = []
+    try:
+        if not _wait_for_port(args.port):
+            result['error'] = 'server did not start'
+            return result
+        url = f"ws://127.0.0.1:{args.port}"
+
+        def connect(_):
+            try:
+                return BenchClient(url)
+            except Exception:
+                return None
+
+        start = time.perf_counter()
+        clients = [c for c in Pool(args.concurrency).imap_unordered(connect, range(args.clients)) if c]
+        result['connected'] = len(clients)
+        result['connect_seconds'] = round(time.perf_counter() - start, 3)
+        if not clients:
+            return result
+
+        deadline = time.monotonic() + args.timeout
+        start = time.perf_counter()
+        for c in clients:
+            try:
+                c.emit('bench_broadcast', {'count': args.emits, 'size': args.payload})
+                break
+            except Exception:
+                continue  # closed by the server while others were connecting
+        done = gevent.joinall([gevent.spawn(c.receive_until, args.emits, deadline) for c in clients])
+        elapsed = time.perf_counter() - start
+
+        complete = sum(1 for g in done if g.value)
+        delivered = sum(c.received for c in clients)
+        result.update({
+            'complete_clients': complete,
+            'broadcast_seconds': round(elapsed, 3),
+            'emits_per_sec': round(args.emits / elapsed, 1),
+            'deliveries_per_sec': round(delivered / elapsed, 1),
+        })
+        return result
+    finally:
+        for c in clients:
+            c.close()
+        server.terminate()
+        try:
+            server.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            # Graceful shutdown waits for open sockets; the numbers are in already
+            server.kill()
+            server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Socket.IO async mode benchmark')
+    parser.add_argument('--modes', default='threading,gevent')
+    parser.add_argument('--clients', type=int, default=200)
+    parser.add_argument('--emits', type=int, default=100)
+    parser.add_argument('--payload', type=int, default=64, help='bytes of padding per message')
+    parser.add_argument('--concurrency', type=int, default=100, help='simultaneous connection attempts')
+    parser.add_argument('--timeout', type=float, default=60.0)
+    parser.add_argument('--port', type=int, default=5055)
+    args = parser.parse_args()
+
+    for mode in args.modes.split(','):
+        print(json.dumps(run_mode(mode.strip(), args)))
+
+
+if __name__ == '__main__':
+    main()
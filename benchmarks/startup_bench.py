@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Application startup cost: import time and time to first request.
+
+Every measurement runs in a fresh interpreter, as a gunicorn worker would:
+
+  import      `python -X importtime -c "import app"`: total and the slowest top-level imports
+  in_process  import app, create_app(), first GET / through the test client
+  server      gunicorn -c gunicorn.conf.py wsgi:app until GET / answers (with --server)
+
+None of these need MongoDB: create_app() opens no connections and / renders a
+template. --save records the medians in startup_baseline.json next to this
+script; --compare fails (exit 1) when a metric is more than --tolerance slower.
+
+Example:
+    python benchmarks/startup_bench.py --runs 5 --server --compare
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'startup_baseline.json')
+
+IN_PROCESS = '''
+import json, time
+start = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+app = create_app()
+created = time.perf_counter()
+status = app.test_client().get('/').status_code
+served = time.perf_counter()
+print(json.dumps({'import_ms': (imported - start) * 1000, 'create_app_ms': (created - imported) * 1000,
+                  'first_request_ms': (served - created) * 1000, 'status': status}))
+'''
+
+
+def _env(**extra):
+    # Nothing to reach during a startup measurement; fail fast if something tries
+    env = dict(os.environ, MONGODB_URI=os.getenv('MONGODB_URI', 'mongodb://127.0.0.1:1/hofix_startup'),
+               SOCKETIO_ASYNC_MODE='threading')
+    env.pop('SOCKET_MESSAGE_QUEUE', None)
+    env.update(extra)
+    return env
+
+
+def import_profile(top):
+    """(total ms, [(module, cumulative ms)]) for `import app` and what it imports directly"""
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'],
+                          cwd=ROOT, env=_env(), capture_output=True, text=True, check=True)
+    total, children, direct = 0.0, [], []
+    # Children are printed before their parent; one extra level of indent is two spaces
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip(' ')) - 1) // 2
+        if depth == 1:
+            children.append((name.strip(), int(cumulative) / 1000))
+        elif depth == 0:
+            if name.strip() == 'app':
+                total, direct = int(cumulative) / 1000, children
+            children = []
+    return total, sorted(direct, key=lambda m: m[1], reverse=True)[:top]
+
+
+def in_process():
+    wall = time.perf_counter()
+    proc = subprocess.run([sys.executable, '-c', IN_PROCESS], cwd=ROOT, env=_env(),
+                          capture_output=True, text=True, check=True)
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    result['process_ms'] = (time.perf_counter() - wall) * 1000
+    return result
+
+
+def server(port, timeout=60):
+    """Milliseconds from spawning gunicorn to the first successful GET /"""
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app'],
+                            cwd=ROOT, env=_env(PORT=str(port), GUNICORN_WORKERS='1'),
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                with urllib.request.urlopen(f'http://127.0.0.1:{port}/', timeout=2) as response:
+                    if response.status == 200:
+                        return (time.perf_counter() - start) * 1000
+            except OSError:
+                time.sleep(0.02)
+        return None
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Startup time benchmark')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=10, help='slowest top-level imports to list')
+    parser.add_argument('--server', action='store_true', help='also time gunicorn to first response')
+    parser.add_argument('--port', type=int, default=5066)
+    parser.add_argument('--save', action='store_true', help=f'write medians to {os.path.basename(BASELINE)}')
+    parser.add_argument('--compare', action='store_true', help='fail if slower than the saved baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed slowdown for --compare')
+    args = parser.parse_args()
+
+    imports = [import_profile(args.top) for _ in range(args.runs)]
+    runs = [in_process() for _ in range(args.runs)]
+    metrics = {
+        'import_app_ms': statistics.median(total for total, _ in imports),
+        'create_app_ms': statistics.median(r['create_app_ms'] for r in runs),
+        'first_request_ms': statistics.median(r['first_request_ms'] for r in runs),
+        'process_to_first_response_ms': statistics.median(r['process_ms'] for r in runs),
+    }
+    if args.server:
+        times = [t for t in (server(args.port) for _ in range(args.runs)) if t is not None]
+        if times:
+            metrics['gunicorn_to_first_response_ms'] = statistics.median(times)
+    metrics = {k: round(v, 1) for k, v in metrics.items()}
+
+    print(json.dumps({'metrics': metrics, 'slowest_imports_ms': dict(imports[-1][1])}, indent=2))
+
+    if args.save:
+        with open(BASELINE, 'w') as f:
+            json.dump(metrics, f, indent=2, sort_keys=True)
+            f.write('\n')
+    if args.compare:
+        with open(BASELINE) as f:
+            baseline = json.load(f)
+        regressions = {k: (baseline[k], v) for k, v in metrics.items()
+                       if k in baseline and v > baseline[k] * (1 + args.tolerance)}
+        for k, (before, after) in regressions.items():
+            print(f"Slower than baseline: {k} {before} -> {after} ms")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
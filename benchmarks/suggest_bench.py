@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Measure /services/suggest lookups on the prefix trie alone (no database).
+
+Example:
+    python benchmarks/suggest_bench.py --terms 5000 --queries 20000
+"""
+import argparse
+import os
+import random
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from autocomplete import PrefixTrie
+
+WORDS = ['electrician', 'plumber', 'carpenter', 'cleaner', 'painter', 'gardener', 'security', 'hvac',
+         'technician', 'repair', 'installation', 'ac', 'geyser', 'water', 'tank', 'kitchen', 'deep',
+         'sofa', 'pest', 'control', 'roof', 'tiling', 'wiring', 'inverter', 'appliance', 'mason']
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def typo(word, rng):
+    i = rng.randrange(len(word))
+    return word[:i] + rng.choice(string.ascii_lowercase) + word[i + 1:]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Suggest trie benchmark')
+    parser.add_argument('--terms', type=int, default=5000)
+    parser.add_argument('--queries', type=int, default=20000)
+    parser.add_argument('--limit', type=int, default=10)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    terms = set()
+    while len(terms) < args.terms:
+        terms.add(' '.join(rng.choice(WORDS).title() for _ in range(rng.randint(1, 3))) + f' {len(terms)}')
+
+    trie = PrefixTrie()
+    start = time.perf_counter()
+    for term in terms:
+        trie.add(term, rng.choice(['service', 'category', 'skill']))
+    print(f"Indexed {len(terms)} terms ({trie.size} keys) in {(time.perf_counter() - start) * 1000:.1f}ms")
+
+    for mode in ('prefix', 'fuzzy'):
+        timings = []
+        for _ in range(args.queries):
+            word = rng.choice(WORDS)
+            query = word[:rng.randint(2, len(word))] if mode == 'prefix' else typo(word, rng)
+            t0 = time.perf_counter()
+            if mode == 'prefix':
+                trie.prefix(query, args.limit)
+            else:
+                trie.fuzzy(query, args.limit)
+            timings.append((time.perf_counter() - t0) * 1000)
+        print(f"{mode:>6}: p50={percentile(timings, 50):.3f}ms p95={percentile(timings, 95):.3f}ms "
+              f"p99={percentile(timings, 99):.3f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""
+Versioned in-process cache of the service catalog.
+
+Each worker keeps an immutable snapshot of all services: the serialized list,
+its JSON and gzip encodings, and id/name/category lookup maps. Writers bump a
+version counter in the cache_versions collection; readers compare against it
+at most once per CATALOG_VERSION_CHECK_INTERVAL seconds (a single _id lookup)
+and rebuild the snapshot when it moved.
+"""
+
+import gzip
+import json
+import os
+import threading
+import time
+
+from flask import url_for
+from pymongo import ReturnDocument
+
+from models import Service, CacheVersion
+
+CATALOG_CACHE = 'services'
+
+
+def get_version(name):
+    doc = CacheVersion._get_collection().find_one({'_id': name}, {'version': 1})
+    return doc['version'] if doc else 0
+
+
+def bump_version(name):
+    """Invalidate the named cache in every worker"""
+    doc = CacheVersion._get_collection().find_one_and_update(
+        {'_id': name}, {'$inc': {'version': 1}}, upsert=True, return_document=ReturnDocument.AFTER
+    )
+    return doc['version']
+
+
+class CatalogSnapshot:
+    """Immutable view of the catalog at one version"""
+
+    def __init__(self, version, services, image_url=None):
+        image_url = image_url or (lambda path: url_for('static', filename=path, _external=False))
+        self.version = version
+        self.services = services
+        self.items = [{
+            'id': str(s.id),
+            'name': s.name,
+            'category': s.category,
+            'base_price': s.base_price,
+            'image_url': image_url(s.image_path) if s.image_path else None,
+            'location_lat': s.location_lat,
+            'location_lon': s.location_lon,
+        } for s in services]
+        self.by_id = {str(s.id): s for s in services}
+        self.by_name = {}
+        self.by_category = {}
+        for s in services:
+            self.by_name.setdefault((s.name or '').lower(), s)
+            self.by_category.setdefault((s.category or '').lower(), []).append(s)
+        self.json_bytes = json.dumps(self.items, separators=(',', ':')).encode('utf-8')
+        self.gzip_bytes = gzip.compress(self.json_bytes, compresslevel=6)
+        self.etag = f'services-{version}'
+
+    def get(self, service_id):
+        return self.by_id.get(str(service_id)) if service_id else None
+
+    def first_matching(self, skills):
+        """First service whose category, then name, is one of the given skills"""
+        wanted = set(skills or [])
+        for s in self.services:
+            if s.category in wanted:
+                return s
+        for s in self.services:
+            if s.name in wanted:
+                return s
+        return None
+
+
+class ServiceCatalog:
+    """Process-wide holder of the current catalog snapshot"""
+
+    def __init__(self, check_interval=None):
+        self.check_interval = float(check_interval if check_interval is not None
+                                    else os.getenv('CATALOG_VERSION_CHECK_INTERVAL', 1.0))
+        self._snapshot = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def current(self):
+        """Return the snapshot, rebuilding it if any worker bumped the version"""
+        snapshot = self._snapshot
+        if snapshot is not None and time.monotonic() - self._checked_at < self.check_interval:
+            return snapshot
+        with self._lock:
+            if self._snapshot is not None and time.monotonic() - self._checked_at < self.check_interval:
+                return self._snapshot
+            version = get_version(CATALOG_CACHE)
+            if self._snapshot is None or self._snapshot.version != version:
+                # Read after the version so a concurrent write is picked up on the next check
+                self._snapshot = CatalogSnapshot(version, list(Service.objects()))
+            self._checked_at = time.monotonic()
+            return self._snapshot
+
+    def invalidate(self):
+        """Call after any write to the services collection"""
+        bump_version(CATALOG_CACHE)
+        self._checked_at = 0.0
+
+
+service_catalog = ServiceCatalog()
@@ -0,0 +1,123 @@
+"""
+Shared pytest fixtures.
+
+Tests that need MongoDB run against TEST_MONGODB_URI and are skipped when no
+server is reachable there. Requests made through `budgeted_client` fail the
+test when they issue more Mongo commands than the view's @query_budget.
+"""
+import os
+
+import pytest
+from flask.testing import FlaskClient
+from pymongo import MongoClient, monitoring
+from pymongo.errors import PyMongoError
+from werkzeug.exceptions import HTTPException
+
+TEST_MONGODB_URI = os.getenv('TEST_MONGODB_URI', 'mongodb://localhost:27017/hofix_test')
+
+# Driver chatter that is not issued by application code
+IGNORED_COMMANDS = {
+    'hello', 'isMaster', 'ismaster', 'ping', 'buildInfo', 'buildinfo', 'endSessions',
+    'saslStart', 'saslContinue', 'createIndexes', 'listIndexes',
+}
+
+
+class CommandCounter(monitoring.CommandListener):
+    """Records the Mongo commands issued by application code"""
+
+    def __init__(self):
+        self.commands = []
+
+    def started(self, event):
+        if event.command_name not in IGNORED_COMMANDS:
+            self.commands.append((event.command_name, event.command.get(event.command_name)))
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+    def reset(self):
+        self.commands = []
+
+    @property
+    def count(self):
+        return len(self.commands)
+
+
+# Must be registered before the application creates its MongoClient
+command_counter = CommandCounter()
+monitoring.register(command_counter)
+
+
+class BudgetedClient(FlaskClient):
+    """Test client that checks every request against its view's query budget"""
+
+    def open(self, *args, **kwargs):
+        from metrics import budget_for
+
+        command_counter.reset()
+        response = super().open(*args, **kwargs)
+        issued = list(command_counter.commands)
+        try:
+            endpoint, _ = self.application.url_map.bind('localhost').match(
+                response.request.path, response.request.method)
+        except HTTPException:
+            return response
+        budget = budget_for(self.application, endpoint)
+        if budget is not None and len(issued) > budget:
+            pytest.fail(f'{response.request.method} {response.request.path} issued {len(issued)} Mongo commands, '
+                        f'{endpoint} has a budget of {budget}: {issued}')
+        return response
+
+
+def _mongo_available():
+    try:
+        MongoClient(TEST_MONGODB_URI, serverSelectionTimeoutMS=500).admin.command('ping')
+        return True
+    except PyMongoError:
+        return False
+
+
+@pytest.fixture(scope='session')
+def app():
+    if not _mongo_available():
+        pytest.skip(f'MongoDB not reachable at {TEST_MONGODB_URI}')
+    os.environ['MONGODB_URI'] = TEST_MONGODB_URI
+    from app import create_app
+
+    flask_app = create_app()
+    flask_app.config['TESTING'] = True
+    yield flask_app
+
+    client = MongoClient(TEST_MONGODB_URI)
+    client.drop_database(client.get_default_database().name)
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def budgeted_client(app):
+    return BudgetedClient(app, app.response_class, use_cookies=True)
+
+
+@pytest.fixture
+def mongo_commands():
+    command_counter.reset()
+    return command_counter
+
+
+@pytest.fixture
+def auth_headers(app):
+    from flask_jwt_extended import create_access_token
+
+    def make(user):
+        with app.app_context():
+            token = create_access_token(identity=str(user.id), additional_claims={'role': user.role, 'name': user.name})
+        return {'Authorization': f'Bearer {token}'}
+
+    return make
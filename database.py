@@ -0,0 +1,173 @@
+"""
+MongoDB connections for the web app and the CLI tools.
+
+Two mongoengine aliases are registered from MONGODB_URI and MONGO_* settings:
+
+  default   all writes and reads that must see them (MONGO_READ_PREFERENCE, primary by default)
+  hot_read  high-volume reads that tolerate replication lag, e.g. the nearby
+            provider list and admin stats (MONGO_HOT_READ_PREFERENCE,
+            secondaryPreferred by default), on its own pool so they cannot
+            starve writes of connections
+
+Clients are created with connect=False: nothing is opened until the first
+query. A ConnectionPoolListener per alias keeps pool statistics for
+/admin/db-pool, and every command is counted and timed for /metrics.
+
+Compression (MONGO_COMPRESSORS=zstd,snappy,zlib) needs the zstandard and
+python-snappy packages for the first two; pymongo warns and skips
+compressors it cannot load.
+"""
+
+import os
+import threading
+import time
+
+from mongoengine import connect
+from mongoengine.connection import DEFAULT_CONNECTION_NAME, get_db
+from pymongo import monitoring
+from pymongo.read_preferences import read_pref_mode_from_name, make_read_preference
+
+from metrics import command_metrics
+
+HOT_READ_ALIAS = 'hot_read'
+
+
+def _int_env(name, default=None):
+    value = os.getenv(name)
+    return int(value) if value not in (None, '') else default
+
+
+def _read_preference(name):
+    # Accepts the URI spellings, e.g. primary, secondaryPreferred, nearest
+    return make_read_preference(read_pref_mode_from_name(name), None)
+
+
+def connection_settings(alias=DEFAULT_CONNECTION_NAME):
+    """Keyword arguments for mongoengine.connect() for one alias"""
+    hot = alias == HOT_READ_ALIAS
+    settings = {
+        'host': (os.getenv('MONGO_HOT_READ_URI') if hot else None) or os.getenv('MONGODB_URI', 'mongodb://localhost:27017/hofix'),
+        'maxPoolSize': _int_env('MONGO_HOT_MAX_POOL_SIZE' if hot else 'MONGO_MAX_POOL_SIZE')
+                       or _int_env('MONGO_MAX_POOL_SIZE', 100),
+        'minPoolSize': _int_env('MONGO_MIN_POOL_SIZE', 0),
+        'serverSelectionTimeoutMS': _int_env('MONGO_SERVER_SELECTION_TIMEOUT_MS', 10000),
+        'read_preference': _read_preference(os.getenv('MONGO_HOT_READ_PREFERENCE', 'secondaryPreferred') if hot
+                                            else os.getenv('MONGO_READ_PREFERENCE', 'primary')),
+        'appname': os.getenv('MONGO_APP_NAME', 'hofix'),
+    }
+    wait_queue_timeout = _int_env('MONGO_WAIT_QUEUE_TIMEOUT_MS')
+    if wait_queue_timeout is not None:
+        settings['waitQueueTimeoutMS'] = wait_queue_timeout
+    if os.getenv('MONGO_COMPRESSORS'):
+        settings['compressors'] = os.getenv('MONGO_COMPRESSORS')
+    w = os.getenv('MONGO_WRITE_CONCERN')
+    if w:
+        settings['w'] = int(w) if w.isdigit() else w
+    if os.getenv('MONGO_JOURNAL'):
+        settings['journal'] = os.getenv('MONGO_JOURNAL').lower() in ('1', 'true', 'yes')
+    return settings
+
+
+class PoolStats(monitoring.ConnectionPoolListener):
+    """Connection counts and checkout waits for one alias's pools"""
+
+    def __init__(self, alias):
+        self.alias = alias
+        self._lock = threading.Lock()
+        self._started = threading.local()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.open = 0
+            self.in_use = 0
+            self.max_in_use = 0
+            self.checkouts = 0
+            self.checkout_failures = {}
+            self.wait_ms_total = 0.0
+            self.max_wait_ms = 0.0
+            self.pools_cleared = 0
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'open': self.open,
+                'in_use': self.in_use,
+                'max_in_use': self.max_in_use,
+                'checkouts': self.checkouts,
+                'checkout_failures': dict(self.checkout_failures),
+                'avg_wait_ms': round(self.wait_ms_total / self.checkouts, 3) if self.checkouts else 0.0,
+                'max_wait_ms': round(self.max_wait_ms, 3),
+                'pools_cleared': self.pools_cleared,
+            }
+
+    def connection_check_out_started(self, event):
+        self._started.at = time.perf_counter()
+
+    def connection_checked_out(self, event):
+        started = getattr(self._started, 'at', None)
+        waited = (time.perf_counter() - started) * 1000 if started is not None else 0.0
+        with self._lock:
+            self.checkouts += 1
+            self.in_use += 1
+            self.max_in_use = max(self.max_in_use, self.in_use)
+            self.wait_ms_total += waited
+            self.max_wait_ms = max(self.max_wait_ms, waited)
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.checkout_failures[event.reason] = self.checkout_failures.get(event.reason, 0) + 1
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.in_use = max(0, self.in_use - 1)
+
+    def connection_created(self, event):
+        with self._lock:
+            self.open += 1
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.open = max(0, self.open - 1)
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self.pools_cleared += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+
+pool_stats = {alias: PoolStats(alias) for alias in (DEFAULT_CONNECTION_NAME, HOT_READ_ALIAS)}
+
+
+def connect_mongodb():
+    """Register both aliases; safe to call more than once"""
+    for alias, listener in pool_stats.items():
+        connect(alias=alias, connect=False, event_listeners=[listener, command_metrics],
+                **connection_settings(alias))
+
+
+def hot_collection(model):
+    """A model's raw collection on the hot_read alias"""
+    return get_db(HOT_READ_ALIAS)[model._get_collection_name()]
+
+
+def pool_snapshot():
+    """Pool statistics and effective settings per alias"""
+    result = {}
+    for alias, listener in pool_stats.items():
+        settings = connection_settings(alias)
+        settings.pop('host')
+        settings['read_preference'] = settings['read_preference'].mongos_mode
+        result[alias] = dict(listener.snapshot(), settings=settings)
+    return result
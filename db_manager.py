@@ -5,13 +5,19 @@ Database management utility for MongoDB operations
 
 import os
 import sys
+import json
 import argparse
 from datetime import datetime
 
 # Add the current directory to the Python path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from models import connect_to_mongodb, Service, User, Provider, Booking, Payment, disconnect_from_mongodb
+from mongoengine.connection import get_db
+
+from models import (connect_to_mongodb, Service, User, Provider, Booking, Payment, ServiceCompletion, PaymentEvent,
+                    CompletionUpload, BookingRollup, disconnect_from_mongodb)
+from catalog import bump_version, CATALOG_CACHE
+from rollups import rebuild_rollups, rollups_built
 
 
 def clear_database():
@@ -28,63 +34,158 @@ def clear_database():
         Provider.objects.delete()
         Booking.objects.delete()
         Payment.objects.delete()
+        BookingRollup.objects.delete()
+        bump_version(CATALOG_CACHE)
+        # Rebuilt empty rather than unmarked: running workers remember the rollups were built
+        rebuild_rollups()
         print("✓ Database cleared successfully!")
     except Exception as e:
         print(f"❌ Error clearing database: {e}")
 
 
-def show_stats():
+def seed_database():
+    """Create the service catalog if the database has none"""
+    from migrate_to_mongodb import seed_services
+    
+    try:
+        seed_services()
+    except Exception as e:
+        print(f"❌ Error seeding services: {e}")
+
+
+STATS_MODELS = [User, Provider, Service, Booking, Payment, ServiceCompletion, PaymentEvent, CompletionUpload]
+
+
+def _breakdown(rows):
+    return {str(row['_id']): row['count'] for row in sorted(rows, key=lambda r: -r['count'])}
+
+
+def _indexed_breakdown(db, collection, field):
+    """Document count per value of an indexed field, read from the index rather than the documents
+
+    A database loaded without its indexes (mongorestore --noIndexRestore, raw inserts) is grouped
+    with a collection scan instead of failing on the hint.
+    """
+    group = [{'$project': {'_id': 0, field: 1}},
+             {'$group': {'_id': f'${field}', 'count': {'$sum': 1}}}]
+    for name, info in db[collection].index_information().items():
+        key, direction = info['key'][0]
+        if key == field and direction in (1, -1):
+            return db[collection].aggregate([{'$sort': {field: direction}}] + group, hint=name)
+    return db[collection].aggregate(group, allowDiskUse=True)
+
+
+def collect_stats():
+    """Counts, breakdowns and storage sizes without scanning a collection"""
+    db = get_db()
+    existing = set(db.list_collection_names())
+    collections = [model._get_collection_name() for model in STATS_MODELS]
+    
+    # Metadata counts: no collection scans
+    counts = {name: db[name].estimated_document_count() for name in collections}
+    
+    # Bookings by status from the rollups; the other breakdowns group an indexed field
+    if rollups_built():
+        bookings_by_status = db[BookingRollup._get_collection_name()].aggregate([
+            {'$group': {'_id': '$status', 'count': {'$sum': '$count'}}},
+            {'$match': {'count': {'$gt': 0}}},
+        ])
+    else:
+        bookings_by_status = _indexed_breakdown(db, 'bookings', 'status')
+    breakdowns = {
+        'users_by_role': _indexed_breakdown(db, 'users', 'role'),
+        'bookings_by_status': bookings_by_status,
+        'payments_by_status': _indexed_breakdown(db, 'payments', 'status'),
+        'services_by_category': _indexed_breakdown(db, 'services', 'category'),
+    }
+    
+    storage = {}
+    for name in collections:
+        if name not in existing:
+            continue
+        # One result per shard
+        shards = list(db[name].aggregate([{'$collStats': {'storageStats': {}}}]))
+        sizes = [s['storageStats'] for s in shards]
+        indexes = {}
+        for s in sizes:
+            for index, size in s.get('indexSizes', {}).items():
+                indexes[index] = indexes.get(index, 0) + size
+        storage[name] = {
+            'data_bytes': sum(s.get('size', 0) for s in sizes),
+            'storage_bytes': sum(s.get('storageSize', 0) for s in sizes),
+            'index_bytes': sum(s.get('totalIndexSize', 0) for s in sizes),
+            'indexes': indexes,
+        }
+    
+    return {
+        'collected_at': datetime.utcnow().isoformat() + 'Z',
+        'database': db.name,
+        'counts': counts,
+        'breakdowns': {name: _breakdown(rows) for name, rows in breakdowns.items()},
+        'storage': storage,
+    }
+
+
+def _mb(nbytes):
+    return f"{nbytes / 1e6:,.1f} MB"
+
+
+def show_stats(as_json=False):
     """Show database statistics"""
     try:
-        user_count = User.objects.count()
-        provider_count = Provider.objects.count()
-        service_count = Service.objects.count()
-        booking_count = Booking.objects.count()
-        payment_count = Payment.objects.count()
-        
-        print("\n📊 Database Statistics:")
-        print(f"Users: {user_count}")
-        print(f"Providers: {provider_count}")
-        print(f"Services: {service_count}")
-        print(f"Bookings: {booking_count}")
-        print(f"Payments: {payment_count}")
-        
-        # Show users by role
-        if user_count > 0:
-            print("\n👥 Users by Role:")
-            for role in ['admin', 'user', 'provider']:
-                count = User.objects(role=role).count()
-                print(f"  {role.title()}: {count}")
-        
-        # Show services by category
-        if service_count > 0:
-            print("\n🔧 Services by Category:")
-            pipeline = [
-                {"$group": {"_id": "$category", "count": {"$sum": 1}}},
-                {"$sort": {"count": -1}}
-            ]
-            categories = Service.objects.aggregate(pipeline)
-            for cat in categories:
-                print(f"  {cat['_id']}: {cat['count']}")
-        
+        stats = collect_stats()
     except Exception as e:
+        if as_json:
+            print(json.dumps({'error': str(e)}))
+            sys.exit(1)
         print(f"❌ Error getting statistics: {e}")
+        return
+    
+    if as_json:
+        print(json.dumps(stats, indent=2))
+        return
+    
+    print("\n📊 Database Statistics (estimated counts):")
+    for name, count in stats['counts'].items():
+        print(f"{name.replace('_', ' ').title()}: {count:,}")
+    
+    titles = {
+        'users_by_role': "👥 Users by Role",
+        'bookings_by_status': "📅 Bookings by Status",
+        'payments_by_status': "💳 Payments by Status",
+        'services_by_category': "🔧 Services by Category",
+    }
+    for facet, title in titles.items():
+        rows = stats['breakdowns'][facet]
+        if rows:
+            print(f"\n{title}:")
+            for value, count in rows.items():
+                print(f"  {value}: {count:,}")
+    
+    if stats['storage']:
+        print("\n💾 Storage (data / on disk / indexes):")
+        for name, sizes in stats['storage'].items():
+            print(f"  {name}: {_mb(sizes['data_bytes'])} / {_mb(sizes['storage_bytes'])} / {_mb(sizes['index_bytes'])}")
 
 
 def list_users():
     """List all users"""
     try:
-        users = User.objects()
+        users = list(User.objects().no_dereference())
         if not users:
             print("No users found.")
             return
         
+        # All provider skills in one query rather than one per provider
+        skills_by_profile = {p.id: p.skills for p in Provider.objects(
+            id__in=[u.provider_profile.id for u in users if u.provider_profile]).only('skills')}
+        
         print("\n👥 Users:")
         print("-" * 80)
         for user in users:
             provider_info = ""
             if user.provider_profile:
-                skills = ", ".join(user.provider_profile.skills) if user.provider_profile.skills else "None"
+                skills = ", ".join(skills_by_profile.get(user.provider_profile.id) or []) or "None"
                 provider_info = f" | Skills: {skills}"
             
             location_info = ""
@@ -118,49 +219,158 @@ def list_services():
         print(f"❌ Error listing services: {e}")
 
 
-def backup_data():
-    """Create a backup of current data"""
+def _print_progress(progress):
+    rows, docs_per_sec, mb_per_sec = progress.snapshot()
+    running = [f"{name} {documents * 100 // total if total else 0}%" for name, documents, total, _, finished in rows
+               if not finished and documents]
+    print(f"  {sum(r[1] for r in rows):,} documents, {docs_per_sec:,.0f} docs/s, {mb_per_sec:.1f} MB/s"
+          + (f" ({', '.join(running)})" if running else ""))
+
+
+def backup_data(path=None, fmt='ndjson', compression='gzip', page_size=500, workers=4, collections=None):
+    """Stream collections to per-collection compressed files in a backup directory"""
+    from backup import backup
+    
     try:
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        backup_file = f"backup_{timestamp}.json"
-        
-        print(f"Creating backup: {backup_file}")
-        
-        # This is a simple backup - in production, use mongodump
-        import json
-        
-        backup_data = {
-            'timestamp': timestamp,
-            'services': [service.to_json() for service in Service.objects()],
-            'users': [user.to_json() for user in User.objects()],
-            'providers': [provider.to_json() for provider in Provider.objects()],
-            'bookings': [booking.to_json() for booking in Booking.objects()],
-            'payments': [payment.to_json() for payment in Payment.objects()]
-        }
-        
-        with open(backup_file, 'w') as f:
-            json.dump(backup_data, f, indent=2, default=str)
-        
-        print(f"✓ Backup created: {backup_file}")
+        path = path or f"backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        print(f"Creating backup: {path} ({fmt}, {compression})")
+        started = datetime.now()
+        manifest = backup(path, collections, fmt, compression, page_size, workers, on_progress=_print_progress)
+        seconds = (datetime.now() - started).total_seconds()
+        for name, info in manifest['collections'].items():
+            print(f"  {name}: {info['documents']:,} documents, {info['bytes'] / 1e6:.1f} MB")
+        total = sum(info['documents'] for info in manifest['collections'].values())
+        print(f"✓ Backup created: {path} ({total:,} documents in {seconds:.1f}s)")
     
     except Exception as e:
         print(f"❌ Error creating backup: {e}")
 
 
+def restore_data(path, page_size=500, workers=4, drop=False, collections=None):
+    """Load a backup directory written by the backup command"""
+    from backup import restore, read_manifest
+    
+    if not path:
+        print("❌ Restore needs the backup directory: db_manager.py restore <path>")
+        return
+    try:
+        manifest = read_manifest(path)
+        print(f"Restoring {path} (created {manifest['created_at']}, {manifest['format']}, {manifest['compression']})")
+        if drop:
+            confirm = input("This drops each restored collection first. Are you sure? (yes/no): ")
+            if confirm.lower() != 'yes':
+                print("Operation cancelled.")
+                return
+        started = datetime.now()
+        results = restore(path, collections, page_size, workers, drop, on_progress=_print_progress)
+        seconds = (datetime.now() - started).total_seconds()
+        for name, info in results.items():
+            print(f"  {name}: {info['documents']:,} documents")
+        total = sum(info['documents'] for info in results.values())
+        print(f"✓ Restored {total:,} documents in {seconds:.1f}s; indexes and rollups rebuilt")
+    
+    except Exception as e:
+        print(f"❌ Error restoring backup: {e}")
+
+
+def rebuild_booking_rollups():
+    """Recompute the admin stats rollups from all bookings"""
+    try:
+        print("Rebuilding booking rollups...")
+        rows = rebuild_rollups()
+        print(f"✓ Rebuilt {rows} rollup rows")
+    except Exception as e:
+        print(f"❌ Error rebuilding rollups: {e}")
+
+
+def learn_speeds(page_size):
+    """Learn the hour-of-day speed table used for ETAs from completed bookings' trails"""
+    from itertools import groupby
+    from eta import learn_speed_table, save_speed_table, SPEED_TABLE_PATH
+    from location_trail import trail_collection
+    
+    def trails():
+        completed = Booking.objects(status='Completed').scalar('id')
+        page = []
+        for booking_id in completed:
+            page.append(booking_id)
+            if len(page) == page_size:
+                yield from _page_trails(page)
+                page = []
+        if page:
+            yield from _page_trails(page)
+    
+    def _page_trails(booking_ids):
+        cursor = trail_collection().find({'meta.booking': {'$in': booking_ids}},
+                                         {'_id': 0, 'meta.booking': 1, 'lat': 1, 'lon': 1, 'ts': 1}
+                                         ).sort([('meta.booking', 1), ('ts', 1)])
+        for _, docs in groupby(cursor, key=lambda d: d['meta']['booking']):
+            yield ((d['lat'], d['lon'], d['ts']) for d in docs)
+    
+    try:
+        print("Learning speed table from completed booking trails...")
+        table = learn_speed_table(trails())
+        save_speed_table(table)
+        print(f"✓ Wrote {SPEED_TABLE_PATH} from {sum(table['samples'])} segments")
+        for hour, (speed, samples) in enumerate(zip(table['speeds_kmh'], table['samples'])):
+            print(f"  {hour:02d}:00  {speed:6.2f} km/h  ({samples} segments)")
+    
+    except Exception as e:
+        print(f"❌ Error learning speeds: {e}")
+
+
+def reconcile_payments(page_size, dry_run=False):
+    """Settle pending Razorpay payments from recorded webhooks and the gateway"""
+    from payment_reconciliation import reconcile_pending_payments
+    
+    try:
+        print(f"Reconciling pending payments (page size {page_size}{', dry run' if dry_run else ''})...")
+        summary = reconcile_pending_payments(page_size=page_size, dry_run=dry_run)
+        print(f"✓ Scanned {summary['scanned']} pending payments in {summary['pages']} pages")
+        print(f"  Decided from webhook events: {summary['from_events']}")
+        print(f"  Decided from gateway: {summary['from_gateway']}")
+        print(f"  Settled: {summary['settled']}")
+        if summary['gateway_errors']:
+            print(f"  Gateway errors: {summary['gateway_errors']}")
+    
+    except Exception as e:
+        print(f"❌ Error reconciling payments: {e}")
+
+
 def main():
     parser = argparse.ArgumentParser(description='MongoDB Database Manager')
-    parser.add_argument('command', choices=['stats', 'clear', 'users', 'services', 'backup'], 
+    parser.add_argument('command', choices=['stats', 'clear', 'users', 'services', 'backup', 'restore', 'reconcile', 'rollups', 'learn-speeds', 'seed'], 
                        help='Command to execute')
+    parser.add_argument('path', nargs='?',
+                       help='Backup directory (backup: default backup_<timestamp>; restore: required)')
+    parser.add_argument('--page-size', type=int, default=500,
+                       help='Documents per page for batch commands')
+    parser.add_argument('--dry-run', action='store_true',
+                       help='Report what would change without writing')
+    parser.add_argument('--format', choices=['ndjson', 'bson'], default='ndjson',
+                       help='Backup file format')
+    parser.add_argument('--compression', choices=['gzip', 'zstd', 'none'], default='gzip',
+                       help='Backup file compression (zstd needs the zstandard package)')
+    parser.add_argument('--workers', type=int, default=4,
+                       help='Collections backed up or restored in parallel')
+    parser.add_argument('--collections',
+                       help='Comma-separated collections to back up or restore (default: all)')
+    parser.add_argument('--drop', action='store_true',
+                       help='Drop each collection before restoring it')
+    parser.add_argument('--json', action='store_true',
+                       help='Print stats as JSON only (for monitoring)')
     
     args = parser.parse_args()
+    collections = [c.strip() for c in args.collections.split(',') if c.strip()] if args.collections else None
     
     try:
         # Connect to MongoDB
         connect_to_mongodb()
-        print("✓ Connected to MongoDB")
+        if not args.json:
+            print("✓ Connected to MongoDB")
         
         if args.command == 'stats':
-            show_stats()
+            show_stats(args.json)
         elif args.command == 'clear':
             clear_database()
         elif args.command == 'users':
@@ -168,7 +378,17 @@ def main():
         elif args.command == 'services':
             list_services()
         elif args.command == 'backup':
-            backup_data()
+            backup_data(args.path, args.format, args.compression, args.page_size, args.workers, collections)
+        elif args.command == 'restore':
+            restore_data(args.path, args.page_size, args.workers, args.drop, collections)
+        elif args.command == 'reconcile':
+            reconcile_payments(args.page_size, args.dry_run)
+        elif args.command == 'rollups':
+            rebuild_booking_rollups()
+        elif args.command == 'learn-speeds':
+            learn_speeds(args.page_size)
+        elif args.command == 'seed':
+            seed_database()
     
     except Exception as e:
         print(f"❌ Error: {e}")
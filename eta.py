@@ -0,0 +1,208 @@
+"""
+Distance and ETA estimates for providers.
+
+Distances are haversine (great circle) scaled by ETA_ROUTE_FACTOR for road
+detours. Speeds come from an hour-of-day table learned offline from the
+location trails of completed bookings (db_manager.py learn-speeds) and
+stored as JSON at ETA_SPEED_TABLE; hours without enough samples fall back
+to ETA_DEFAULT_SPEED_KMH.
+
+eta_batch() prices many (origin, destination) pairs in one numpy call and
+memoizes ETAs per (origin cell, destination cell, hour), where a cell is
+ETA_CELL_DEGREES on a side (~500 m by default).
+"""
+
+import json
+import logging
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_KM = 6371.0088
+DEFAULT_SPEED_KMH = float(os.getenv('ETA_DEFAULT_SPEED_KMH', 25.0))
+ROUTE_FACTOR = float(os.getenv('ETA_ROUTE_FACTOR', 1.3))
+MIN_ETA_MINUTES = int(os.getenv('ETA_MIN_MINUTES', 5))
+CELL_DEGREES = float(os.getenv('ETA_CELL_DEGREES', 0.005))
+# Speed table hours are local time
+TZ_OFFSET = timedelta(minutes=int(os.getenv('ETA_TZ_OFFSET_MINUTES', 330)))
+SPEED_TABLE_PATH = os.getenv('ETA_SPEED_TABLE', os.path.join('instance', 'speed_table.json'))
+CACHE_SIZE = int(os.getenv('ETA_CACHE_SIZE', 50000))
+CACHE_TTL = float(os.getenv('ETA_CACHE_TTL', 600))
+
+# Samples per hour below which the learned speed is not trusted
+MIN_SAMPLES_PER_HOUR = 30
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp, dl = p2 - p1, math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def haversine_km_many(lat1, lon1, lat2, lon2):
+    """Element-wise haversine over arrays (or scalars broadcast against arrays)"""
+    import numpy as np  # Deferred: numpy is slow to import and only ETA requests need it
+    p1, p2 = np.radians(lat1), np.radians(lat2)
+    dp, dl = p2 - p1, np.radians(np.asarray(lon2) - np.asarray(lon1))
+    a = np.sin(dp / 2) ** 2 + np.cos(p1) * np.cos(p2) * np.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def local_hour(at=None):
+    return ((at or datetime.utcnow()) + TZ_OFFSET).hour
+
+
+class SpeedTable:
+    """km/h per local hour, reloaded when the JSON file changes"""
+
+    def __init__(self, path=SPEED_TABLE_PATH):
+        self.path = path
+        self._speeds = [DEFAULT_SPEED_KMH] * 24
+        self._mtime = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if now - self._checked_at < 30:
+            return
+        with self._lock:
+            self._checked_at = now
+            try:
+                mtime = os.path.getmtime(self.path)
+            except OSError:
+                return
+            if mtime == self._mtime:
+                return
+            try:
+                with open(self.path) as f:
+                    table = json.load(f)
+                self._speeds = [float(s) for s in table['speeds_kmh']]
+                self._mtime = mtime
+                eta_cache.clear()
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning("Could not load speed table %s: %s", self.path, e)
+
+    def speed(self, hour):
+        self._maybe_reload()
+        return self._speeds[hour]
+
+
+class EtaCache:
+    """LRU of (origin cell, destination cell, hour) -> eta_minutes"""
+
+    def __init__(self, size=CACHE_SIZE, ttl=CACHE_TTL):
+        self.size = size
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.size:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+speed_table = SpeedTable()
+eta_cache = EtaCache()
+
+
+def _cell(lat, lon):
+    return (round(lat / CELL_DEGREES), round(lon / CELL_DEGREES))
+
+
+def eta_batch(origins, destinations, at=None):
+    """[(distance_km, eta_minutes)] for each (origin, destination) pair of (lat, lon)
+
+    Distances are exact; ETAs are priced from cell centres and cached, so they
+    are stable while a provider moves within a cell.
+    """
+    if not origins:
+        return []
+    import numpy as np
+    hour = local_hour(at)
+    points = np.array([tuple(o) + tuple(d) for o, d in zip(origins, destinations)], dtype=float)
+    distances = haversine_km_many(points[:, 0], points[:, 1], points[:, 2], points[:, 3])
+
+    minutes = [None] * len(points)
+    misses = {}
+    for i, row in enumerate(points.tolist()):
+        key = (_cell(row[0], row[1]), _cell(row[2], row[3]), hour)
+        if key in misses:
+            misses[key].append(i)
+            continue
+        minutes[i] = eta_cache.get(key)
+        if minutes[i] is None:
+            misses[key] = [i]
+
+    if misses:
+        cells = np.array([key[0] + key[1] for key in misses], dtype=float) * CELL_DEGREES
+        cell_km = haversine_km_many(cells[:, 0], cells[:, 1], cells[:, 2], cells[:, 3])
+        priced = np.maximum(MIN_ETA_MINUTES, np.ceil(cell_km * ROUTE_FACTOR / speed_table.speed(hour) * 60))
+        for (key, indexes), m in zip(misses.items(), priced.tolist()):
+            eta_cache.put(key, int(m))
+            for i in indexes:
+                minutes[i] = int(m)
+    return [(round(d, 2), m) for d, m in zip(distances.tolist(), minutes)]
+
+
+def eta(origin, destination, at=None):
+    """(distance_km, eta_minutes) for one pair"""
+    return eta_batch([origin], [destination], at)[0]
+
+
+def learn_speed_table(trails, min_samples=MIN_SAMPLES_PER_HOUR):
+    """Median segment speed per local hour from iterables of (lat, lon, ts) fixes"""
+    from statistics import median
+    samples = [[] for _ in range(24)]
+    for fixes in trails:
+        previous = None
+        for lat, lon, ts in fixes:
+            if previous is not None:
+                seconds = (ts - previous[2]).total_seconds()
+                if 0 < seconds <= 600:
+                    speed = haversine_km(previous[0], previous[1], lat, lon) / seconds * 3600
+                    # Stationary stretches and GPS jumps say nothing about traffic
+                    if 3 <= speed <= 120:
+                        samples[local_hour(previous[2])].append(speed)
+            previous = (lat, lon, ts)
+
+    speeds, counts = [], []
+    for hour_samples in samples:
+        counts.append(len(hour_samples))
+        speeds.append(round(median(hour_samples), 2) if len(hour_samples) >= min_samples
+                      else DEFAULT_SPEED_KMH)
+    return {'speeds_kmh': speeds, 'samples': counts, 'default_kmh': DEFAULT_SPEED_KMH,
+            'learned_at': datetime.utcnow().isoformat()}
+
+
+def save_speed_table(table, path=SPEED_TABLE_PATH):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w') as f:
+        json.dump(table, f, indent=2)
+    os.replace(tmp, path)
@@ -1,17 +1,67 @@
 from flask_jwt_extended import JWTManager
 from flask_bcrypt import Bcrypt
 from flask_socketio import SocketIO
-from mongoengine import connect
+from database import connect_mongodb
+from metrics import metrics
+import logging
 import os
 
+logger = logging.getLogger(__name__)
+
+
+class InstrumentedSocketIO(SocketIO):
+    """SocketIO that counts emits per event for /metrics"""
+
+    def emit(self, event, *args, **kwargs):
+        metrics.count_emit(event)
+        return super().emit(event, *args, **kwargs)
+
 
 jwt = JWTManager()
 bcrypt = Bcrypt()
-socketio = SocketIO(cors_allowed_origins="*")
+socketio = InstrumentedSocketIO(cors_allowed_origins="*")
+
+# Redis URL shared by every worker process (and write-only emitters) so an
+# emit reaches clients connected anywhere; unset means single-process only
+SOCKET_MESSAGE_QUEUE = os.getenv('SOCKET_MESSAGE_QUEUE') or None
+SOCKET_CHANNEL = os.getenv('SOCKET_CHANNEL', 'flask-socketio')
+
+_emitter = None
+
+
+def socket_emitter():
+    """Socket.IO handle for code outside the web workers (CLI jobs, background tasks)
+
+    Without a message queue this is the in-process server, so emits only reach
+    clients when called inside a web worker.
+    """
+    global _emitter
+    if not SOCKET_MESSAGE_QUEUE:
+        return socketio
+    if _emitter is None:
+        _emitter = InstrumentedSocketIO(message_queue=SOCKET_MESSAGE_QUEUE, channel=SOCKET_CHANNEL)
+    return _emitter
+
+
+# 'threading' suits the development server; 'gevent' needs wsgi.py (which
+# monkey-patches first) and the gevent-websocket gunicorn worker
+SOCKETIO_ASYNC_MODES = ('threading', 'gevent')
+
+
+def socketio_async_mode():
+    """Socket.IO async mode from SOCKETIO_ASYNC_MODE"""
+    mode = os.getenv('SOCKETIO_ASYNC_MODE', 'threading')
+    if mode not in SOCKETIO_ASYNC_MODES:
+        raise ValueError(f"SOCKETIO_ASYNC_MODE must be one of {', '.join(SOCKETIO_ASYNC_MODES)}, not {mode!r}")
+    if mode == 'gevent':
+        from gevent import monkey
+        if not monkey.is_module_patched('socket'):
+            logger.warning("SOCKETIO_ASYNC_MODE=gevent without monkey-patching; start through wsgi.py")
+    return mode
 
 
 def init_mongodb():
     """Initialize MongoDB connection"""
-    mongodb_uri = os.getenv('MONGODB_URI', 'mongodb://localhost:27017/hofix')
-    connect(host=mongodb_uri)
-
+    # connect=False inside: no sockets or monitor threads until first use, which
+    # keeps the clients fork-safe when gunicorn preloads the app
+    connect_mongodb()
@@ -0,0 +1,451 @@
+#!/usr/bin/env python3
+"""
+Generate a synthetic, production-sized dataset for load testing.
+
+Customers and providers are spread over Indian cities by population share and
+sign up steadily before and during the booking window; every booking is made
+by a customer who already exists (older accounts book more), is assigned to a
+provider in the customer's city who offers the booked service, and has a
+status that depends on its age: recent bookings are still Pending, Accepted or
+In Progress, older ones Completed, Cancelled or Rejected. Completed bookings
+get ratings, reviews, payments and service completions.
+
+Every document is a pure function of --seed and its index, ObjectIds
+included, so the same arguments always produce the same data whatever
+--workers and --batch-size are. Documents are written with unordered
+insert_many batches from a process pool; documents that already exist are
+skipped, so an interrupted run can be repeated to fill in the rest. Use an
+empty database per seed. Afterwards indexes are built and the admin stats
+rollups are recomputed.
+
+Every generated account logs in with --password; emails are
+user<i>@loadtest.example.com and provider<i>@loadtest.example.com.
+
+Example:
+    MONGODB_URI=mongodb://localhost:27017/hofix_load python generate_dataset.py \\
+        --users 500000 --providers 100000 --bookings 5000000 --workers 8
+"""
+
+import argparse
+import calendar
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+# Add the current directory to the Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# (name, latitude, longitude, percent of accounts)
+CITIES = [
+    ('Delhi', 28.6139, 77.2090, 18),
+    ('Mumbai', 19.0760, 72.8777, 17),
+    ('Bengaluru', 12.9716, 77.5946, 14),
+    ('Hyderabad', 17.3850, 78.4867, 10),
+    ('Chennai', 13.0827, 80.2707, 9),
+    ('Kolkata', 22.5726, 88.3639, 9),
+    ('Pune', 18.5204, 73.8567, 8),
+    ('Ahmedabad', 23.0225, 72.5714, 6),
+    ('Jaipur', 26.9124, 75.7873, 5),
+    ('Lucknow', 26.8467, 80.9462, 4),
+]
+# Account i lives in CITIES[CITY_SLOTS[i % 100]]
+CITY_SLOTS = [c for c, city in enumerate(CITIES) for _ in range(city[3])]
+CITY_SPREAD_DEG = 0.08  # ~9 km standard deviation around the city centre
+
+FIRST_NAMES = ['Aarav', 'Vivaan', 'Aditya', 'Arjun', 'Sai', 'Reyansh', 'Krishna', 'Ishaan', 'Rohan', 'Kabir',
+               'Ananya', 'Diya', 'Aadhya', 'Saanvi', 'Pari', 'Isha', 'Meera', 'Kavya', 'Riya', 'Priya']
+LAST_NAMES = ['Sharma', 'Verma', 'Gupta', 'Singh', 'Kumar', 'Patel', 'Reddy', 'Iyer', 'Nair', 'Das',
+              'Mehta', 'Joshi', 'Rao', 'Khan', 'Bose', 'Chopra', 'Malhotra', 'Pillai', 'Mishra', 'Agarwal']
+REVIEWS = ['Great work, very professional', 'On time and tidy', 'Fixed it quickly', 'Good service',
+           'Okay, took longer than expected', 'Would book again', 'Friendly and careful']
+
+# Bookings younger than this may still be open
+OPEN_WINDOW = timedelta(days=2)
+OPEN_STATUSES = (['Pending', 'Accepted', 'In Progress', 'Completed', 'Cancelled'], [30, 25, 15, 25, 5])
+CLOSED_STATUSES = (['Completed', 'Cancelled', 'Rejected'], [78, 14, 8])
+RATINGS = ([5.0, 4.0, 3.0, 2.0, 1.0], [55, 28, 10, 4, 3])
+RATED_SHARE = 0.65
+REVIEWED_SHARE = 0.3
+UNASSIGNED_PENDING_SHARE = 0.5
+PAID_SHARE = 0.92
+PAYMENT_METHODS = (['UPI', 'Cash', 'Card', 'Razorpay', 'Bank Transfer'], [45, 25, 15, 10, 5])
+PAYMENT_STATUSES = (['Success', 'Refunded', 'Failed'], [95, 3, 2])
+COMPLETION_UPLOAD_SHARE = 0.8
+AVAILABLE_SHARE = 0.85
+# Accounts sign up over this long before the booking window, and through it
+SIGNUP_LEAD = timedelta(days=90)
+
+# First byte after the timestamp in generated ObjectIds
+KIND_USER, KIND_PROVIDER_USER, KIND_PROVIDER, KIND_BOOKING, KIND_PAYMENT, KIND_COMPLETION = range(1, 7)
+
+COLLECTIONS = ['users', 'providers', 'bookings', 'payments', 'service_completions']
+
+
+def _epoch(dt):
+    return calendar.timegm(dt.utctimetuple())
+
+
+def _oid(kind, index, at):
+    """Deterministic ObjectId: creation time, kind, index"""
+    return ObjectId(_epoch(at).to_bytes(4, 'big') + bytes([kind]) + index.to_bytes(7, 'big'))
+
+
+class DatasetSpec:
+    """What to generate; builds any document from its index alone"""
+
+    def __init__(self, seed, users, providers, bookings, until, days, services, password_hash):
+        self.seed = seed
+        self.users = users
+        self.providers = providers
+        self.bookings = bookings
+        self.until = until
+        self.start = until - timedelta(days=days)
+        self.first_signup = self.start - SIGNUP_LEAD
+        # [{'_id', 'name', 'base_price'}] in a fixed order
+        self.services = sorted(services, key=lambda s: s['name'])
+        self.services_by_name = {s['name']: s for s in self.services}
+        self.password_hash = password_hash
+        # Provider slots (i % 100) per city, for picking a provider near a customer
+        self.city_slots = [[r for r, c in enumerate(CITY_SLOTS) if c == city] for city in range(len(CITIES))]
+
+    def _rng(self, kind, index):
+        return random.Random((self.seed << 48) | (kind << 40) | index)
+
+    def _signed_up(self, index, count):
+        return self.first_signup + (self.until - self.first_signup) * (index / count)
+
+    def _signed_up_by(self, at, count):
+        """How many accounts (a prefix of the indexes) exist at `at`"""
+        elapsed = (at - self.first_signup) / (self.until - self.first_signup)
+        return max(1, min(count, int(count * elapsed) + 1))
+
+    @staticmethod
+    def _city(index):
+        return CITY_SLOTS[index % len(CITY_SLOTS)]
+
+    @staticmethod
+    def _home(rng, city):
+        # Always the first draws from an account's generator, so bookings can recompute them
+        _, lat, lon, _ = CITIES[city]
+        return (round(rng.gauss(lat, CITY_SPREAD_DEG), 6), round(rng.gauss(lon, CITY_SPREAD_DEG), 6))
+
+    @staticmethod
+    def _person(rng):
+        return f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}", f"+91{rng.randrange(6000000000, 9999999999)}"
+
+    def user_id(self, i):
+        return _oid(KIND_USER, i, self._signed_up(i, self.users))
+
+    def provider_user_id(self, i):
+        return _oid(KIND_PROVIDER_USER, i, self._signed_up(i, self.providers))
+
+    def provider_id(self, i):
+        return _oid(KIND_PROVIDER, i, self._signed_up(i, self.providers))
+
+    def user_home(self, i):
+        return self._home(self._rng(KIND_USER, i), self._city(i))
+
+    def _skills(self, rng):
+        count = rng.choices([1, 2, 3], [50, 35, 15])[0]
+        return sorted(s['name'] for s in rng.sample(self.services, min(count, len(self.services))))
+
+    def provider_skills(self, i):
+        rng = self._rng(KIND_PROVIDER_USER, i)
+        self._home(rng, self._city(i))
+        return self._skills(rng)
+
+    def user_doc(self, i):
+        rng = self._rng(KIND_USER, i)
+        city = self._city(i)
+        lat, lon = self._home(rng, city)
+        name, phone = self._person(rng)
+        created = self._signed_up(i, self.users)
+        return {
+            '_id': self.user_id(i),
+            'name': name,
+            'email': f'user{i}@loadtest.example.com',
+            'phone': phone,
+            'role': 'user',
+            'password_hash': self.password_hash,
+            'latitude': lat,
+            'longitude': lon,
+            'address': CITIES[city][0],
+            'location_updated_at': self.until - timedelta(minutes=rng.randrange(60 * 24 * 30)),
+            'credits': 0.0,
+            'rating': 5.0,
+            'created_at': created,
+        }
+
+    def provider_docs(self, i):
+        """(user document, provider document) for provider i"""
+        rng = self._rng(KIND_PROVIDER_USER, i)
+        city = self._city(i)
+        lat, lon = self._home(rng, city)
+        skills = self._skills(rng)
+        name, phone = self._person(rng)
+        available = rng.random() < AVAILABLE_SHARE
+        created = self._signed_up(i, self.providers)
+        user = {
+            '_id': self.provider_user_id(i),
+            'name': name,
+            'email': f'provider{i}@loadtest.example.com',
+            'phone': phone,
+            'role': 'provider',
+            'password_hash': self.password_hash,
+            'latitude': lat,
+            'longitude': lon,
+            'address': CITIES[city][0],
+            'location_updated_at': self.until - timedelta(minutes=rng.randrange(60 if available else 60 * 24 * 7)),
+            'credits': round(rng.uniform(0, 500), 2),
+            'rating': round(rng.uniform(3.5, 5.0), 1),
+            'created_at': created,
+            'provider_profile': self.provider_id(i),
+        }
+        provider = {'_id': self.provider_id(i), 'user': user['_id'], 'skills': skills, 'availability': available}
+        return user, provider
+
+    def _provider_near(self, rng, city, existing):
+        """A provider index in `city` among the first `existing`, or anywhere if the city has none yet"""
+        slots = [r for r in self.city_slots[city] if r < existing]
+        if not slots:
+            return rng.randrange(existing)
+        slot = rng.choice(slots)
+        return slot + len(CITY_SLOTS) * rng.randrange((existing - 1 - slot) // len(CITY_SLOTS) + 1)
+
+    def booking_docs(self, j):
+        """(booking, payment or None, service completion or None) for booking j"""
+        rng = self._rng(KIND_BOOKING, j)
+        created = self.start + (self.until - self.start) * ((j + rng.random()) / self.bookings)
+        # Older accounts have had longer to book: skew towards low indexes
+        user = int(self._signed_up_by(created, self.users) * rng.random() ** 2)
+        lat, lon = self.user_home(user)
+        city = self._city(user)
+
+        statuses = OPEN_STATUSES if self.until - created < OPEN_WINDOW else CLOSED_STATUSES
+        status = rng.choices(*statuses)[0]
+        provider = None
+        if self.providers and not (status == 'Pending' and rng.random() < UNASSIGNED_PENDING_SHARE):
+            provider = self._provider_near(rng, city, self._signed_up_by(created, self.providers))
+            service = self.services_by_name[rng.choice(self.provider_skills(provider))]
+        else:
+            service = rng.choice(self.services)
+
+        booking_id = _oid(KIND_BOOKING, j, created)
+        scheduled = created + timedelta(minutes=rng.randrange(30, 72 * 60))
+        price = round(service['base_price'] * rng.uniform(1.0, 2.5), 2)
+        booking = {
+            '_id': booking_id,
+            'user': self.user_id(user),
+            'service': service['_id'],
+            'status': status,
+            'scheduled_time': scheduled,
+            'price': price,
+            'location_lat': lat,
+            'location_lon': lon,
+            'created_at': created,
+        }
+        if provider is not None:
+            booking['provider'] = self.provider_id(provider)
+        if rng.random() < 0.2:
+            booking['notes'] = 'Please call before arriving'
+
+        payment = completion = None
+        if status == 'Completed':
+            completed = min(scheduled + timedelta(minutes=rng.randrange(30, 240)), self.until)
+            notes = f"{service['name']} job done"
+            booking.update(completion_notes=notes, completed_at=completed)
+            if rng.random() < RATED_SHARE:
+                booking['rating'] = rng.choices(*RATINGS)[0]
+                if rng.random() < REVIEWED_SHARE:
+                    booking['review'] = rng.choice(REVIEWS)
+            if provider is not None and rng.random() < COMPLETION_UPLOAD_SHARE:
+                completion = {
+                    '_id': _oid(KIND_COMPLETION, j, created),
+                    'booking': booking_id,
+                    'provider': booking['provider'],
+                    'completion_notes': notes,
+                    'images': [],
+                    'completed_at': completed,
+                }
+            if rng.random() < PAID_SHARE:
+                method = rng.choices(*PAYMENT_METHODS)[0]
+                payment_status = rng.choices(*PAYMENT_STATUSES)[0]
+                paid = completed + timedelta(minutes=rng.randrange(1, 60))
+                payment = {
+                    '_id': _oid(KIND_PAYMENT, j, created),
+                    'booking': booking_id,
+                    'amount': price,
+                    'method': method,
+                    'status': payment_status,
+                    'created_at': paid,
+                }
+                if payment_status == 'Success':
+                    payment['settled_at'] = paid
+                if method == 'Razorpay':
+                    payment['razorpay_order_id'] = f'order_{rng.getrandbits(56):014x}'
+                    payment['razorpay_payment_id'] = f'pay_{rng.getrandbits(56):014x}'
+                booking['payment'] = payment['_id']
+        return booking, payment, completion
+
+
+# Process pool workers
+
+_spec = None
+_db = None
+
+
+def _init_worker(spec):
+    global _spec, _db
+    from mongoengine.connection import DEFAULT_DATABASE_NAME
+    from pymongo import MongoClient
+    from database import connection_settings
+
+    settings = connection_settings()
+    _spec = spec
+    _db = MongoClient(settings.pop('host'), **settings).get_default_database(DEFAULT_DATABASE_NAME)
+
+
+def _insert(collection, docs):
+    """(inserted, already there)"""
+    from pymongo.errors import BulkWriteError
+
+    if not docs:
+        return 0, 0
+    try:
+        return len(_db[collection].insert_many(docs, ordered=False).inserted_ids), 0
+    except BulkWriteError as e:
+        errors = e.details.get('writeErrors', [])
+        if any(err.get('code') != 11000 for err in errors):
+            raise
+        return e.details.get('nInserted', 0), len(errors)
+
+
+def _generate_chunk(kind, start, stop):
+    """Generate and insert one batch; returns {collection: (inserted, already there)}"""
+    if kind == 'users':
+        return {'users': _insert('users', [_spec.user_doc(i) for i in range(start, stop)])}
+    if kind == 'providers':
+        pairs = [_spec.provider_docs(i) for i in range(start, stop)]
+        return {'providers': _insert('providers', [p for _, p in pairs]),
+                'users': _insert('users', [u for u, _ in pairs])}
+    bookings, payments, completions = [], [], []
+    for j in range(start, stop):
+        booking, payment, completion = _spec.booking_docs(j)
+        bookings.append(booking)
+        if payment:
+            payments.append(payment)
+        if completion:
+            completions.append(completion)
+    return {'bookings': _insert('bookings', bookings),
+            'payments': _insert('payments', payments),
+            'service_completions': _insert('service_completions', completions)}
+
+
+def _chunks(kind, count, batch_size):
+    return [(kind, start, min(start + batch_size, count)) for start in range(0, count, batch_size)]
+
+
+def load_services():
+    """The service catalog, seeded first if the database has none"""
+    from migrate_to_mongodb import seed_services
+    from models import Service
+
+    seed_services()
+    return [{'_id': s.id, 'name': s.name, 'base_price': s.base_price} for s in Service.objects.only('name', 'base_price')]
+
+
+def hash_password(password):
+    """One bcrypt hash shared by every generated account, with a fixed salt so reruns match"""
+    import bcrypt
+
+    # Flask-Bcrypt's default cost, so a login checks the hash as fast as a real account's
+    salt = b'$2b$12$' + b'loadtestloadtestloadte'
+    return bcrypt.hashpw(password.encode('utf-8'), salt).decode('utf-8')
+
+
+def build_indexes():
+    from models import User, Provider, Booking, Payment, ServiceCompletion
+
+    for model in (User, Provider, Booking, Payment, ServiceCompletion):
+        model.ensure_indexes()
+
+
+def generate(spec, workers, batch_size):
+    """Insert everything in `spec`; returns {collection: [inserted, already there]}"""
+    tasks = (_chunks('users', spec.users, batch_size) + _chunks('providers', spec.providers, batch_size)
+             + _chunks('bookings', spec.bookings, batch_size))
+    totals = {name: [0, 0] for name in COLLECTIONS}
+    started = last_report = time.monotonic()
+    documents = 0
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(spec,)) as pool:
+        futures = [pool.submit(_generate_chunk, *task) for task in tasks]
+        for done, future in enumerate(as_completed(futures), 1):
+            for name, (inserted, existing) in future.result().items():
+                totals[name][0] += inserted
+                totals[name][1] += existing
+                documents += inserted + existing
+            now = time.monotonic()
+            if now - last_report >= 5 or done == len(futures):
+                last_report = now
+                print(f"  {done}/{len(futures)} batches, {documents:,} documents, "
+                      f"{documents / max(now - started, 1e-9):,.0f} docs/s")
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a synthetic load testing dataset')
+    parser.add_argument('--users', type=int, default=10000, help='customer accounts')
+    parser.add_argument('--providers', type=int, default=2000, help='provider accounts')
+    parser.add_argument('--bookings', type=int, default=50000)
+    parser.add_argument('--days', type=int, default=365, help='length of the booking window')
+    parser.add_argument('--until', help='end of the booking window, YYYY-MM-DD (default: today, UTC)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--password', default='loadtest123', help='password of every generated account')
+    parser.add_argument('--batch-size', type=int, default=5000, help='documents per insert_many')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='generator processes')
+    parser.add_argument('--skip-rollups', action='store_true', help='do not rebuild the admin stats rollups')
+    args = parser.parse_args()
+    if args.users < 1 or args.providers < 0 or args.bookings < 0:
+        parser.error('need at least one user and no negative counts')
+
+    until = datetime.strptime(args.until, '%Y-%m-%d') if args.until else \
+        datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+
+    from models import connect_to_mongodb, disconnect_from_mongodb
+
+    try:
+        connect_to_mongodb()
+        print("✓ Connected to MongoDB")
+        services = load_services()
+        spec = DatasetSpec(args.seed, args.users, args.providers, args.bookings, until, args.days,
+                           services, hash_password(args.password))
+
+        print(f"Generating {args.users:,} users, {args.providers:,} providers and {args.bookings:,} bookings "
+              f"({args.workers} workers, batches of {args.batch_size})...")
+        started = time.monotonic()
+        totals = generate(spec, args.workers, args.batch_size)
+        for name, (inserted, existing) in totals.items():
+            print(f"✓ {name}: {inserted:,} inserted" + (f", {existing:,} already there" if existing else ""))
+        print(f"✓ Generated in {time.monotonic() - started:.1f}s")
+
+        print("Building indexes...")
+        build_indexes()
+        if not args.skip_rollups:
+            from rollups import rebuild_rollups
+            print(f"✓ Rebuilt {rebuild_rollups()} rollup rows")
+
+    except Exception as e:
+        print(f"❌ Generation failed: {e}")
+        sys.exit(1)
+
+    finally:
+        disconnect_from_mongodb()
+
+
+if __name__ == '__main__':
+    main()
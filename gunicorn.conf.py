@@ -0,0 +1,47 @@
+"""
+Gunicorn settings for wsgi:app, driven by SOCKETIO_ASYNC_MODE.
+
+gevent:    one GeventWebSocketWorker per process, thousands of sockets each.
+threading: gthread workers with GUNICORN_THREADS threads each.
+
+More than one worker needs SOCKET_MESSAGE_QUEUE (so emits reach clients on
+every worker) and sticky sessions at the load balancer, because a polling
+Socket.IO session lives in the worker that accepted it.
+"""
+import os
+
+_async_mode = os.getenv('SOCKETIO_ASYNC_MODE', 'gevent')
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv('GUNICORN_WORKERS', 1))
+# Import the app once in the master and fork it into workers; create_app opens
+# no connections, so nothing shared crosses the fork
+preload_app = os.getenv('GUNICORN_PRELOAD', '0') == '1'
+
+if _async_mode == 'gevent':
+    worker_class = 'geventwebsocket.gunicorn.workers.GeventWebSocketWorker'
+    worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', 2000))
+else:
+    worker_class = 'gthread'
+    threads = int(os.getenv('GUNICORN_THREADS', 100))
+
+# Long-polling and WebSocket requests are held open on purpose
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 120))
+graceful_timeout = 30
+keepalive = 5
+accesslog = os.getenv('GUNICORN_ACCESS_LOG')
+
+
+def worker_exit(server, worker):
+    # Write buffered provider locations before the worker goes away
+    try:
+        from location_buffer import location_buffer
+        location_buffer.stop()
+    except Exception as e:
+        server.log.warning(f"Could not flush location buffer: {e}")
+    # Let the other workers drop this one's providers now instead of after the sync timeout
+    try:
+        from presence import presence
+        presence.stop()
+    except Exception as e:
+        server.log.warning(f"Could not announce provider presence shutdown: {e}")
@@ -0,0 +1,149 @@
+"""
+Write-behind store for provider GPS pings.
+
+Pings land in an in-process dict (last write wins per provider) and are
+readable immediately; a background thread flushes the pending positions to
+the users collection every LOCATION_FLUSH_INTERVAL seconds as one unordered
+bulk_write of $set updates, plus the thinned per-booking trail points
+(location_trail) as one insert_many. Each update only applies if it is
+newer than the stored location_updated_at, so flushes from several workers
+and direct profile edits cannot move a provider back in time.
+"""
+
+import atexit
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+from bson import ObjectId
+from pymongo import UpdateOne
+
+from location_trail import worth_keeping, trail_documents, insert_trail
+from models import User
+
+logger = logging.getLogger(__name__)
+
+# Trail points kept in memory while Mongo is unreachable
+MAX_PENDING_TRAIL = 10000
+
+
+class LocationBuffer:
+    """Latest position per provider user id, flushed to Mongo in batches"""
+
+    def __init__(self, flush_interval=None):
+        self.flush_interval = float(flush_interval if flush_interval is not None
+                                    else os.getenv('LOCATION_FLUSH_INTERVAL', 2.0))
+        self._latest = {}
+        self._pending = {}
+        self._trail = []
+        self._trail_last = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.metrics = {'pings': 0, 'flushes': 0, 'writes': 0, 'applied': 0, 'errors': 0, 'last_flush_ms': 0.0,
+                        'trail_points': 0}
+
+    def record(self, user_id, lat, lon, at=None, bookings=()):
+        """Absorb one ping, adding it to the trail of each active booking; returns the stored position"""
+        position = {'lat': float(lat), 'lon': float(lon), 'at': at or datetime.utcnow()}
+        user_id = str(user_id)
+        with self._lock:
+            self.metrics['pings'] += 1
+            current = self._latest.get(user_id)
+            if current and current['at'] > position['at']:
+                return current  # out-of-order ping
+            self._latest[user_id] = position
+            self._pending[user_id] = position
+            if bookings and worth_keeping(self._trail_last.get(user_id), position):
+                self._trail_last[user_id] = position
+                self._trail.extend(trail_documents(user_id, bookings, position))
+        self._ensure_started()
+        return position
+
+    def get(self, user_id):
+        """Most recent buffered position or None"""
+        return self._latest.get(str(user_id))
+
+    def discard(self, user_id):
+        """Forget a provider after its location was written directly"""
+        with self._lock:
+            self._latest.pop(str(user_id), None)
+            self._pending.pop(str(user_id), None)
+
+    def flush(self):
+        """Write pending positions; returns the number of updates sent"""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+                trail, self._trail = self._trail, []
+            self._flush_trail(trail)
+            if not batch:
+                return 0
+            ops = [
+                UpdateOne(
+                    {'_id': ObjectId(user_id),
+                     '$or': [{'location_updated_at': None}, {'location_updated_at': {'$lt': p['at']}}]},
+                    {'$set': {'latitude': p['lat'], 'longitude': p['lon'], 'location_updated_at': p['at']}},
+                )
+                for user_id, p in batch.items()
+            ]
+            start = time.perf_counter()
+            try:
+                result = User._get_collection().bulk_write(ops, ordered=False)
+            except Exception as e:
+                logger.warning("Error flushing provider locations: %s", e)
+                with self._lock:
+                    # Keep anything newer that arrived while we were writing
+                    for user_id, p in batch.items():
+                        self._pending.setdefault(user_id, p)
+                    self.metrics['errors'] += 1
+                return 0
+            with self._lock:
+                self.metrics['flushes'] += 1
+                self.metrics['writes'] += len(ops)
+                self.metrics['applied'] += result.modified_count
+                self.metrics['last_flush_ms'] = round((time.perf_counter() - start) * 1000, 2)
+            return len(ops)
+
+    def _flush_trail(self, trail):
+        if not trail:
+            return
+        try:
+            insert_trail(trail)
+        except Exception as e:
+            logger.warning("Error writing location trail: %s", e)
+            with self._lock:
+                self._trail = (trail + self._trail)[-MAX_PENDING_TRAIL:]
+                self.metrics['errors'] += 1
+            return
+        with self._lock:
+            self.metrics['trail_points'] += len(trail)
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.metrics, pending=len(self._pending), pending_trail=len(self._trail),
+                        tracked=len(self._latest), flush_interval=self.flush_interval)
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='location-flush', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def stop(self):
+        """Stop the flusher and write whatever is pending"""
+        self._stop.set()
+        self.flush()
+
+
+location_buffer = LocationBuffer()
+atexit.register(location_buffer.stop)
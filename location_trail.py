@@ -0,0 +1,115 @@
+"""
+Per-booking location history in a MongoDB time-series collection.
+
+While a provider has active bookings, their tracking pings are thinned
+(TRAIL_MIN_DISTANCE_M / TRAIL_MIN_INTERVAL) and queued by the location
+buffer, which inserts them in the same periodic flush as the latest-position
+updates. One measurement is {ts, meta: {booking, provider}, lat, lon}; the
+server buckets and compresses them by meta. Points expire after
+LOCATION_TRAIL_TTL_DAYS.
+"""
+
+import math
+import os
+from datetime import timedelta
+
+from bson import ObjectId
+from mongoengine.connection import get_db
+from pymongo.errors import CollectionInvalid, OperationFailure
+
+TRAIL_COLLECTION = 'location_trail'
+TRAIL_TTL_DAYS = int(os.getenv('LOCATION_TRAIL_TTL_DAYS', 90))
+TRAIL_MIN_DISTANCE_M = float(os.getenv('TRAIL_MIN_DISTANCE_M', 10))
+TRAIL_MIN_INTERVAL = timedelta(seconds=float(os.getenv('TRAIL_MIN_INTERVAL', 30)))
+
+EARTH_RADIUS_M = 6371000.0
+
+_collection_ready = False
+
+
+def trail_collection():
+    """The time-series collection, created on first use"""
+    global _collection_ready
+    db = get_db()
+    if not _collection_ready:
+        try:
+            db.create_collection(
+                TRAIL_COLLECTION,
+                timeseries={'timeField': 'ts', 'metaField': 'meta', 'granularity': 'seconds'},
+                expireAfterSeconds=TRAIL_TTL_DAYS * 86400,
+            )
+            db[TRAIL_COLLECTION].create_index([('meta.booking', 1), ('ts', 1)])
+        except (CollectionInvalid, OperationFailure):
+            pass  # already exists
+        _collection_ready = True
+    return db[TRAIL_COLLECTION]
+
+
+def distance_m(lat1, lon1, lat2, lon2):
+    """Haversine distance in metres"""
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp, dl = p2 - p1, math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+def worth_keeping(previous, position):
+    """Thin the trail: keep a fix if the provider moved or enough time passed"""
+    if previous is None:
+        return True
+    return (position['at'] - previous['at'] >= TRAIL_MIN_INTERVAL or
+            distance_m(previous['lat'], previous['lon'], position['lat'], position['lon']) >= TRAIL_MIN_DISTANCE_M)
+
+
+def trail_documents(provider_user_id, booking_ids, position):
+    return [{
+        'ts': position['at'],
+        'meta': {'booking': ObjectId(b), 'provider': ObjectId(provider_user_id)},
+        'lat': position['lat'],
+        'lon': position['lon'],
+    } for b in booking_ids]
+
+
+def insert_trail(documents):
+    if documents:
+        trail_collection().insert_many(documents, ordered=False)
+
+
+def load_trail(booking_id):
+    """[(lat, lon, ts)] for a booking in time order"""
+    cursor = trail_collection().find({'meta.booking': ObjectId(booking_id)},
+                                     {'_id': 0, 'lat': 1, 'lon': 1, 'ts': 1}).sort('ts', 1)
+    return [(d['lat'], d['lon'], d['ts']) for d in cursor]
+
+
+def simplify(points, tolerance_m):
+    """Douglas-Peucker on (lat, lon, ...) tuples; keeps endpoints and order"""
+    if len(points) < 3 or tolerance_m <= 0:
+        return list(points)
+    # Project to local metres once; fine at city scale
+    lat0 = math.radians(points[0][0])
+    xy = [(math.radians(p[1]) * math.cos(lat0) * EARTH_RADIUS_M, math.radians(p[0]) * EARTH_RADIUS_M)
+          for p in points]
+
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        (x1, y1), (x2, y2) = xy[first], xy[last]
+        dx, dy = x2 - x1, y2 - y1
+        seg_len = math.hypot(dx, dy)
+        best, index = 0.0, None
+        for i in range(first + 1, last):
+            x, y = xy[i]
+            if seg_len == 0:
+                d = math.hypot(x - x1, y - y1)
+            else:
+                d = abs(dy * x - dx * y + x2 * y1 - y2 * x1) / seg_len
+            if d > best:
+                best, index = d, i
+        if index is not None and best > tolerance_m:
+            keep[index] = True
+            stack.append((first, index))
+            stack.append((index, last))
+    return [p for p, k in zip(points, keep) if k]
@@ -0,0 +1,163 @@
+"""
+Leveled, buffered logging for the web app, tagged with a request id.
+
+A QueueHandler on the root logger runs the request-id and sampling filters in
+the calling thread and puts the record on an in-memory queue; a QueueListener
+thread formats it and writes it to stdout, so a request never waits on the
+stream. Settings:
+
+  LOG_LEVEL         root level (default INFO)
+  LOG_LEVELS        per-module levels, e.g. routes.provider=DEBUG,presence=WARNING
+  LOG_DEBUG_SAMPLE  keep one in N DEBUG records per call site (default 1, all of
+                    them); a call can pick its own N with extra={'sample_every': N}
+  LOG_QUEUE_SIZE    records waiting for the listener before new ones are dropped
+                    (default 10000)
+  LOG_FORMAT        logging format string; %(request_id)s is available
+
+The request id is the incoming X-Request-ID header or a new random one and is
+echoed in the response; Socket.IO events carry the session id instead.
+"""
+
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import uuid
+
+from flask import g, has_request_context, request
+
+DEFAULT_FORMAT = '%(asctime)s %(levelname)s [%(request_id)s] %(name)s: %(message)s'
+
+# Arguments that cannot change between the call and the listener formatting them
+_IMMUTABLE_ARGS = (str, int, float, bool, bytes, type(None))
+
+_listener = None
+_handler = None
+
+
+def current_request_id():
+    if not has_request_context():
+        return '-'
+    return g.get('request_id') or getattr(request, 'sid', None) or '-'
+
+
+class RequestIdFilter(logging.Filter):
+    """Stamp each record with the id of the request or socket session that logged it"""
+
+    def filter(self, record):
+        if not hasattr(record, 'request_id'):
+            record.request_id = current_request_id()
+        return True
+
+
+class SampleFilter(logging.Filter):
+    """Keep one in `every` DEBUG records per call site; other levels always pass"""
+
+    def __init__(self, every=1):
+        super().__init__()
+        self.every = every
+        self._counts = {}
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG:
+            return True
+        every = getattr(record, 'sample_every', self.every)
+        if every <= 1:
+            return True
+        # Unlocked: a lost increment under contention only shifts which record is kept
+        key = (record.pathname, record.lineno)
+        seen = self._counts.get(key, 0)
+        self._counts[key] = seen + 1
+        return seen % every == 0
+
+
+class BufferedHandler(logging.handlers.QueueHandler):
+    """QueueHandler that leaves formatting to the listener and drops records when the queue is full"""
+
+    def __init__(self, records):
+        super().__init__(records)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Defer %-formatting unless an argument could be mutated before the listener gets to it
+        if record.args and not all(isinstance(a, _IMMUTABLE_ARGS) for a in _args(record)):
+            record.msg, record.args = record.getMessage(), None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def _args(record):
+    return record.args.values() if isinstance(record.args, dict) else record.args
+
+
+def _levels(spec):
+    """{'routes.provider': 'DEBUG'} from 'routes.provider=DEBUG,...'"""
+    levels = {}
+    for item in (spec or '').split(','):
+        name, _, level = item.partition('=')
+        if name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def _start_listener():
+    global _listener
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(logging.Formatter(os.getenv('LOG_FORMAT', DEFAULT_FORMAT)))
+    _listener = logging.handlers.QueueListener(_handler.queue, stream, respect_handler_level=False)
+    _listener.start()
+
+
+def _restart_after_fork():
+    # The listener thread does not survive a fork (gunicorn --preload); give the child its own
+    _handler.queue = queue.Queue(_handler.queue.maxsize)
+    _start_listener()
+
+
+def configure_logging():
+    """Install the queue handler on the root logger; safe to call more than once"""
+    global _handler
+    if _handler is not None:
+        return
+    _handler = BufferedHandler(queue.Queue(int(os.getenv('LOG_QUEUE_SIZE', 10000))))
+    _handler.addFilter(RequestIdFilter())
+    _handler.addFilter(SampleFilter(int(os.getenv('LOG_DEBUG_SAMPLE', 1))))
+
+    root = logging.getLogger()
+    root.addHandler(_handler)
+    root.setLevel(os.getenv('LOG_LEVEL', 'INFO').upper())
+    for name, level in _levels(os.getenv('LOG_LEVELS')).items():
+        logging.getLogger(name).setLevel(level)
+
+    _start_listener()
+    os.register_at_fork(after_in_child=_restart_after_fork)
+    atexit.register(stop_logging)
+
+
+def stop_logging():
+    """Write out whatever is still queued"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def init_request_ids(app):
+    """Give every HTTP request an id (X-Request-ID in, X-Request-ID out)"""
+
+    @app.before_request
+    def assign_request_id():
+        g.request_id = request.headers.get('X-Request-ID', '')[:64] or uuid.uuid4().hex[:16]
+
+    @app.after_request
+    def echo_request_id(response):
+        response.headers['X-Request-ID'] = g.get('request_id', '')
+        return response
+
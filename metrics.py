@@ -0,0 +1,253 @@
+"""
+Per-process request, Mongo and Socket.IO metrics in Prometheus text format.
+
+Recorded per Flask endpoint (blueprint.function, "unmatched" for 404s):
+
+  hofix_http_request_duration_seconds   histogram of request latency
+  hofix_http_responses_total            responses by status code
+  hofix_http_request_mongo_commands     histogram of Mongo commands per request
+  hofix_http_request_mongo_seconds_total time spent in Mongo commands
+
+and process-wide: Mongo commands and their time by command name (including
+background flushes), and Socket.IO emits by event. Recording is a dict
+update under a lock; /metrics renders on demand.
+
+Views declare how many Mongo commands one request may issue with
+@query_budget(n). The test suite fails a request over its budget (see
+conftest.budgeted_client); in production it is logged and counted in
+hofix_http_query_budget_exceeded_total.
+
+Every gunicorn worker keeps its own numbers and labels them with worker=<pid>,
+so scrape each worker (or aggregate with sum by (...)). Set METRICS_TOKEN to
+require `Authorization: Bearer <token>` on /metrics.
+"""
+
+import bisect
+import logging
+import os
+import threading
+import time
+
+from flask import Response, current_app, g, request
+from pymongo import monitoring
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COMMAND_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+logger = logging.getLogger(__name__)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def lines(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            cumulative += count
+            le = '+Inf' if bound == float('inf') else repr(bound)
+            yield f'{name}_bucket{_labels(labels, le=le)} {cumulative}'
+        yield f'{name}_sum{_labels(labels)} {self.sum!r}'
+        yield f'{name}_count{_labels(labels)} {cumulative}'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels, **extra):
+    items = list(labels.items()) + list(extra.items())
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in items) + '}'
+
+
+class Metrics:
+    """All counters for this process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.worker = str(os.getpid())
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.latency = {}
+            self.responses = {}
+            self.request_commands = {}
+            self.request_mongo_seconds = {}
+            self.commands = {}
+            self.command_seconds = {}
+            self.command_failures = {}
+            self.emits = {}
+            self.budget_exceeded = {}
+
+    # Requests
+
+    def start_request(self):
+        self._local.commands = 0
+        self._local.mongo_seconds = 0.0
+        return time.perf_counter()
+
+    def finish_request(self, endpoint, method, status, started):
+        elapsed = time.perf_counter() - started
+        commands = getattr(self._local, 'commands', 0)
+        mongo_seconds = getattr(self._local, 'mongo_seconds', 0.0)
+        self._local.commands = None
+        key = (endpoint, method)
+        with self._lock:
+            if key not in self.latency:
+                self.latency[key] = Histogram(LATENCY_BUCKETS)
+                self.request_commands[key] = Histogram(COMMAND_BUCKETS)
+                self.request_mongo_seconds[key] = 0.0
+            self.latency[key].observe(elapsed)
+            self.request_commands[key].observe(commands)
+            self.request_mongo_seconds[key] += mongo_seconds
+            self.responses[key + (status,)] = self.responses.get(key + (status,), 0) + 1
+        return commands
+
+    def count_budget_exceeded(self, endpoint):
+        with self._lock:
+            self.budget_exceeded[endpoint] = self.budget_exceeded.get(endpoint, 0) + 1
+
+    # Mongo commands, called from the thread that ran them
+
+    def record_command(self, name, seconds, failed=False):
+        if getattr(self._local, 'commands', None) is not None:
+            self._local.commands += 1
+            self._local.mongo_seconds += seconds
+        with self._lock:
+            self.commands[name] = self.commands.get(name, 0) + 1
+            self.command_seconds[name] = self.command_seconds.get(name, 0.0) + seconds
+            if failed:
+                self.command_failures[name] = self.command_failures.get(name, 0) + 1
+
+    # Socket.IO
+
+    def count_emit(self, event):
+        with self._lock:
+            self.emits[event] = self.emits.get(event, 0) + 1
+
+    # Exposition
+
+    def render(self):
+        worker = {'worker': self.worker}
+        out = []
+
+        def family(name, kind, help_text):
+            out.append(f'# HELP {name} {help_text}')
+            out.append(f'# TYPE {name} {kind}')
+
+        with self._lock:
+            family('hofix_http_request_duration_seconds', 'histogram', 'Request latency by endpoint')
+            for (endpoint, method), hist in sorted(self.latency.items()):
+                out.extend(hist.lines('hofix_http_request_duration_seconds',
+                                      dict(worker, endpoint=endpoint, method=method)))
+            family('hofix_http_responses_total', 'counter', 'Responses by endpoint and status code')
+            for (endpoint, method, status), count in sorted(self.responses.items()):
+                out.append(f'hofix_http_responses_total'
+                           f'{_labels(dict(worker, endpoint=endpoint, method=method, status=status))} {count}')
+            family('hofix_http_request_mongo_commands', 'histogram', 'Mongo commands issued per request')
+            for (endpoint, method), hist in sorted(self.request_commands.items()):
+                out.extend(hist.lines('hofix_http_request_mongo_commands',
+                                      dict(worker, endpoint=endpoint, method=method)))
+            family('hofix_http_request_mongo_seconds_total', 'counter', 'Time requests spent in Mongo commands')
+            for (endpoint, method), seconds in sorted(self.request_mongo_seconds.items()):
+                out.append(f'hofix_http_request_mongo_seconds_total'
+                           f'{_labels(dict(worker, endpoint=endpoint, method=method))} {seconds!r}')
+            family('hofix_http_query_budget_exceeded_total', 'counter', 'Requests over their view\'s query budget')
+            for endpoint, count in sorted(self.budget_exceeded.items()):
+                out.append(f'hofix_http_query_budget_exceeded_total{_labels(dict(worker, endpoint=endpoint))} {count}')
+            family('hofix_mongo_commands_total', 'counter', 'Mongo commands by name')
+            for name, count in sorted(self.commands.items()):
+                out.append(f'hofix_mongo_commands_total{_labels(dict(worker, command=name))} {count}')
+            family('hofix_mongo_command_seconds_total', 'counter', 'Time spent in Mongo commands by name')
+            for name, seconds in sorted(self.command_seconds.items()):
+                out.append(f'hofix_mongo_command_seconds_total{_labels(dict(worker, command=name))} {seconds!r}')
+            family('hofix_mongo_command_failures_total', 'counter', 'Failed Mongo commands by name')
+            for name, count in sorted(self.command_failures.items()):
+                out.append(f'hofix_mongo_command_failures_total{_labels(dict(worker, command=name))} {count}')
+            family('hofix_socketio_emits_total', 'counter', 'Socket.IO emits by event')
+            for event, count in sorted(self.emits.items()):
+                out.append(f'hofix_socketio_emits_total{_labels(dict(worker, event=event))} {count}')
+        return '\n'.join(out) + '\n'
+
+
+metrics = Metrics()
+
+
+class CommandMetrics(monitoring.CommandListener):
+    """Feeds every Mongo command's duration into `metrics`"""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        metrics.record_command(event.command_name, event.duration_micros / 1e6)
+
+    def failed(self, event):
+        metrics.record_command(event.command_name, event.duration_micros / 1e6, failed=True)
+
+
+command_metrics = CommandMetrics()
+
+
+def _after_fork():
+    # A preloaded app forks into workers that must not report the master's pid or counts
+    metrics.worker = str(os.getpid())
+    metrics.reset()
+
+
+os.register_at_fork(after_in_child=_after_fork)
+
+
+def query_budget(commands):
+    """Declare the most Mongo commands one request to this view may issue"""
+    def decorate(view):
+        view.query_budget = commands
+        return view
+    return decorate
+
+
+def budget_for(app, endpoint):
+    """The view's declared query budget, or None"""
+    return getattr(app.view_functions.get(endpoint), 'query_budget', None)
+
+
+def init_metrics(app):
+    """Time every request and serve /metrics"""
+
+    @app.before_request
+    def start_request_metrics():
+        g.metrics_started = metrics.start_request()
+
+    @app.after_request
+    def record_request_metrics(response):
+        started = g.pop('metrics_started', None)
+        if started is not None:
+            endpoint = request.endpoint or 'unmatched'
+            commands = metrics.finish_request(endpoint, request.method, response.status_code, started)
+            budget = budget_for(current_app, endpoint)
+            if budget is not None and commands > budget:
+                metrics.count_budget_exceeded(endpoint)
+                logger.warning("%s issued %d Mongo commands, budget is %d", endpoint, commands, budget)
+        return response
+
+    @app.teardown_request
+    def record_failed_request_metrics(error=None):
+        # after_request is skipped when a view raises
+        started = g.pop('metrics_started', None)
+        if started is not None:
+            metrics.finish_request(request.endpoint or 'unmatched', request.method, 500, started)
+
+    @app.get('/metrics')
+    def prometheus_metrics():
+        token = os.getenv('METRICS_TOKEN')
+        if token and request.headers.get('Authorization') != f'Bearer {token}':
+            return Response('Unauthorized\n', status=401, mimetype='text/plain')
+        return Response(metrics.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
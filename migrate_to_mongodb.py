@@ -12,6 +12,7 @@ from datetime import datetime
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from models import connect_to_mongodb, Service, User, Provider
+from catalog import bump_version, CATALOG_CACHE
 
 
 def seed_services():
@@ -82,6 +83,7 @@ def seed_services():
         )
         service.save()
         print(f"✓ Created service: {service_data['name']}")
+    bump_version(CATALOG_CACHE)
     
     print(f"Successfully seeded {len(services)} services!")
 
@@ -1,7 +1,7 @@
 from datetime import datetime
 from mongoengine import Document, EmbeddedDocument, fields
-from mongoengine import connect, disconnect_all
-import os
+from mongoengine import disconnect_all
+from database import connect_mongodb
 
 
 class User(Document):
@@ -14,6 +14,7 @@ class User(Document):
     latitude = fields.FloatField()
     longitude = fields.FloatField()
     address = fields.StringField(max_length=255)
+    location_updated_at = fields.DateTimeField()
     avatar_path = fields.StringField(max_length=255)
     credits = fields.FloatField(default=0.0)
     rating = fields.FloatField(default=5.0)
@@ -96,9 +97,31 @@ class Payment(Document):
     razorpay_order_id = fields.StringField()
     razorpay_signature = fields.StringField()
     
+    # Idempotent order creation
+    idempotency_key = fields.StringField(max_length=100)
+    order_requested_at = fields.DateTimeField()  # Set while a gateway order is being created
+    settled_at = fields.DateTimeField()
+    
     meta = {
         'collection': 'payments',
-        'indexes': ['booking', 'status']
+        'indexes': ['booking', 'status', 'razorpay_order_id']
+    }
+
+
+class PaymentEvent(Document):
+    """Gateway webhook event, recorded before it is applied"""
+    event_id = fields.StringField(max_length=100, required=True, unique=True)
+    event = fields.StringField(max_length=50, required=True)
+    razorpay_order_id = fields.StringField()
+    razorpay_payment_id = fields.StringField()
+    payment_status = fields.StringField(max_length=30)  # Gateway-side status, e.g. captured
+    payload = fields.DictField()
+    received_at = fields.DateTimeField(default=datetime.utcnow)
+    processed_at = fields.DateTimeField()
+    
+    meta = {
+        'collection': 'payment_events',
+        'indexes': ['razorpay_order_id', 'processed_at']
     }
 
 
@@ -116,10 +139,55 @@ class ServiceCompletion(Document):
     }
 
 
+class BookingRollup(Document):
+    """Booking count and revenue per day x service category x status"""
+    day = fields.DateTimeField(required=True)  # Midnight UTC of the booking's created_at
+    category = fields.StringField(max_length=100, required=True)
+    status = fields.StringField(max_length=50, required=True)
+    count = fields.IntField(default=0)
+    revenue = fields.FloatField(default=0.0)
+    
+    meta = {
+        'collection': 'booking_rollups',
+        'indexes': [
+            {'fields': ['day', 'category', 'status'], 'unique': True},
+            'category'
+        ]
+    }
+
+
+class CacheVersion(Document):
+    """Version counter bumped on writes so every worker can invalidate its cache"""
+    name = fields.StringField(primary_key=True)
+    version = fields.IntField(default=0)
+    
+    meta = {
+        'collection': 'cache_versions'
+    }
+
+
+class CompletionUpload(Document):
+    """Resumable chunked upload of a single service completion image"""
+    owner = fields.ReferenceField('User', required=True)
+    filename = fields.StringField(max_length=255, required=True)
+    size = fields.IntField(required=True, min_value=1)  # Declared total size in bytes
+    received = fields.IntField(default=0)  # Last acknowledged offset
+    append_started_at = fields.DateTimeField()  # Set while a chunk is being appended to the file
+    attached_at = fields.DateTimeField()  # Set by the completion that claimed the upload
+    status = fields.StringField(max_length=20, default='Uploading',
+                               choices=['Uploading', 'Finalized', 'Attached'])
+    path = fields.StringField(max_length=255)  # Relative static path once finalized
+    created_at = fields.DateTimeField(default=datetime.utcnow)
+
+    meta = {
+        'collection': 'completion_uploads',
+        'indexes': ['owner', 'status', 'created_at']
+    }
+
+
 def connect_to_mongodb():
     """Initialize MongoDB connection"""
-    mongodb_uri = os.getenv('MONGODB_URI', 'mongodb://localhost:27017/hofix')
-    connect(host=mongodb_uri)
+    connect_mongodb()
 
 
 def disconnect_from_mongodb():
@@ -0,0 +1,414 @@
+#!/usr/bin/env python3
+"""
+Razorpay payment gateway adapter.
+
+Wraps the Razorpay SDK with a pooled HTTP session, connect/read timeouts,
+bounded retries with jittered backoff, a circuit breaker and latency metrics.
+Also ships an in-process fake of the Razorpay orders API so the payment
+endpoints can be load tested offline:
+
+    python payment_gateway.py fake-server --port 9010 --latency-ms 50
+    RAZORPAY_BASE_URL=http://127.0.0.1:9010/v1 python app.py
+"""
+
+import argparse
+import hashlib
+import hmac
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+RAZORPAY_API_URL = 'https://api.razorpay.com/v1'
+
+
+class GatewayUnavailable(Exception):
+    """Raised when the gateway cannot be reached or the circuit is open"""
+
+
+class CircuitBreaker:
+    """Opens after consecutive failures and lets one probe through after a cool-down"""
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == 'closed':
+                return True
+            if self.state == 'open':
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    return False
+                self.state = 'half_open'
+            # Half-open: a single probe decides whether to close again
+            if self._probe_in_flight:
+                return False
+            self._probe_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.state = 'closed'
+            self.failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probe_in_flight = False
+            if self.state == 'half_open' or self.failures >= self.failure_threshold:
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+
+
+class GatewayMetrics:
+    """Per-operation call counts and a sliding window of latencies"""
+
+    def __init__(self, window=1024):
+        self.window = window
+        self._ops = {}
+        self._lock = threading.Lock()
+
+    def _op(self, op):
+        if op not in self._ops:
+            self._ops[op] = {'count': 0, 'errors': 0, 'retries': 0, 'rejected': 0,
+                             'total_seconds': 0.0, 'latencies': deque(maxlen=self.window)}
+        return self._ops[op]
+
+    def observe(self, op, seconds, ok=True):
+        with self._lock:
+            stats = self._op(op)
+            stats['count'] += 1
+            stats['total_seconds'] += seconds
+            stats['latencies'].append(seconds)
+            if not ok:
+                stats['errors'] += 1
+
+    def retry(self, op):
+        with self._lock:
+            self._op(op)['retries'] += 1
+
+    def rejected(self, op):
+        with self._lock:
+            self._op(op)['rejected'] += 1
+
+    def snapshot(self):
+        with self._lock:
+            result = {}
+            for op, stats in self._ops.items():
+                latencies = sorted(stats['latencies'])
+                result[op] = {
+                    'count': stats['count'],
+                    'errors': stats['errors'],
+                    'retries': stats['retries'],
+                    'rejected': stats['rejected'],
+                    'avg_ms': round(stats['total_seconds'] / stats['count'] * 1000, 2) if stats['count'] else 0.0,
+                    'p50_ms': _percentile_ms(latencies, 50),
+                    'p95_ms': _percentile_ms(latencies, 95),
+                    'p99_ms': _percentile_ms(latencies, 99),
+                }
+            return result
+
+
+def _percentile_ms(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return round(sorted_values[index] * 1000, 2)
+
+
+def sign_payment(key_secret, order_id, payment_id):
+    """Checkout signature Razorpay attaches to a successful payment"""
+    return hmac.new(key_secret.encode('utf-8'), f'{order_id}|{payment_id}'.encode('utf-8'),
+                    hashlib.sha256).hexdigest()
+
+
+def _request_not_sent(exc):
+    """True when the request provably never reached the gateway (safe to retry a POST)"""
+    if isinstance(exc, requests.ConnectTimeout):
+        return True
+    if isinstance(exc, requests.ConnectionError) and exc.args:
+        return isinstance(getattr(exc.args[0], 'reason', None), NewConnectionError)
+    return False
+
+
+class RazorpayGateway:
+    """Razorpay client with pooling, timeouts, retries and a circuit breaker"""
+
+    def __init__(self, key_id, key_secret, base_url=RAZORPAY_API_URL, webhook_secret=None,
+                 connect_timeout=3.05, read_timeout=10.0, max_retries=2,
+                 backoff_base=0.2, backoff_cap=2.0, pool_size=20, breaker=None):
+        import razorpay  # Deferred: the SDK is slow to import
+
+        self.key_id = key_id
+        self.key_secret = key_secret
+        self.webhook_secret = webhook_secret or key_secret
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.breaker = breaker or CircuitBreaker()
+        self.metrics = GatewayMetrics()
+
+        # Retries are handled here so they can be jittered and counted
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.client = razorpay.Client(session=self.session, auth=(key_id, key_secret), base_url=base_url)
+        self.client.set_app_details({'title': 'hofix'})  # Added to the SDK's User-Agent
+        self._errors = (razorpay.errors.ServerError, razorpay.errors.GatewayError)
+        self._bad_request = razorpay.errors.BadRequestError
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            key_id=os.getenv('RAZORPAY_KEY_ID', 'rzp_test_1234567890'),
+            key_secret=os.getenv('RAZORPAY_KEY_SECRET', 'test_secret_key'),
+            base_url=os.getenv('RAZORPAY_BASE_URL', RAZORPAY_API_URL),
+            webhook_secret=os.getenv('RAZORPAY_WEBHOOK_SECRET'),
+            connect_timeout=float(os.getenv('RAZORPAY_CONNECT_TIMEOUT', 3.05)),
+            read_timeout=float(os.getenv('RAZORPAY_READ_TIMEOUT', 10)),
+            max_retries=int(os.getenv('RAZORPAY_MAX_RETRIES', 2)),
+            pool_size=int(os.getenv('RAZORPAY_POOL_SIZE', 20)),
+            breaker=CircuitBreaker(
+                failure_threshold=int(os.getenv('RAZORPAY_BREAKER_THRESHOLD', 5)),
+                reset_timeout=float(os.getenv('RAZORPAY_BREAKER_RESET', 30)),
+            ),
+        )
+
+    def _backoff(self, attempt):
+        # Full jitter keeps retrying workers from synchronising
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** (attempt - 1)))
+
+    def _call(self, op, fn, idempotent):
+        if not self.breaker.allow():
+            self.metrics.rejected(op)
+            raise GatewayUnavailable('Payment gateway circuit is open')
+
+        attempt = 0
+        while True:
+            start = time.perf_counter()
+            try:
+                result = fn(timeout=self.timeout)
+            except self._bad_request:
+                # The gateway answered; the request itself was wrong
+                self.metrics.observe(op, time.perf_counter() - start, ok=False)
+                self.breaker.record_success()
+                raise
+            except (requests.RequestException, *self._errors) as exc:
+                self.metrics.observe(op, time.perf_counter() - start, ok=False)
+                if attempt < self.max_retries and (idempotent or _request_not_sent(exc)):
+                    attempt += 1
+                    self.metrics.retry(op)
+                    time.sleep(self._backoff(attempt))
+                    continue
+                self.breaker.record_failure()
+                raise GatewayUnavailable(f'{op} failed: {exc}') from exc
+            self.metrics.observe(op, time.perf_counter() - start)
+            self.breaker.record_success()
+            return result
+
+    def create_order(self, data):
+        return self._call('create_order', lambda **kw: self.client.order.create(data=data, **kw), idempotent=False)
+
+    def fetch_order(self, order_id):
+        return self._call('fetch_order', lambda **kw: self.client.order.fetch(order_id, **kw), idempotent=True)
+
+    def find_orders_by_receipt(self, receipt):
+        result = self._call('find_orders', lambda **kw: self.client.order.all({'receipt': receipt}, **kw),
+                            idempotent=True)
+        return result.get('items', [])
+
+    def order_payments(self, order_id):
+        result = self._call('order_payments', lambda **kw: self.client.order.payments(order_id, **kw),
+                            idempotent=True)
+        return result.get('items', [])
+
+    def verify_webhook_signature(self, body, signature):
+        """Check the X-Razorpay-Signature of a raw webhook body"""
+        expected = hmac.new(self.webhook_secret.encode('utf-8'), body, hashlib.sha256).hexdigest()
+        return hmac.compare_digest(expected, str(signature or ''))
+
+    def verify_payment_signature(self, order_id, payment_id, signature):
+        """Check a checkout signature locally; no network call is made"""
+        expected = sign_payment(self.key_secret, order_id, payment_id)
+        return hmac.compare_digest(expected, str(signature or ''))
+
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+def get_gateway():
+    """Return the process-wide gateway, creating it on first use"""
+    global _gateway
+    if _gateway is None:
+        with _gateway_lock:
+            if _gateway is None:
+                _gateway = RazorpayGateway.from_env()
+    return _gateway
+
+
+class _FakeHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128  # Avoid SYN retransmits when many clients connect at once
+
+
+class FakeRazorpayServer:
+    """In-process stand-in for the Razorpay orders API with injectable latency and failures"""
+
+    def __init__(self, host='127.0.0.1', port=0, key_secret='test_secret_key',
+                 latency=0.0, failure_rate=0.0, seed=None):
+        self.key_secret = key_secret
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.fail_requests = 0  # Respond 502 to this many upcoming requests
+        self.requests = 0
+        self.orders = {}
+        self.payments = {}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._httpd = _FakeHTTPServer((host, port), self._handler_class())
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._httpd.server_address[:2]
+        return f'http://{host}:{port}/v1'
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def capture_payment(self, order_id):
+        """Simulate a customer paying an order; returns (payment_id, signature)"""
+        payment_id = f'pay_{uuid.uuid4().hex[:14]}'
+        with self._lock:
+            order = self.orders[order_id]
+            order['status'] = 'paid'
+            order['amount_paid'] = order['amount']
+            order['amount_due'] = 0
+            self.payments.setdefault(order_id, []).append({
+                'id': payment_id, 'entity': 'payment', 'order_id': order_id,
+                'amount': order['amount'], 'currency': order['currency'],
+                'status': 'captured', 'created_at': int(time.time()),
+            })
+        return payment_id, sign_payment(self.key_secret, order_id, payment_id)
+
+    def _create_order(self, body):
+        order_id = f'order_{uuid.uuid4().hex[:14]}'
+        order = {
+            'id': order_id, 'entity': 'order', 'amount': body.get('amount', 0),
+            'amount_paid': 0, 'amount_due': body.get('amount', 0),
+            'currency': body.get('currency', 'INR'), 'receipt': body.get('receipt'),
+            'notes': body.get('notes', {}), 'status': 'created', 'attempts': 0,
+            'created_at': int(time.time()),
+        }
+        with self._lock:
+            self.orders[order_id] = order
+        return order
+
+    def _handler_class(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status, payload):
+                body = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _simulate(self):
+                with fake._lock:
+                    fake.requests += 1
+                    forced = fake.fail_requests > 0
+                    if forced:
+                        fake.fail_requests -= 1
+                if fake.latency:
+                    time.sleep(fake.latency)
+                if forced or (fake.failure_rate and fake._random.random() < fake.failure_rate):
+                    self._reply(502, {'error': {'code': 'SERVER_ERROR', 'description': 'Injected failure'}})
+                    return False
+                return True
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = json.loads(self.rfile.read(length) or b'{}')
+                if not self._simulate():
+                    return
+                if urlparse(self.path).path.rstrip('/') == '/v1/orders':
+                    self._reply(200, fake._create_order(body))
+                else:
+                    self._reply(404, {'error': {'code': 'BAD_REQUEST_ERROR', 'description': 'Not found'}})
+
+            def do_GET(self):
+                if not self._simulate():
+                    return
+                url = urlparse(self.path)
+                parts = [p for p in url.path.split('/') if p]
+                with fake._lock:
+                    if parts == ['v1', 'orders']:
+                        receipt = parse_qs(url.query).get('receipt', [None])[0]
+                        items = [o for o in fake.orders.values() if receipt is None or o['receipt'] == receipt]
+                        self._reply(200, {'entity': 'collection', 'count': len(items), 'items': items})
+                    elif len(parts) == 3 and parts[:2] == ['v1', 'orders'] and parts[2] in fake.orders:
+                        self._reply(200, fake.orders[parts[2]])
+                    elif len(parts) == 4 and parts[:2] == ['v1', 'orders'] and parts[3] == 'payments':
+                        items = fake.payments.get(parts[2], [])
+                        self._reply(200, {'entity': 'collection', 'count': len(items), 'items': items})
+                    else:
+                        self._reply(404, {'error': {'code': 'BAD_REQUEST_ERROR', 'description': 'Not found'}})
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Razorpay gateway utilities')
+    parser.add_argument('command', choices=['fake-server'], help='Command to execute')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9010)
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='Delay added to every response')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='Fraction of responses that fail with 502')
+    args = parser.parse_args()
+
+    server = FakeRazorpayServer(
+        host=args.host, port=args.port,
+        key_secret=os.getenv('RAZORPAY_KEY_SECRET', 'test_secret_key'),
+        latency=args.latency_ms / 1000, failure_rate=args.failure_rate,
+    )
+    print(f"Fake Razorpay gateway listening on {server.base_url}")
+    print(f"Start the app with RAZORPAY_BASE_URL={server.base_url}")
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
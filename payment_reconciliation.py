@@ -0,0 +1,163 @@
+"""
+Payment settlement shared by the Razorpay webhook and the reconcile batch job.
+
+Both paths only ever move a payment out of Pending, so replayed webhooks,
+a late checkout verification and the batch job can run in any order.
+"""
+
+from datetime import datetime, timedelta
+
+from mongoengine import NotUniqueError
+from pymongo import UpdateOne
+
+from extensions import socket_emitter
+from models import Payment, PaymentEvent
+
+# Gateway payment status -> our Payment.status
+GATEWAY_PAYMENT_STATUS = {
+    'captured': 'Success',
+    'refunded': 'Refunded',
+    'failed': 'Failed',
+}
+
+
+def _settlement(order_id, status, razorpay_payment_id=None):
+    fields = {'status': status, 'settled_at': datetime.utcnow()}
+    if razorpay_payment_id:
+        fields['razorpay_payment_id'] = razorpay_payment_id
+    return {'razorpay_order_id': order_id, 'status': 'Pending'}, {'$set': fields}
+
+
+def settlement_update(order_id, status, razorpay_payment_id=None):
+    """Bulk-write operation settling the pending payment of a gateway order"""
+    return UpdateOne(*_settlement(order_id, status, razorpay_payment_id))
+
+
+def _payment_entity(event):
+    """payload.payment.entity of a webhook event; empty when any level is not an object"""
+    entity = event
+    for key in ('payload', 'payment', 'entity'):
+        entity = entity.get(key) if isinstance(entity, dict) else None
+    return entity if isinstance(entity, dict) else {}
+
+
+def record_payment_event(event_id, event):
+    """Store a webhook event once; returns None when it was already recorded"""
+    entity = _payment_entity(event)
+    record = PaymentEvent(
+        event_id=event_id,
+        event=event.get('event') or 'unknown',
+        razorpay_order_id=entity.get('order_id'),
+        razorpay_payment_id=entity.get('id'),
+        payment_status=entity.get('status'),
+        payload=event,
+    )
+    try:
+        record.save()
+    except NotUniqueError:
+        return None
+    return record
+
+
+def apply_payment_event(record):
+    """Settle the payment a recorded event refers to; returns True if a payment changed"""
+    status = GATEWAY_PAYMENT_STATUS.get(record.payment_status)
+    changed = False
+    # A failed attempt does not fail the order; the customer may retry checkout
+    if status and status != 'Failed' and record.razorpay_order_id:
+        query, update = _settlement(record.razorpay_order_id, status, record.razorpay_payment_id)
+        changed = Payment._get_collection().update_one(query, update).modified_count > 0
+    PaymentEvent.objects(id=record.id).update_one(set__processed_at=datetime.utcnow())
+    return changed
+
+
+def _decide_from_gateway(gateway_payments, created_at, expire_before):
+    captured = [p for p in gateway_payments if p.get('status') == 'captured']
+    if captured:
+        return 'Success', captured[0].get('id')
+    refunded = [p for p in gateway_payments if p.get('status') == 'refunded']
+    if refunded:
+        return 'Refunded', refunded[0].get('id')
+    if gateway_payments and created_at and created_at < expire_before and \
+            all(p.get('status') == 'failed' for p in gateway_payments):
+        return 'Failed', None
+    return None, None
+
+
+def _notify_settled(page, decided, log):
+    # Runs from the CLI, so emit through the message queue to the web workers
+    try:
+        emitter = socket_emitter()
+        for payment in page:
+            order_id = payment['razorpay_order_id']
+            if order_id in decided and payment.get('booking'):
+                emitter.emit('payment_updated', {
+                    'booking_id': str(payment['booking']),
+                    'status': decided[order_id][0],
+                }, to=f"booking_{payment['booking']}")
+    except Exception as e:
+        log(f"  Could not notify clients: {e}")
+
+
+def reconcile_pending_payments(gateway=None, page_size=500, expire_after=timedelta(hours=48),
+                               dry_run=False, log=print):
+    """Settle Pending payments page by page from recorded events, then from the gateway"""
+    if gateway is None:
+        from payment_gateway import get_gateway
+        gateway = get_gateway()
+
+    payments = Payment._get_collection()
+    events = PaymentEvent._get_collection()
+    expire_before = datetime.utcnow() - expire_after
+    summary = {'scanned': 0, 'from_events': 0, 'from_gateway': 0, 'settled': 0, 'gateway_errors': 0, 'pages': 0}
+
+    last_id = None
+    while True:
+        query = {'status': 'Pending', 'razorpay_order_id': {'$ne': None}}
+        if last_id is not None:
+            query['_id'] = {'$gt': last_id}
+        page = list(payments.find(query, {'razorpay_order_id': 1, 'created_at': 1, 'booking': 1})
+                    .sort('_id', 1).limit(page_size))
+        if not page:
+            break
+        last_id = page[-1]['_id']
+        summary['pages'] += 1
+        summary['scanned'] += len(page)
+
+        # Webhook events already on record settle without a gateway round trip
+        order_ids = [p['razorpay_order_id'] for p in page]
+        decided = {}
+        for event in events.find({'razorpay_order_id': {'$in': order_ids}},
+                                 {'razorpay_order_id': 1, 'razorpay_payment_id': 1, 'payment_status': 1}
+                                 ).sort('received_at', 1):
+            status = GATEWAY_PAYMENT_STATUS.get(event.get('payment_status'))
+            if status and status != 'Failed':
+                decided[event['razorpay_order_id']] = (status, event.get('razorpay_payment_id'))
+        summary['from_events'] += len(decided)
+
+        for payment in page:
+            order_id = payment['razorpay_order_id']
+            if order_id in decided:
+                continue
+            try:
+                status, payment_id = _decide_from_gateway(gateway.order_payments(order_id),
+                                                          payment.get('created_at'), expire_before)
+            except Exception as e:
+                summary['gateway_errors'] += 1
+                log(f"  Could not query gateway for {order_id}: {e}")
+                continue
+            if status:
+                decided[order_id] = (status, payment_id)
+                summary['from_gateway'] += 1
+
+        ops = [settlement_update(order_id, status, payment_id)
+               for order_id, (status, payment_id) in decided.items()]
+        if ops and not dry_run:
+            result = payments.bulk_write(ops, ordered=False)
+            summary['settled'] += result.modified_count
+            events.update_many({'razorpay_order_id': {'$in': list(decided)}, 'processed_at': None},
+                               {'$set': {'processed_at': datetime.utcnow()}})
+            _notify_settled(page, decided, log)
+        log(f"  Page {summary['pages']}: {len(page)} pending, {len(ops)} settled")
+
+    return summary
@@ -0,0 +1,212 @@
+"""
+Which providers have a live socket right now.
+
+Each worker tracks its own provider sessions (one per socket, so several tabs
+or devices keep a provider online until the last one goes) and refreshes them
+on heartbeats and location pings. Sessions silent for PRESENCE_SESSION_TTL are
+dropped unless the Socket.IO server still holds their socket open, so only
+sessions whose disconnect never arrived age out, whatever page the provider
+has open. With SOCKET_MESSAGE_QUEUE set, workers share presence over a Redis
+pub/sub channel next to the Socket.IO one: changes are published as they
+happen and every PRESENCE_SYNC_INTERVAL each worker republishes its full set,
+which others keep for three intervals, so a crashed worker's providers age
+out. Lookups never touch Mongo.
+"""
+
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+from extensions import SOCKET_MESSAGE_QUEUE, SOCKET_CHANNEL
+
+logger = logging.getLogger(__name__)
+
+PRESENCE_CHANNEL = f"{SOCKET_CHANNEL}-presence"
+
+
+class PresenceRegistry:
+    """Online provider user ids, local sessions plus other workers' announcements"""
+
+    def __init__(self, url=SOCKET_MESSAGE_QUEUE, sync_interval=None, session_ttl=None, is_connected=None):
+        self.url = url
+        self.is_connected = is_connected  # sid -> bool, the socket server's view of a session
+        self.sync_interval = float(sync_interval if sync_interval is not None
+                                   else os.getenv('PRESENCE_SYNC_INTERVAL', 10.0))
+        self.session_ttl = float(session_ttl if session_ttl is not None
+                                 else os.getenv('PRESENCE_SESSION_TTL', 120.0))
+        self.worker_id = uuid.uuid4().hex
+        self._sessions = {}  # sid -> (user_id, last_seen)
+        self._local = {}     # user_id -> set of sids
+        self._remote = {}    # worker_id -> (expires_at, set of user_ids)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._started = False
+        self._redis = None
+
+    def connect(self, user_id, sid):
+        """A provider socket opened"""
+        user_id = str(user_id)
+        with self._lock:
+            self._sessions[sid] = (user_id, time.monotonic())
+            sids = self._local.setdefault(user_id, set())
+            came_online = not sids
+            sids.add(sid)
+        if came_online:
+            self._publish({'up': [user_id]})
+        self._ensure_started()
+
+    def heartbeat(self, sid):
+        """Any sign of life from a provider socket; returns False if the sid is unknown"""
+        with self._lock:
+            session = self._sessions.get(sid)
+            if session:
+                self._sessions[sid] = (session[0], time.monotonic())
+        return session is not None
+
+    def disconnect(self, sid):
+        with self._lock:
+            went_offline = self._drop(sid)
+        if went_offline:
+            self._publish({'down': [went_offline]})
+
+    def _drop(self, sid):
+        """Forget a session under the lock; returns the user id if that was its last one"""
+        session = self._sessions.pop(sid, None)
+        if not session:
+            return None
+        sids = self._local.get(session[0], set())
+        sids.discard(sid)
+        if not sids:
+            self._local.pop(session[0], None)
+            return session[0]
+        return None
+
+    def is_online(self, user_id):
+        return bool(self.online_among([user_id]))
+
+    def online_among(self, user_ids):
+        """Subset of user_ids with a live socket on any worker"""
+        self._ensure_started()
+        wanted = {str(u) for u in user_ids}
+        now = time.monotonic()
+        with self._lock:
+            online = wanted & self._local.keys()
+            for expires_at, users in self._remote.values():
+                if expires_at > now:
+                    online |= wanted & users
+        return online
+
+    def online_ids(self):
+        now = time.monotonic()
+        with self._lock:
+            online = set(self._local)
+            for expires_at, users in self._remote.values():
+                if expires_at > now:
+                    online |= users
+        return online
+
+    def snapshot(self):
+        online = len(self.online_ids())
+        with self._lock:
+            return {'worker': self.worker_id, 'online': online, 'local_providers': len(self._local),
+                    'local_sessions': len(self._sessions), 'workers': len(self._remote) + 1}
+
+    def sweep(self):
+        """Drop quiet sessions whose socket is gone; returns the providers that went offline"""
+        now = time.monotonic()
+        with self._lock:
+            stale = [sid for sid, (_, seen) in self._sessions.items() if seen < now - self.session_ttl]
+        still_open = {sid for sid in stale if self.is_connected and self.is_connected(sid)}
+        with self._lock:
+            for sid in still_open:
+                if sid in self._sessions:
+                    self._sessions[sid] = (self._sessions[sid][0], now)
+            gone = [u for u in (self._drop(sid) for sid in stale if sid not in still_open) if u]
+            for worker_id in [w for w, (expires_at, _) in self._remote.items() if expires_at <= now]:
+                del self._remote[worker_id]
+        if gone:
+            self._publish({'down': gone})
+        return gone
+
+    def handle(self, message):
+        """Apply another worker's announcement"""
+        worker_id = message.get('worker')
+        if not worker_id or worker_id == self.worker_id:
+            return
+        expires_at = time.monotonic() + 3 * self.sync_interval
+        with self._lock:
+            if message.get('gone'):
+                self._remote.pop(worker_id, None)
+                return
+            _, users = self._remote.get(worker_id, (None, set()))
+            if 'full' in message:
+                users = set(message['full'])
+            users |= set(message.get('up', ()))
+            users -= set(message.get('down', ()))
+            self._remote[worker_id] = (expires_at, users)
+
+    def _publish(self, message):
+        if not self.url:
+            return
+        try:
+            self._client().publish(PRESENCE_CHANNEL, json.dumps(dict(message, worker=self.worker_id)))
+        except Exception as e:
+            logger.warning("Error publishing provider presence: %s", e)
+
+    def _client(self):
+        if self._redis is None:
+            import redis
+            self._redis = redis.Redis.from_url(self.url)
+        return self._redis
+
+    def _ensure_started(self):
+        if self._started:
+            return
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        threading.Thread(target=self._sync, name='presence-sync', daemon=True).start()
+        if self.url:
+            threading.Thread(target=self._listen, name='presence-listen', daemon=True).start()
+
+    def _sync(self):
+        while not self._stop.wait(self.sync_interval):
+            self.sweep()
+            with self._lock:
+                local = list(self._local)
+            self._publish({'full': local})
+
+    def _listen(self):
+        while not self._stop.is_set():
+            try:
+                pubsub = self._client().pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(PRESENCE_CHANNEL)
+                # Ask the others for their full sets instead of waiting a sync interval
+                self._publish({'hello': True})
+                for item in pubsub.listen():
+                    if self._stop.is_set():
+                        break
+                    message = json.loads(item['data'])
+                    if message.get('hello') and message.get('worker') != self.worker_id:
+                        with self._lock:
+                            local = list(self._local)
+                        self._publish({'full': local})
+                    self.handle(message)
+            except Exception as e:
+                logger.warning("Provider presence listener error: %s", e)
+                self._stop.wait(1.0)
+
+    def stop(self):
+        """Tell other workers this one's providers are gone"""
+        self._stop.set()
+        if self._started:
+            self._publish({'gone': True})
+
+
+presence = PresenceRegistry()
+atexit.register(presence.stop)
@@ -0,0 +1,240 @@
+"""
+Socket.IO room names, socket identity and subscription checks.
+
+Sockets authenticate once at connect with the same JWT the REST API uses
+(io({auth: {token}})); the identity is kept in the Socket.IO session.
+Provider location pings are emitted only to tracking_<provider user id> and
+to the provider's active booking_<id> rooms, and joining either room requires
+being a party to it.
+
+Providers report GPS fixes either over HTTP (/providers/update-tracking-location)
+or with the provider_ping socket event; both go through record_provider_fixes.
+A ping payload is one fix {lat, lon[, t]}, a list of fixes (each a dict or a
+[lat, lon, t] array) or {fixes: [...]}, optionally msgpack-encoded as a binary
+message. t is unix seconds and defaults to the time of arrival.
+"""
+
+import os
+import threading
+import time
+from datetime import datetime
+
+import msgpack
+from bson import ObjectId
+from flask import session
+from flask_jwt_extended import decode_token
+
+from extensions import socketio
+from location_buffer import location_buffer
+from models import Booking, Provider, User
+
+# Bookings whose customer should see the provider move
+ACTIVE_BOOKING_STATUSES = ('Accepted', 'In Progress')
+
+# Fixes accepted in one ping message
+MAX_FIXES_PER_PING = 100
+
+# Location pings arrive every few seconds; re-resolve the provider's rooms at most this often
+LOCATION_ROOMS_TTL = float(os.getenv('LOCATION_ROOMS_TTL', 5.0))
+
+_rooms_cache = {}
+_rooms_lock = threading.Lock()
+
+
+def user_room(user_id):
+    return f"user_{user_id}"
+
+
+def provider_room(user_id):
+    return f"provider_{user_id}"
+
+
+def booking_room(booking_id):
+    return f"booking_{booking_id}"
+
+
+def tracking_room(provider_user_id):
+    return f"tracking_{provider_user_id}"
+
+
+def authenticate_socket(auth):
+    """Remember who opened this socket; returns the user id or None for anonymous sockets"""
+    token = auth.get('token') if isinstance(auth, dict) else None
+    if not token:
+        return None
+    try:
+        claims = decode_token(token)
+    except Exception:
+        return None
+    session['user_id'] = str(claims['sub'])
+    session['role'] = claims.get('role')
+    session['name'] = claims.get('name')
+    if session['role'] is None:
+        # Tokens issued before role/name claims existed
+        try:
+            user = User.objects(id=ObjectId(session['user_id'])).only('role', 'name').first()
+        except Exception:
+            user = None
+        if user:
+            session['role'], session['name'] = user.role, user.name
+    return session['user_id']
+
+
+def socket_identity():
+    """(user_id, role) of the current socket, (None, None) if anonymous"""
+    return session.get('user_id'), session.get('role')
+
+
+def socket_name():
+    return session.get('name')
+
+
+def _provider_profile_id(user_id):
+    try:
+        return Provider.objects(user=ObjectId(user_id)).scalar('id').first()
+    except Exception:
+        return None
+
+
+def resolve_provider_user_id(provider_id):
+    """Accept either a provider's user id or Provider document id"""
+    try:
+        profile = Provider.objects(id=ObjectId(provider_id)).no_dereference().only('user').first()
+    except Exception:
+        return None
+    if profile and profile.user:
+        return str(profile.user.id)
+    return str(provider_id)
+
+
+def active_booking_ids(provider_user_id):
+    profile_id = _provider_profile_id(provider_user_id)
+    if not profile_id:
+        return []
+    return [str(b) for b in Booking.objects(provider=profile_id, status__in=ACTIVE_BOOKING_STATUSES).scalar('id')]
+
+
+def location_rooms(provider_user_id):
+    """Rooms that should receive this provider's location, cached for LOCATION_ROOMS_TTL"""
+    now = time.monotonic()
+    cached = _rooms_cache.get(provider_user_id)
+    if cached and cached[0] > now:
+        return cached[1]
+    rooms = [tracking_room(provider_user_id)] + [booking_room(b) for b in active_booking_ids(provider_user_id)]
+    with _rooms_lock:
+        _rooms_cache[provider_user_id] = (now + LOCATION_ROOMS_TTL, rooms)
+    return rooms
+
+
+def forget_location_rooms():
+    """Drop cached rooms after a booking changed status (rare next to pings)"""
+    with _rooms_lock:
+        _rooms_cache.clear()
+
+
+def can_join_booking(user_id, role, booking_id):
+    if not user_id:
+        return False
+    if role == 'admin':
+        return True
+    try:
+        booking = Booking.objects(id=ObjectId(booking_id)).no_dereference().only('user', 'provider').first()
+    except Exception:
+        return False
+    if not booking:
+        return False
+    if booking.user and str(booking.user.id) == user_id:
+        return True
+    return bool(booking.provider) and booking.provider.id == _provider_profile_id(user_id)
+
+
+def can_track_provider(user_id, role, provider_user_id):
+    if not user_id or not provider_user_id:
+        return False
+    if role == 'admin' or user_id == provider_user_id:
+        return True
+    profile_id = _provider_profile_id(provider_user_id)
+    if not profile_id:
+        return False
+    return Booking.objects(user=ObjectId(user_id), provider=profile_id,
+                           status__in=ACTIVE_BOOKING_STATUSES).only('id').first() is not None
+
+
+def can_join_room(user_id, role, room):
+    """Authorization for the generic 'join' event"""
+    if not user_id or not room:
+        return False
+    if room == user_room(user_id):
+        return True
+    if room == provider_room(user_id) or room == 'all_providers':
+        return role == 'provider'
+    if room.startswith('booking_'):
+        return can_join_booking(user_id, role, room[len('booking_'):])
+    if room.startswith('tracking_'):
+        return can_track_provider(user_id, role, room[len('tracking_'):])
+    return False
+
+
+def emit_provider_location(event, payload, provider_user_id):
+    """Send a location event to the provider's watchers only"""
+    socketio.emit(event, payload, to=location_rooms(provider_user_id))
+
+
+def parse_fixes(payload):
+    """[(lat, lon, at)] from a ping payload in time order; raises ValueError if malformed"""
+    if isinstance(payload, (bytes, bytearray)):
+        try:
+            payload = msgpack.unpackb(payload, raw=False)
+        except Exception:
+            raise ValueError('Undecodable binary payload')
+    if isinstance(payload, dict):
+        payload = payload['fixes'] if 'fixes' in payload else [payload]
+    if not isinstance(payload, (list, tuple)) or not payload:
+        raise ValueError('Latitude and longitude are required')
+    if len(payload) > MAX_FIXES_PER_PING:
+        raise ValueError(f'At most {MAX_FIXES_PER_PING} fixes per ping')
+
+    now = datetime.utcnow()
+    fixes = []
+    for fix in payload:
+        if isinstance(fix, dict):
+            lat, lon, t = fix.get('lat'), fix.get('lon'), fix.get('t')
+        elif isinstance(fix, (list, tuple)) and len(fix) in (2, 3):
+            lat, lon, t = fix[0], fix[1], fix[2] if len(fix) == 3 else None
+        else:
+            raise ValueError('Latitude and longitude are required')
+        if lat is None or lon is None:
+            raise ValueError('Latitude and longitude are required')
+        try:
+            lat, lon = float(lat), float(lon)
+            # Device clocks drift; never accept fixes from the future
+            at = min(datetime.utcfromtimestamp(float(t)), now) if t is not None else now
+        except (TypeError, ValueError, OverflowError, OSError):
+            raise ValueError('Invalid fix')
+        if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+            raise ValueError('Invalid coordinates')
+        fixes.append((lat, lon, at))
+    fixes.sort(key=lambda f: f[2])
+    return fixes
+
+
+def record_provider_fixes(provider_user_id, name, fixes):
+    """Buffer a provider's fixes and broadcast the newest one; returns the stored position"""
+    rooms = location_rooms(provider_user_id)
+    bookings = [r[len('booking_'):] for r in rooms if r.startswith('booking_')]
+    position = None
+    for lat, lon, at in fixes:
+        position = location_buffer.record(provider_user_id, lat, lon, at=at, bookings=bookings)
+
+    # Watchers only need where the provider is now, not every fix in the batch
+    try:
+        socketio.emit('provider_location_update', {
+            'provider_id': provider_user_id,
+            'name': name,
+            'lat': position['lat'],
+            'lon': position['lon'],
+            'timestamp': position['at'].isoformat()
+        }, to=rooms)
+    except Exception:
+        pass
+    return position
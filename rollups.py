@@ -0,0 +1,173 @@
+"""
+Materialized booking rollups: one document per day x category x status.
+
+Booking write paths call record_booking_created / record_status_change so
+admin statistics read O(days) rollup rows instead of every booking. The
+rollups are maintained best-effort next to the booking write; rebuild_rollups
+recomputes them from scratch (db_manager.py rollups) if they ever drift.
+
+Until rebuild_rollups has run once (it bumps the booking_rollups entry in
+cache_versions) the rollups cannot include older bookings, so booking_stats
+groups the bookings directly; the first rebuild replaces whatever the write
+paths recorded before it.
+"""
+
+import logging
+from datetime import datetime
+
+from pymongo import UpdateOne
+
+from catalog import bump_version, get_version
+from models import Booking, BookingRollup
+from database import hot_collection
+
+logger = logging.getLogger(__name__)
+
+ROLLUPS_BUILT = 'booking_rollups'  # cache_versions entry bumped by every rebuild
+
+_built = False
+
+
+def rollups_built():
+    """True once rebuild_rollups has run; remembered for the life of the process"""
+    global _built
+    if not _built:
+        _built = get_version(ROLLUPS_BUILT) > 0
+    return _built
+
+
+def _day(ts):
+    ts = ts or datetime.utcnow()
+    return datetime(ts.year, ts.month, ts.day)
+
+
+def _rollup_op(day, category, status, count, revenue):
+    return UpdateOne(
+        {'day': day, 'category': category or 'Uncategorized', 'status': status},
+        {'$inc': {'count': count, 'revenue': revenue}},
+        upsert=True
+    )
+
+
+def _decrement_op(day, category, status, revenue):
+    # Never below zero: a booking missing from its old bucket is not taken out of it
+    return UpdateOne(
+        {'day': day, 'category': category or 'Uncategorized', 'status': status, 'count': {'$gte': 1}},
+        {'$inc': {'count': -1, 'revenue': -revenue}}
+    )
+
+
+def record_booking_created(booking, category):
+    """Count a newly inserted booking"""
+    try:
+        BookingRollup._get_collection().bulk_write([
+            _rollup_op(_day(booking.created_at), category, booking.status, 1, booking.price or 0.0)
+        ])
+    except Exception as e:
+        logger.warning("Error updating booking rollups: %s", e)
+
+
+def record_status_change(booking, old_status, new_status, category):
+    """Move a booking from its old status bucket to the new one"""
+    if old_status == new_status:
+        return
+    day = _day(booking.created_at)
+    price = booking.price or 0.0
+    try:
+        BookingRollup._get_collection().bulk_write([
+            _decrement_op(day, category, old_status, price),
+            _rollup_op(day, category, new_status, 1, price),
+        ], ordered=False)
+    except Exception as e:
+        logger.warning("Error updating booking rollups: %s", e)
+
+
+def rebuild_rollups():
+    """Recompute all rollups from the bookings collection; returns the number of rows"""
+    pipeline = [
+        {'$lookup': {'from': 'services', 'localField': 'service', 'foreignField': '_id', 'as': 'svc'}},
+        {'$group': {
+            '_id': {
+                'day': {'$dateTrunc': {'date': {'$ifNull': ['$created_at', '$$NOW']}, 'unit': 'day'}},
+                'category': {'$ifNull': [{'$first': '$svc.category'}, 'Uncategorized']},
+                'status': '$status',
+            },
+            'count': {'$sum': 1},
+            'revenue': {'$sum': {'$ifNull': ['$price', 0]}},
+        }},
+        {'$project': {'_id': 0, 'day': '$_id.day', 'category': '$_id.category', 'status': '$_id.status',
+                      'count': 1, 'revenue': 1}},
+        {'$out': BookingRollup._get_collection_name()},
+    ]
+    list(Booking._get_collection().aggregate(pipeline, allowDiskUse=True))
+    bump_version(ROLLUPS_BUILT)
+    return BookingRollup._get_collection().estimated_document_count()
+
+
+def _stats_pipeline(match, day_expr, count_expr, revenue_expr):
+    return [
+        {'$match': match},
+        {'$facet': {
+            'totals': [{'$group': {'_id': None, 'count': {'$sum': count_expr}, 'revenue': {'$sum': revenue_expr}}}],
+            'by_status': [{'$group': {'_id': '$status', 'count': {'$sum': count_expr}, 'revenue': {'$sum': revenue_expr}}}],
+            'by_category': [{'$group': {'_id': '$category', 'count': {'$sum': count_expr}, 'revenue': {'$sum': revenue_expr}}}],
+            'by_day': [
+                {'$group': {'_id': day_expr,
+                            'count': {'$sum': count_expr}, 'revenue': {'$sum': revenue_expr}}},
+                {'$sort': {'_id': 1}},
+            ],
+        }},
+    ]
+
+
+def booking_stats(start=None, end=None, category=None):
+    """Booking counts and revenue, optionally limited to [start, end) and one category
+
+    With rollups the range is applied per day bucket, so start should be a midnight.
+    Reads go to the hot_read alias; a few seconds of replication lag is fine for a dashboard.
+    """
+    rollups = hot_collection(BookingRollup)
+    bookings = hot_collection(Booking)
+    if rollups_built():
+        match = {}
+        if start or end:
+            match['day'] = {}
+            if start:
+                match['day']['$gte'] = _day(start)
+            if end:
+                match['day']['$lt'] = end
+        if category:
+            match['category'] = category
+        result = next(rollups.aggregate(_stats_pipeline(match, '$day', '$count', '$revenue')))
+    else:
+        # Rollups not built yet: group the bookings directly
+        match = {}
+        if start or end:
+            match['created_at'] = {}
+            if start:
+                match['created_at']['$gte'] = start
+            if end:
+                match['created_at']['$lt'] = end
+        pipeline = [
+            {'$match': match},
+            {'$lookup': {'from': 'services', 'localField': 'service', 'foreignField': '_id', 'as': 'svc'}},
+            {'$set': {'category': {'$ifNull': [{'$first': '$svc.category'}, 'Uncategorized']},
+                      'price': {'$ifNull': ['$price', 0]}}},
+        ]
+        if category:
+            pipeline.append({'$match': {'category': category}})
+        day_expr = {'$dateTrunc': {'date': {'$ifNull': ['$created_at', '$$NOW']}, 'unit': 'day'}}
+        pipeline += _stats_pipeline({}, day_expr, 1, '$price')
+        result = next(bookings.aggregate(pipeline, allowDiskUse=True))
+
+    totals = result['totals'][0] if result['totals'] else {'count': 0, 'revenue': 0}
+    return {
+        'bookings': totals['count'],
+        'revenue': round(totals['revenue'], 2),
+        'by_status': {row['_id']: {'count': row['count'], 'revenue': row['revenue']}
+                      for row in result['by_status'] if row['count'] > 0},
+        'by_category': {row['_id']: {'count': row['count'], 'revenue': row['revenue']}
+                        for row in result['by_category'] if row['count'] > 0},
+        'by_day': [{'day': row['_id'].date().isoformat(), 'count': row['count'], 'revenue': row['revenue']}
+                   for row in result['by_day'] if row['count'] > 0],
+    }
@@ -4,6 +4,10 @@ from werkzeug.utils import secure_filename
 import os
 from extensions import bcrypt
 from models import User, Provider
+from autocomplete import suggest_index
+from realtime import emit_provider_location
+from location_buffer import location_buffer
+from datetime import datetime
 from bson import ObjectId
 
 auth_bp = Blueprint('auth', __name__)
@@ -41,6 +45,7 @@ def signup():
     if role == 'provider':
         provider = Provider(user=user, skills=['Electrician', 'Plumber'], availability=True)
         provider.save()
+        suggest_index.skills_changed(added=provider.skills)
         # Update user with provider reference
         user.provider_profile = provider
         user.save()
@@ -84,7 +89,7 @@ def booking_page():
     return render_template('booking.html')
 
 
-@auth_bp.get('/tracking/<int:booking_id>')
+@auth_bp.get('/tracking/<booking_id>')
 @jwt_required(optional=True)
 def tracking_page(booking_id):
     return render_template('tracking.html', booking_id=booking_id)
@@ -248,21 +253,23 @@ def update_location():
         user.longitude = float(longitude)
     if address:
         user.address = address
+    if latitude is not None or longitude is not None:
+        user.location_updated_at = datetime.utcnow()
     
     user.save()
+    location_buffer.discard(user.id)
     
     # If user is a provider, also update provider location
     if user.provider_profile:
         try:
-            from extensions import socketio
-            socketio.emit('provider_location', {
+            emit_provider_location('provider_location', {
                 'user_id': str(user.id),
                 'name': user.name,
                 'lat': user.latitude,
                 'lon': user.longitude,
                 'address': user.address,
                 'rating': user.rating
-            })
+            }, str(user.id))
         except Exception:
             pass
     
@@ -1,28 +1,38 @@
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
 from extensions import socketio
-from models import Booking, Service, Provider, Payment, User
+from models import Booking, Provider, Payment, User
+from rollups import record_booking_created, record_status_change
+from realtime import forget_location_rooms, can_join_booking
+from location_trail import load_trail, simplify
+from catalog import service_catalog
+from presence import presence
+from metrics import query_budget
 from datetime import datetime
 from bson import ObjectId
 import math
+import logging
 
 booking_bp = Blueprint('booking', __name__)
+logger = logging.getLogger(__name__)
 
 
 @booking_bp.get('/bookings/user')
+@query_budget(5)  # user, bookings, payments, catalog version and reload
 @jwt_required()
 def get_user_bookings():
     ident = get_jwt_identity()
     user_id = str(ident) if isinstance(ident, str) else str(ident['id'])
-    user = User.objects(id=ObjectId(user_id)).first()
+    user = User.objects(id=ObjectId(user_id)).only('id').first()
     if not user:
         return jsonify({'message': 'User not found'}), 404
     
     bookings = Booking.objects(user=user).order_by('-created_at')
-    return jsonify([serialize_booking(b) for b in bookings])
+    return jsonify(serialize_bookings(bookings))
 
 
 @booking_bp.get('/bookings/provider')
+@query_budget(7)  # user, profile, assigned, unassigned, payments, catalog version and reload
 @jwt_required()
 def get_provider_bookings():
     ident = get_jwt_identity()
@@ -33,26 +43,20 @@ def get_provider_bookings():
     
     # Get bookings assigned to this provider AND general bookings they can handle
     provider = user.provider_profile
-    provider_bookings = Booking.objects(provider=provider).order_by('-created_at')
+    provider_bookings = list(Booking.objects(provider=provider).order_by('-created_at'))
     
-    # Also get unassigned bookings that match provider skills
-    if provider.skills:
-        # Get all unassigned bookings first
-        unassigned_bookings = Booking.objects(provider__exists=False).order_by('-created_at')
-        
-        # Filter by matching services
-        matching_bookings = []
-        for booking in unassigned_bookings:
-            if (booking.service and 
-                booking.service.name in provider.skills):
-                matching_bookings.append(booking)
+    # Also get unassigned bookings for services named in the provider's skills
+    skill_services = [s.id for s in service_catalog.current().services if s.name in (provider.skills or [])]
+    if skill_services:
+        matching_bookings = Booking.objects(provider__exists=False, service__in=skill_services).order_by('-created_at')
         
         # Combine and deduplicate
-        all_bookings = list(provider_bookings) + [b for b in matching_bookings if b not in provider_bookings]
+        seen = {b.id for b in provider_bookings}
+        all_bookings = provider_bookings + [b for b in matching_bookings if b.id not in seen]
     else:
-        all_bookings = list(provider_bookings)
+        all_bookings = provider_bookings
     
-    return jsonify([serialize_booking(b) for b in all_bookings])
+    return jsonify(serialize_bookings(all_bookings))
 
 
 @booking_bp.post('/bookings/create')
@@ -61,8 +65,6 @@ def create_booking():
     ident = get_jwt_identity()
     data = request.get_json() or {}
     
-    print(f"Booking creation request data: {data}")  # Debug logging
-    
     # Get user
     user_id = str(ident) if isinstance(ident, str) else str(ident['id'])
     user = User.objects(id=ObjectId(user_id)).first()
@@ -72,18 +74,16 @@ def create_booking():
     # Coerce and sanitize inputs
     try:
         service_id = str(data.get('service_id')) if data.get('service_id') not in (None, '',) else None
-        print(f"Service ID from request: {service_id}")  # Debug logging
         if service_id:
             try:
-                service = Service.objects(id=ObjectId(service_id)).first()
-                print(f"Service found: {service.name if service else 'None'}")  # Debug logging
+                service = service_catalog.current().get(ObjectId(service_id))
             except Exception as e:
-                print(f"Error looking up service: {e}")  # Debug logging
+                logger.debug("Error looking up service %s: %s", service_id, e)
                 service = None
         else:
             service = None
     except Exception as e:
-        print(f"Error processing service_id: {e}")  # Debug logging
+        logger.debug("Error processing service_id: %s", e)
         service = None
     
     try:
@@ -115,26 +115,21 @@ def create_booking():
 
     # Auto-select a service if not provided/invalid
     if not service:
-        print("No service provided, attempting auto-selection...")
         if provider and getattr(provider, 'skills', None):
-            print(f"Provider skills: {provider.skills}")
-            service = Service.objects(category__in=provider.skills).first() or Service.objects(name__in=provider.skills).first()
-            print(f"Service found by provider skills: {service.name if service else 'None'}")
+            service = service_catalog.current().first_matching(provider.skills)
         
         if not service:
-            print("No service found by provider skills, trying first available service...")
-            service = Service.objects.first()
-            print(f"First available service: {service.name if service else 'None'}")
+            services = service_catalog.current().services
+            service = services[0] if services else None
         
         if not service:
-            print("No services available in database")
+            logger.warning("No services available in database")
             return jsonify({'message': 'No services available'}), 400
-    
-    print(f"Final service selected: {service.name if service else 'None'}")
+        logger.debug("Auto-selected service %s (requested %r)", service.name, data.get('service_id'))
     
     # Validate that we have a service (this should never fail now)
     if not service:
-        print(f"CRITICAL: No service found after auto-selection. Service ID provided: {data.get('service_id')}")
+        logger.error("No service found after auto-selection. Service ID provided: %r", data.get('service_id'))
         return jsonify({'message': 'Service field is missing'}), 400
 
     booking = Booking(
@@ -148,17 +143,14 @@ def create_booking():
         notes=notes
     )
     booking.save()
+    record_booking_created(booking, service.category)
 
     # Send notifications
-    print(f"Booking created: {booking.id}, Provider: {provider.id if provider else 'None'}")
+    logger.info("Booking created: %s, provider: %s", str(booking.id), str(provider.id) if provider else None)
     if provider:
         # Notify specific provider
         provider_room = f"provider_{provider.id}"
         user_room = f"provider_{provider.user.id}" if provider.user else None
-        print(f"Sending notification to provider room: {provider_room}")
-        if user_room:
-            print(f"Also sending to user room: {user_room}")
-        
         socketio.emit('booking_created', serialize_booking(booking), to=provider_room)
         if user_room and user_room != provider_room:
             socketio.emit('booking_created', serialize_booking(booking), to=user_room)
@@ -190,10 +182,14 @@ def create_booking():
                         if provider in matching_providers:
                             break
             
+            # Only providers with a live socket can see the notification
+            online = presence.online_among(str(p.user.id) for p in matching_providers if p.user)
+            logger.info("Found %d matching providers for service %s, %d online",
+                        len(matching_providers), service.name, len(online))
+            matching_providers = [p for p in matching_providers if p.user and str(p.user.id) in online]
+            
             # Send notifications to matching providers
-            print(f"Found {len(matching_providers)} matching providers for service: {service.name}")
             for provider in matching_providers:
-                print(f"Notifying provider: {provider.id} (user: {provider.user.id if provider.user else 'None'})")
                 socketio.emit('new_booking_available', {
                     'booking': serialize_booking(booking),
                     'service_name': service.name,
@@ -261,8 +257,11 @@ def accept_booking():
         booking = Booking.objects(id=ObjectId(booking_id)).first()
         if not booking:
             return jsonify({'message': 'Booking not found'}), 404
+        old_status = booking.status
         booking.status = 'Accepted'
         booking.save()
+        record_status_change(booking, old_status, booking.status, booking.service.category if booking.service else None)
+        forget_location_rooms()
         _broadcast_status(booking)
         return jsonify({'message': 'Accepted'})
     except Exception as e:
@@ -278,8 +277,11 @@ def reject_booking():
         booking = Booking.objects(id=ObjectId(booking_id)).first()
         if not booking:
             return jsonify({'message': 'Booking not found'}), 404
+        old_status = booking.status
         booking.status = 'Rejected'
         booking.save()
+        record_status_change(booking, old_status, booking.status, booking.service.category if booking.service else None)
+        forget_location_rooms()
         _broadcast_status(booking)
         return jsonify({'message': 'Rejected'})
     except Exception as e:
@@ -299,8 +301,11 @@ def update_status():
         booking = Booking.objects(id=ObjectId(booking_id)).first()
         if not booking:
             return jsonify({'message': 'Booking not found'}), 404
+        old_status = booking.status
         booking.status = status
         booking.save()
+        record_status_change(booking, old_status, booking.status, booking.service.category if booking.service else None)
+        forget_location_rooms()
         _broadcast_status(booking)
         return jsonify({'message': 'Updated'})
     except Exception as e:
@@ -336,13 +341,62 @@ def _broadcast_status(booking: Booking):
     socketio.emit('booking_status', payload, to=f"booking_{booking.id}")
 
 
-def serialize_booking(b: Booking):
+@booking_bp.get('/bookings/<booking_id>/trail')
+@jwt_required()
+def booking_trail(booking_id):
+    """Provider's path for a booking, simplified to ?tolerance= metres (default 15)"""
+    ident = get_jwt_identity()
+    user_id = str(ident) if isinstance(ident, str) else str(ident['id'])
+    if not ObjectId.is_valid(booking_id):
+        return jsonify({'message': 'Invalid booking ID'}), 400
+    if not can_join_booking(user_id, get_jwt().get('role'), booking_id):
+        return jsonify({'message': 'Booking not found'}), 404
+    
+    tolerance = min(max(request.args.get('tolerance', 15.0, type=float), 0.0), 500.0)
+    points = load_trail(booking_id)
+    simplified = simplify(points, tolerance)
+    return jsonify({
+        'booking_id': booking_id,
+        'tolerance_m': tolerance,
+        'raw_points': len(points),
+        'points': [[lat, lon, ts.isoformat()] for lat, lon, ts in simplified],
+    })
+
+
+def _ref_id(doc, field):
+    """Id of a referenced document without loading it"""
+    ref = doc.to_mongo(fields=[field]).get(field)
+    return getattr(ref, 'id', ref)
+
+
+def _payment_statuses(bookings):
+    """{payment id: status} for the bookings' payments, in at most one query"""
+    payment_ids = [pid for pid in (_ref_id(b, 'payment') for b in bookings) if pid]
+    if not payment_ids:
+        return {}
+    return {payment.id: payment.status for payment in Payment.objects(id__in=payment_ids).only('status')}
+
+
+def serialize_bookings(bookings):
+    """serialize_booking for many bookings with one payment lookup"""
+    bookings = list(bookings)
+    statuses = _payment_statuses(bookings)
+    return [serialize_booking(b, statuses) for b in bookings]
+
+
+def serialize_booking(b: Booking, payment_statuses=None):
+    """Booking JSON without dereferencing: service names come from the catalog"""
+    user_id, provider_id, service_id, payment_id = (
+        _ref_id(b, 'user'), _ref_id(b, 'provider'), _ref_id(b, 'service'), _ref_id(b, 'payment'))
+    service = service_catalog.current().get(service_id)
+    if payment_statuses is None:
+        payment_statuses = _payment_statuses([b])
     return {
         'id': str(b.id),
-        'user_id': str(b.user.id) if b.user else None,
-        'provider_id': str(b.provider.id) if b.provider else None,
-        'service_id': str(b.service.id) if b.service else None,
-        'service_name': b.service.name if b.service else None,
+        'user_id': str(user_id) if user_id else None,
+        'provider_id': str(provider_id) if provider_id else None,
+        'service_id': str(service_id) if service_id else None,
+        'service_name': service.name if service else None,
         'status': b.status,
         'scheduled_time': b.scheduled_time.isoformat() if b.scheduled_time else None,
         'price': b.price,
@@ -355,8 +409,8 @@ def serialize_booking(b: Booking):
         'completion_images': b.completion_images or [],
         'completed_at': b.completed_at.isoformat() if b.completed_at else None,
         'created_at': b.created_at.isoformat() if b.created_at else None,
-        'has_payment': b.payment is not None,
-        'payment_status': b.payment.status if b.payment else None
+        'has_payment': payment_id is not None,
+        'payment_status': payment_statuses.get(payment_id) if payment_id else None
     }
 
 
@@ -438,8 +492,8 @@ def rate_booking(booking_id):
         
         return jsonify({'message': 'Rating submitted successfully'})
         
-    except Exception as e:
-        print(f"Error rating booking: {e}")
+    except Exception:
+        logger.exception("Error rating booking %s", booking_id)
         return jsonify({'message': 'Error rating booking'}), 500
 
 
@@ -468,6 +522,8 @@ def update_booking_status(booking_id):
         old_status = booking.status
         booking.status = new_status
         booking.save()
+        record_status_change(booking, old_status, new_status, booking.service.category if booking.service else None)
+        forget_location_rooms()
         
         # Emit status change to user
         user_room = f"user_{booking.user.id}"
@@ -491,7 +547,7 @@ def update_booking_status(booking_id):
         
         return jsonify({'message': 'Status updated successfully'})
         
-    except Exception as e:
-        print(f"Error updating booking status: {e}")
+    except Exception:
+        logger.exception("Error updating booking status %s", booking_id)
         return jsonify({'message': 'Error updating booking status'}), 500
 
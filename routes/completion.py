@@ -1,139 +1,246 @@
 from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from extensions import socketio
-from models import Booking, ServiceCompletion, Payment, User, Provider
+from models import Booking, ServiceCompletion, Payment, User, Provider, CompletionUpload
 from bson import ObjectId
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from mongoengine import Q, NotUniqueError, ValidationError
+from datetime import datetime, timedelta
+import hashlib
+import json
+import logging
 import os
+import shutil
 import uuid
-import razorpay
 from werkzeug.utils import secure_filename
+from payment_gateway import get_gateway, GatewayUnavailable
+from payment_reconciliation import record_payment_event, apply_payment_event
+from rollups import record_status_change
+from realtime import forget_location_rooms
+from catalog import service_catalog
+from metrics import query_budget
 
 completion_bp = Blueprint('completion', __name__)
-
-# Configure Razorpay
-RAZORPAY_KEY_ID = os.getenv('RAZORPAY_KEY_ID', 'rzp_test_1234567890')
-RAZORPAY_KEY_SECRET = os.getenv('RAZORPAY_KEY_SECRET', 'test_secret_key')
-
-razorpay_client = razorpay.Client(auth=(RAZORPAY_KEY_ID, RAZORPAY_KEY_SECRET))
+logger = logging.getLogger(__name__)
 
 # Allowed file extensions for image uploads
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
 
+# How long an in-flight gateway order creation holds its claim on a payment
+ORDER_CLAIM_TIMEOUT = timedelta(seconds=30)
+
+# Read size when streaming resumable upload chunks to disk
+STREAM_BLOCK_SIZE = 64 * 1024
+
+# How long an append holds its claim on an upload while copying a chunk into the file
+APPEND_CLAIM_TIMEOUT = timedelta(seconds=30)
+
+# Abandoned uploads deleted per sweep when a new upload starts
+UPLOAD_SWEEP_BATCH = 100
+
+# Threads used to write the images of one completion upload
+IMAGE_SAVE_WORKERS = 4
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
+def _completion_upload_dir():
+    upload_dir = os.path.join(current_app.static_folder, 'uploads', 'completions')
+    os.makedirs(upload_dir, exist_ok=True)
+    return upload_dir
+
+
+def _partial_upload_path(upload):
+    part_dir = os.path.join(current_app.instance_path, 'uploads')
+    os.makedirs(part_dir, exist_ok=True)
+    return os.path.join(part_dir, f"{upload.id}.part")
+
+
+def _expire_stale_uploads():
+    """Delete uploads abandoned before they were finalized, and their partial files"""
+    cutoff = datetime.utcnow() - timedelta(hours=current_app.config['UPLOAD_EXPIRY_HOURS'])
+    stale = list(CompletionUpload.objects(status='Uploading', created_at__lt=cutoff).only('id').limit(UPLOAD_SWEEP_BATCH))
+    if not stale:
+        return
+    CompletionUpload.objects(id__in=[u.id for u in stale], status='Uploading').delete()
+    for upload in stale:
+        try:
+            os.remove(_partial_upload_path(upload))
+        except FileNotFoundError:
+            pass
+
+
+def _get_own_upload(upload_id, user_id):
+    try:
+        return CompletionUpload.objects(id=ObjectId(upload_id), owner=ObjectId(user_id)).first()
+    except Exception:
+        return None
+
+
+def _save_completion_images(files):
+    """Save uploaded image files concurrently; returns their relative static paths"""
+    files = [f for f in files if f and allowed_file(f.filename)]
+    if not files:
+        return []
+    upload_dir = _completion_upload_dir()
+    names = [f"{uuid.uuid4()}_{secure_filename(f.filename)}" for f in files]
+    with ThreadPoolExecutor(max_workers=min(IMAGE_SAVE_WORKERS, len(files))) as pool:
+        list(pool.map(lambda f, name: f.save(os.path.join(upload_dir, name)), files, names))
+    return [f"uploads/completions/{name}" for name in names]
+
+
+def _remove_images(paths):
+    for path in paths:
+        os.remove(os.path.join(current_app.static_folder, path))
+
+
+def _release_uploads(upload_oids, attached_at):
+    """Hand uploads claimed by a completion that did not go through back to their owner"""
+    if upload_oids:
+        CompletionUpload.objects(id__in=upload_oids, status='Attached', attached_at=attached_at).update(
+            set__status='Finalized', unset__attached_at=True
+        )
+
+
+def _serialize_upload(upload):
+    return {
+        'upload_id': str(upload.id),
+        'filename': upload.filename,
+        'size': upload.size,
+        'offset': upload.received,
+        'status': upload.status,
+        'path': upload.path,
+        'chunk_size': current_app.config['UPLOAD_CHUNK_SIZE']
+    }
+
+
 @completion_bp.post('/completion/upload')
+@query_budget(10)  # provider, booking, claim and read uploads, update, insert, customer, catalog version and reload, rollup
 @jwt_required()
 def upload_service_completion():
     """Upload service completion details and images"""
     ident = get_jwt_identity()
     user_id = str(ident) if isinstance(ident, str) else str(ident['id'])
     
-    print(f"Completion upload request - User ID: {user_id}")  # Debug logging
-    print(f"Request content type: {request.content_type}")  # Debug logging
-    print(f"Request form data: {request.form}")  # Debug logging
-    print(f"Request files: {list(request.files.keys())}")  # Debug logging
-    
     try:
-        user = User.objects(id=ObjectId(user_id)).first()
+        # References are kept as ids; names are fetched once below for the notifications
+        user = User.objects(id=ObjectId(user_id)).no_dereference().first()
         if not user or user.role != 'provider':
             return jsonify({'message': 'Provider not found'}), 404
         
-        provider = user.provider_profile
-        if not provider:
+        if not user.provider_profile:
             return jsonify({'message': 'Provider profile not found'}), 404
+        provider_id = user.provider_profile.id
         
         # Handle both JSON and form data
         if request.is_json:
             data = request.get_json() or {}
             booking_id = data.get('booking_id')
             completion_notes = data.get('completion_notes', '')
+            upload_ids = data.get('upload_ids') or []
         else:
             # Handle form data
             booking_id = request.form.get('booking_id')
             completion_notes = request.form.get('completion_notes', '')
+            upload_ids = [u for value in request.form.getlist('upload_ids') for u in value.split(',') if u]
         
-        print(f"Parsed booking_id: {booking_id}")  # Debug logging
-        print(f"Parsed completion_notes: {completion_notes}")  # Debug logging
+        logger.debug("Completion upload for booking %s (%s, %d uploads)", booking_id, request.content_type, len(upload_ids))
         
         if not booking_id:
             return jsonify({'message': 'Booking ID is required'}), 400
         
         try:
-            booking = Booking.objects(id=ObjectId(booking_id)).first()
-            print(f"Booking found: {booking.id if booking else 'None'}")  # Debug logging
+            booking = Booking.objects(id=ObjectId(booking_id)).no_dereference().only(
+                'user', 'provider', 'service', 'status', 'price', 'created_at'
+            ).first()
         except Exception as e:
-            print(f"Error looking up booking: {e}")  # Debug logging
+            logger.debug("Error looking up booking %s: %s", booking_id, e)
             return jsonify({'message': 'Invalid booking ID format'}), 400
         
         if not booking:
             return jsonify({'message': 'Booking not found'}), 404
         
         # Verify provider owns this booking
-        if not booking.provider or str(booking.provider.id) != str(provider.id):
+        if not booking.provider or booking.provider.id != provider_id:
             return jsonify({'message': 'Unauthorized'}), 403
         
         # Check if booking is in progress
         if booking.status != 'In Progress':
             return jsonify({'message': 'Booking must be in progress to upload completion'}), 400
         
+        # Images sent earlier through the resumable upload protocol
+        upload_oids = []
+        if upload_ids:
+            try:
+                upload_oids = list({ObjectId(u) for u in upload_ids})
+            except Exception:
+                return jsonify({'message': 'Invalid upload ID format'}), 400
+        
         # Handle file uploads
-        uploaded_images = []
-        if 'images' in request.files:
-            files = request.files.getlist('images')
-            for file in files:
-                if file and allowed_file(file.filename):
-                    # Generate unique filename
-                    filename = secure_filename(file.filename)
-                    unique_filename = f"{uuid.uuid4()}_{filename}"
-                    
-                    # Create upload directory if it doesn't exist
-                    upload_dir = os.path.join(current_app.static_folder, 'uploads', 'completions')
-                    os.makedirs(upload_dir, exist_ok=True)
-                    
-                    # Save file
-                    file_path = os.path.join(upload_dir, unique_filename)
-                    file.save(file_path)
-                    
-                    # Store relative URL
-                    relative_path = f"uploads/completions/{unique_filename}"
-                    uploaded_images.append(relative_path)
+        saved_images = _save_completion_images(request.files.getlist('images'))
+        completed_at = datetime.utcnow()
+        
+        # Claim the uploads before the booking write so two completions cannot attach the same image
+        finalized_uploads = []
+        if upload_oids:
+            claimed = CompletionUpload.objects(id__in=upload_oids, owner=user.id, status='Finalized').update(
+                set__status='Attached', set__attached_at=completed_at
+            )
+            if claimed != len(upload_oids):
+                _release_uploads(upload_oids, completed_at)
+                _remove_images(saved_images)
+                return jsonify({'message': 'Uploads must exist and be finalized before completion'}), 400
+            finalized_uploads = list(CompletionUpload.objects(id__in=upload_oids).only('path'))
+        uploaded_images = [u.path for u in finalized_uploads] + saved_images
+        
+        # Single conditional write: only an in-progress booking of this provider completes
+        updated = Booking.objects(id=booking.id, provider=provider_id, status='In Progress').update_one(
+            set__status='Completed',
+            set__completion_notes=completion_notes,
+            set__completion_images=uploaded_images,
+            set__completed_at=completed_at
+        )
+        if not updated:
+            _release_uploads(upload_oids, completed_at)
+            _remove_images(saved_images)
+            return jsonify({'message': 'Booking is no longer in progress'}), 409
         
         # Create service completion record
         completion = ServiceCompletion(
-            booking=booking,
-            provider=provider,
+            booking=booking.id,
+            provider=provider_id,
             completion_notes=completion_notes,
-            images=uploaded_images
+            images=uploaded_images,
+            completed_at=completed_at
         )
         completion.save()
         
-        # Update booking with completion details
-        booking.completion_notes = completion_notes
-        booking.completion_images = uploaded_images
-        booking.completed_at = datetime.utcnow()
-        booking.status = 'Completed'
-        booking.save()
+        # Fetch notification data once for both events
+        customer = User.objects(id=booking.user.id).only('name').first()
+        service = service_catalog.current().get(booking.service.id) if booking.service else None
+        customer_name = customer.name if customer else 'Customer'
+        service_name = service.name if service else 'Service'
+        record_status_change(booking, 'In Progress', 'Completed', service.category if service else None)
+        forget_location_rooms()
         
         # Notify user about service completion
         user_room = f"user_{booking.user.id}"
         socketio.emit('service_completed', {
             'booking_id': str(booking.id),
             'provider_name': user.name,
-            'service_name': booking.service.name if booking.service else 'Service',
+            'service_name': service_name,
             'completion_notes': completion_notes,
             'images': uploaded_images,
-            'completed_at': booking.completed_at.isoformat()
+            'completed_at': completed_at.isoformat()
         }, to=user_room)
         
         # Notify provider
-        provider_room = f"provider_{provider.id}"
+        provider_room = f"provider_{provider_id}"
         socketio.emit('completion_uploaded', {
             'booking_id': str(booking.id),
-            'user_name': booking.user.name,
-            'service_name': booking.service.name if booking.service else 'Service',
+            'user_name': customer_name,
+            'service_name': service_name,
             'completion_notes': completion_notes,
             'images': uploaded_images
         }, to=provider_room)
@@ -146,12 +253,165 @@ def upload_service_completion():
         })
         
     except Exception as e:
-        print(f"Error uploading service completion: {e}")
-        import traceback
-        traceback.print_exc()  # Print full traceback for debugging
+        logger.exception("Error uploading service completion")
         return jsonify({'message': f'Error uploading service completion: {str(e)}'}), 500
 
 
+@completion_bp.post('/completion/uploads')
+@jwt_required()
+def init_completion_upload():
+    """Start a resumable upload for one completion image"""
+    ident = get_jwt_identity()
+    user_id = str(ident) if isinstance(ident, str) else str(ident['id'])
+    
+    data = request.get_json() or {}
+    filename = secure_filename(data.get('filename') or '')
+    try:
+        size = int(data.get('size'))
+    except Exception:
+        return jsonify({'message': 'File size is required'}), 400
+    
+    if not filename or not allowed_file(filename):
+        return jsonify({'message': 'Unsupported file type'}), 400
+    if size <= 0:
+        return jsonify({'message': 'File size must be positive'}), 400
+    if size > current_app.config['UPLOAD_MAX_FILE_SIZE']:
+        return jsonify({'message': 'File too large',
+                        'max_size': current_app.config['UPLOAD_MAX_FILE_SIZE']}), 413
+    
+    try:
+        user = User.objects(id=ObjectId(user_id)).first()
+    except Exception:
+        return jsonify({'message': 'Invalid user ID'}), 400
+    if not user or user.role != 'provider':
+        return jsonify({'message': 'Provider not found'}), 404
+    
+    # Every open upload may reserve a whole file of disk until it expires
+    _expire_stale_uploads()
+    max_open = current_app.config['UPLOAD_MAX_OPEN']
+    if CompletionUpload.objects(owner=user.id, status='Uploading').count() >= max_open:
+        return jsonify({'message': 'Too many unfinished uploads', 'max_open': max_open}), 429
+    
+    upload = CompletionUpload(owner=user, filename=filename, size=size)
+    upload.save()
+    return jsonify(_serialize_upload(upload)), 201
+
+
+@completion_bp.get('/completion/uploads/<upload_id>')
+@jwt_required()
+def get_completion_upload(upload_id):
+    """Report the last acknowledged offset so a client can resume"""
+    ident = get_jwt_identity()
+    user_id = str(ident) if isinstance(ident, str) else str(ident['id'])
+    
+    upload = _get_own_upload(upload_id, user_id)
+    if not upload:
+        return jsonify({'message': 'Upload not found'}), 404
+    return jsonify(_serialize_upload(upload))
+
+
+@completion_bp.put('/completion/uploads/<upload_id>')
+@jwt_required()
+def append_completion_upload_chunk(upload_id):
+    """Append one raw chunk at the given offset
+
+    The body is streamed to a file of its own first; only the request that then
+    claims the upload at this offset copies it into the shared .part file, so a
+    retry racing the original request cannot overwrite acknowledged bytes.
+    """
+    ident = get_jwt_identity()
+    user_id = str(ident) if isinstance(ident, str) else str(ident['id'])
+    
+    upload = _get_own_upload(upload_id, user_id)
+    if not upload:
+        return jsonify({'message': 'Upload not found'}), 404
+    if upload.status != 'Uploading':
+        return jsonify({'message': 'Upload already finalized', 'offset': upload.received}), 409
+    
+    try:
+        offset = int(request.headers.get('Upload-Offset', request.args.get('offset')))
+    except Exception:
+        return jsonify({'message': 'Upload-Offset header is required'}), 400
+    if offset != upload.received:
+        return jsonify({'message': 'Offset mismatch', 'offset': upload.received}), 409
+    
+    part_path = _partial_upload_path(upload)
+    chunk_path = f"{part_path}.{uuid.uuid4().hex}"
+    try:
+        written = 0
+        with open(chunk_path, 'wb') as chunk:
+            while True:
+                block = request.stream.read(STREAM_BLOCK_SIZE)
+                if not block:
+                    break
+                written += len(block)
+                if offset + written > upload.size:
+                    return jsonify({'message': 'Chunk exceeds declared file size', 'offset': offset}), 413
+                chunk.write(block)
+    
+        # Only one request appends at a given offset; a crashed one loses its claim after the timeout
+        now = datetime.utcnow()
+        claimed = CompletionUpload.objects(
+            Q(append_started_at=None) | Q(append_started_at__lt=now - APPEND_CLAIM_TIMEOUT),
+            id=upload.id, status='Uploading', received=offset
+        ).update_one(set__append_started_at=now)
+        if not claimed:
+            upload.reload()
+            return jsonify({'message': 'Offset mismatch', 'offset': upload.received}), 409
+    
+        with open(part_path, 'r+b' if os.path.exists(part_path) else 'wb') as part, open(chunk_path, 'rb') as chunk:
+            # Drop bytes of an interrupted append that were never acknowledged
+            part.seek(offset)
+            part.truncate()
+            shutil.copyfileobj(chunk, part, STREAM_BLOCK_SIZE)
+    
+        acknowledged = CompletionUpload.objects(id=upload.id, received=offset, append_started_at=now).update_one(
+            set__received=offset + written, unset__append_started_at=True
+        )
+        if not acknowledged:
+            upload.reload()
+            return jsonify({'message': 'Offset mismatch', 'offset': upload.received}), 409
+    finally:
+        if os.path.exists(chunk_path):
+            os.remove(chunk_path)
+    
+    return jsonify({'upload_id': str(upload.id), 'offset': offset + written, 'size': upload.size})
+
+
+@completion_bp.post('/completion/uploads/<upload_id>/finalize')
+@jwt_required()
+def finalize_completion_upload(upload_id):
+    """Move a fully received upload into the completion image folder"""
+    ident = get_jwt_identity()
+    user_id = str(ident) if isinstance(ident, str) else str(ident['id'])
+    
+    upload = _get_own_upload(upload_id, user_id)
+    if not upload:
+        return jsonify({'message': 'Upload not found'}), 404
+    if upload.status != 'Uploading':
+        return jsonify(_serialize_upload(upload))
+    
+    part_path = _partial_upload_path(upload)
+    on_disk = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    if upload.received != upload.size or on_disk < upload.size:
+        return jsonify({'message': 'Upload incomplete', 'offset': upload.received, 'size': upload.size}), 409
+    
+    unique_filename = f"{uuid.uuid4()}_{upload.filename}"
+    relative_path = f"uploads/completions/{unique_filename}"
+    try:
+        os.replace(part_path, os.path.join(_completion_upload_dir(), unique_filename))
+    except FileNotFoundError:
+        # A concurrent finalize already moved the file
+        upload.reload()
+        return jsonify(_serialize_upload(upload))
+    CompletionUpload.objects(id=upload.id, status='Uploading').update_one(
+        set__status='Finalized', set__path=relative_path
+    )
+    
+    upload.reload()
+    return jsonify(_serialize_upload(upload))
+
+
 @completion_bp.get('/completion/<booking_id>')
 @jwt_required()
 def get_service_completion(booking_id):
@@ -197,11 +457,28 @@ def get_service_completion(booking_id):
             } if completion else None
         })
         
-    except Exception as e:
-        print(f"Error getting service completion: {e}")
+    except Exception:
+        logger.exception("Error getting service completion for booking %s", booking_id)
         return jsonify({'message': 'Error getting service completion'}), 500
 
 
+def _get_or_create_pending_payment(booking, idempotency_key):
+    """Atomically fetch the booking's payment, inserting a pending Razorpay one if missing"""
+    upsert = dict(
+        upsert=True, new=True,
+        set_on_insert__amount=booking.price or 0,
+        set_on_insert__method='Razorpay',
+        set_on_insert__status='Pending',
+        set_on_insert__idempotency_key=idempotency_key,
+        set_on_insert__created_at=datetime.utcnow()
+    )
+    try:
+        return Payment.objects(booking=booking).modify(**upsert)
+    except NotUniqueError:
+        # A concurrent request inserted it first
+        return Payment.objects(booking=booking).first()
+
+
 @completion_bp.post('/payments/razorpay/create-order')
 @jwt_required()
 def create_razorpay_order():
@@ -228,51 +505,72 @@ def create_razorpay_order():
         if booking.status != 'Completed':
             return jsonify({'message': 'Booking must be completed before payment'}), 400
         
-        # Check if payment already exists
-        if booking.payment:
+        # One payment per booking: retries converge on the same record and order
+        idempotency_key = request.headers.get('Idempotency-Key') or data.get('idempotency_key') or f'booking_{booking.id}'
+        payment = _get_or_create_pending_payment(booking, idempotency_key)
+        if payment.method != 'Razorpay' or payment.status != 'Pending':
             return jsonify({'message': 'Payment already exists for this booking'}), 400
         
-        amount = int(booking.price * 100)  # Convert to paise
+        amount = int(round(payment.amount * 100))  # Convert to paise
         currency = 'INR'
-        
-        # Create Razorpay order
-        order_data = {
-            'amount': amount,
-            'currency': currency,
-            'receipt': f'booking_{booking_id}',
-            'notes': {
-                'booking_id': str(booking.id),
-                'service_name': booking.service.name if booking.service else 'Service',
-                'provider_name': booking.provider.user.name if booking.provider and booking.provider.user else 'Provider'
+        gateway = get_gateway()
+        replayed = bool(payment.razorpay_order_id)
+        
+        if not replayed:
+            # Only the request that claims the payment talks to the gateway
+            now = datetime.utcnow()
+            previous_attempt = payment.order_requested_at is not None
+            claimed = Payment.objects(
+                Q(order_requested_at=None) | Q(order_requested_at__lt=now - ORDER_CLAIM_TIMEOUT),
+                id=payment.id, razorpay_order_id=None
+            ).update_one(set__order_requested_at=now)
+            if not claimed:
+                response = jsonify({'message': 'Payment order is being created, please retry'})
+                response.headers['Retry-After'] = '1'
+                return response, 409
+            
+            receipt = f'booking_{booking.id}'
+            order_data = {
+                'amount': amount,
+                'currency': currency,
+                'receipt': receipt,
+                'notes': {
+                    'booking_id': str(booking.id),
+                    'idempotency_key': idempotency_key,
+                    'service_name': booking.service.name if booking.service else 'Service',
+                    'provider_name': booking.provider.user.name if booking.provider and booking.provider.user else 'Provider'
+                }
             }
-        }
-        
-        order = razorpay_client.order.create(data=order_data)
-        
-        # Create payment record
-        payment = Payment(
-            booking=booking,
-            amount=booking.price,
-            method='Razorpay',
-            status='Pending',
-            razorpay_order_id=order['id']
-        )
-        payment.save()
-        
-        # Update booking with payment reference
-        booking.payment = payment
-        booking.save()
+            
+            try:
+                # An earlier attempt may have reached the gateway before timing out
+                existing = gateway.find_orders_by_receipt(receipt) if previous_attempt else []
+                order = existing[0] if existing else gateway.create_order(order_data)
+            except GatewayUnavailable as e:
+                logger.warning("Razorpay unavailable: %s", e)
+                # Release the claim but keep it non-null so the retry looks the order up first
+                Payment.objects(id=payment.id, order_requested_at=now).update_one(
+                    set__order_requested_at=now - ORDER_CLAIM_TIMEOUT
+                )
+                return jsonify({'message': 'Payment gateway unavailable, please retry'}), 503
+            
+            Payment.objects(id=payment.id).update_one(set__razorpay_order_id=order['id'])
+            Booking.objects(id=booking.id).update_one(set__payment=payment.id)
+            payment.razorpay_order_id = order['id']
         
-        return jsonify({
-            'order_id': order['id'],
+        response = jsonify({
+            'order_id': payment.razorpay_order_id,
             'amount': amount,
             'currency': currency,
-            'key': RAZORPAY_KEY_ID,
-            'payment_id': str(payment.id)
+            'key': gateway.key_id,
+            'payment_id': str(payment.id),
+            'idempotency_key': payment.idempotency_key
         })
+        response.headers['Idempotent-Replayed'] = 'true' if replayed else 'false'
+        return response
         
-    except Exception as e:
-        print(f"Error creating Razorpay order: {e}")
+    except Exception:
+        logger.exception("Error creating Razorpay order")
         return jsonify({'message': 'Error creating payment order'}), 500
 
 
@@ -300,21 +598,26 @@ def verify_razorpay_payment():
         if str(payment.booking.user.id) != user_id:
             return jsonify({'message': 'Unauthorized'}), 403
         
-        # Verify signature
-        params_dict = {
-            'razorpay_order_id': payment.razorpay_order_id,
-            'razorpay_payment_id': razorpay_payment_id,
-            'razorpay_signature': razorpay_signature
-        }
-        
-        try:
-            razorpay_client.utility.verify_payment_signature(params_dict)
+        # Verify signature (computed locally, no gateway round trip)
+        if get_gateway().verify_payment_signature(payment.razorpay_order_id, razorpay_payment_id, razorpay_signature):
             
-            # Update payment status
-            payment.razorpay_payment_id = razorpay_payment_id
-            payment.razorpay_signature = razorpay_signature
-            payment.status = 'Success'
-            payment.save()
+            # Like the webhook and reconcile job, only settle a payment that is still pending
+            settled = Payment.objects(id=payment.id, status='Pending').update_one(
+                set__razorpay_payment_id=razorpay_payment_id,
+                set__razorpay_signature=razorpay_signature,
+                set__status='Success',
+                set__settled_at=datetime.utcnow()
+            )
+            if not settled:
+                payment.reload()
+                if payment.status != 'Success':
+                    return jsonify({'message': f'Payment already {payment.status.lower()}',
+                                    'status': payment.status}), 409
+                return jsonify({
+                    'message': 'Payment verified successfully',
+                    'payment_id': str(payment.id),
+                    'status': 'Success'
+                })
             
             # Notify provider about successful payment
             if payment.booking.provider:
@@ -339,19 +642,44 @@ def verify_razorpay_payment():
                 'payment_id': str(payment.id),
                 'status': 'Success'
             })
-            
-        except Exception as e:
-            # Payment verification failed
-            payment.status = 'Failed'
-            payment.save()
-            
-            return jsonify({'message': 'Payment verification failed'}), 400
         
-    except Exception as e:
-        print(f"Error verifying payment: {e}")
+        # Payment verification failed; a payment already settled by the gateway keeps its status
+        Payment.objects(id=payment.id, status='Pending').update_one(set__status='Failed')
+        
+        return jsonify({'message': 'Payment verification failed'}), 400
+        
+    except Exception:
+        logger.exception("Error verifying payment")
         return jsonify({'message': 'Error verifying payment'}), 500
 
 
+@completion_bp.post('/payments/razorpay/webhook')
+def razorpay_webhook():
+    """Record a signed gateway event and settle the payment it refers to"""
+    body = request.get_data()
+    if not get_gateway().verify_webhook_signature(body, request.headers.get('X-Razorpay-Signature')):
+        return jsonify({'message': 'Invalid signature'}), 400
+    
+    try:
+        event = json.loads(body)
+    except ValueError:
+        return jsonify({'message': 'Invalid payload'}), 400
+    if not isinstance(event, dict):
+        return jsonify({'message': 'Invalid payload'}), 400
+    
+    event_id = request.headers.get('X-Razorpay-Event-Id') or hashlib.sha256(body).hexdigest()
+    try:
+        record = record_payment_event(event_id, event)
+    except ValidationError:
+        # Signed, but a field has the wrong type
+        return jsonify({'message': 'Invalid payload'}), 400
+    if record is None:
+        return jsonify({'message': 'Event already recorded'})
+    
+    settled = apply_payment_event(record)
+    return jsonify({'message': 'Event recorded', 'settled': settled})
+
+
 @completion_bp.get('/payments/<booking_id>/status')
 @jwt_required()
 def get_payment_status(booking_id):
@@ -387,6 +715,6 @@ def get_payment_status(booking_id):
             'razorpay_payment_id': payment.razorpay_payment_id
         })
         
-    except Exception as e:
-        print(f"Error getting payment status: {e}")
+    except Exception:
+        logger.exception("Error getting payment status for booking %s", booking_id)
         return jsonify({'message': 'Error getting payment status'}), 500
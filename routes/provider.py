@@ -1,101 +1,117 @@
 from flask import Blueprint, request, jsonify, render_template
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
 from extensions import socketio
-from models import User, Provider
+from models import User, Provider, Booking
+from autocomplete import suggest_index
+from realtime import emit_provider_location, parse_fixes, record_provider_fixes
+from location_buffer import location_buffer
+from presence import presence
+from database import HOT_READ_ALIAS, pool_snapshot
+from eta import eta, eta_batch
+from catalog import service_catalog
+from metrics import query_budget
+from datetime import datetime
 from bson import ObjectId
-import math
+import logging
 
 provider_bp = Blueprint('provider', __name__)
+logger = logging.getLogger(__name__)
+
+# Words that count as a match for a requested service type
+SERVICE_KEYWORDS = {
+    'electrician': ['electrical', 'electric', 'wiring', 'power'],
+    'plumber': ['plumbing', 'water', 'pipe', 'drain'],
+    'carpenter': ['carpentry', 'wood', 'furniture', 'cabinet'],
+    'cleaner': ['cleaning', 'housekeeping', 'maid'],
+    'painter': ['painting', 'paint', 'wall', 'decor'],
+    'ac': ['air conditioning', 'cooling', 'refrigerator', 'hvac']
+}
+
+
+def skills_match(service_type, skills):
+    """Whether a provider with these skills offers the (lowercase) service type"""
+    lowered = [skill.lower() for skill in skills]
+    # Exact match
+    if service_type in lowered:
+        return True
+    # Partial match (e.g., "electrician" matches "Electrical")
+    compact = service_type.replace(' ', '')
+    for skill in lowered:
+        if (service_type in skill or skill in service_type or
+                compact in skill.replace(' ', '') or skill.replace(' ', '') in compact):
+            return True
+    # Category-based matching
+    for category, keywords in SERVICE_KEYWORDS.items():
+        if category in service_type:
+            for keyword in keywords:
+                if any(keyword in skill for skill in lowered):
+                    return True
+    return False
+
+
+def hourly_rate_for(skills):
+    """Base rate in INR plus 50 per skill"""
+    return 300 + len(skills) * 50
+
+
+def rank_nearby(results, lat, lon, limit=50):
+    """Add distance and ETA to nearby results (one vectorized call) and keep the closest"""
+    estimates = eta_batch([(r['lat'], r['lon']) for r in results], [(lat, lon)] * len(results))
+    for r, (distance_km, eta_minutes) in zip(results, estimates):
+        r['distance_km'] = distance_km
+        r['eta_minutes'] = eta_minutes
+    # Sort by distance first, then by rating
+    results.sort(key=lambda x: (x['distance_km'], -x['rating']))
+    return results[:limit]
 
 
 @provider_bp.get('/providers/nearby')
+@query_budget(3)  # provider users, their profiles, job counts
 @jwt_required(optional=True)
 def providers_nearby():
     try:
         lat = float(request.args.get('lat'))
         lon = float(request.args.get('lon'))
     except Exception:
-        print("No valid lat/lon provided, using default")
+        logger.debug("No valid lat/lon provided, using default")
         lat, lon = 28.6139, 77.2090  # Default to Delhi
 
     # Get optional service filter
     service_type = request.args.get('service_type', '').lower()
-    print(f"Searching for providers near {lat}, {lon} with service: {service_type}")
+    online_only = request.args.get('online') in ('1', 'true')
     
-    # very simple distance filter using Pythagorean approximation
-    users = User.objects(role='provider')
-    print(f"Found {users.count()} provider users")
+    # A provider list a few seconds stale is fine; keep this read off the write pool
+    users = list(User.objects(role='provider').using(HOT_READ_ALIAS).no_dereference())
+    profiles = {p.id: p for p in Provider.objects(
+        id__in=[u.provider_profile.id for u in users if u.provider_profile]
+    ).using(HOT_READ_ALIAS).no_dereference().only('skills', 'availability')}
+    online = presence.online_among(u.id for u in users)
     results = []
     for u in users:
-        print(f"Checking provider user: {u.name} (ID: {u.id})")
+        if online_only and str(u.id) not in online:
+            continue
         # Use default location if provider doesn't have location set
-        provider_lat = u.latitude if u.latitude is not None else 28.6139  # Delhi default
-        provider_lon = u.longitude if u.longitude is not None else 77.2090  # Delhi default
-        dist = math.sqrt((provider_lat - lat) ** 2 + (provider_lon - lon) ** 2) * 111  # rough km
-        provider = u.provider_profile
-        print(f"  Provider profile: {provider}")
+        buffered = location_buffer.get(u.id)
+        if buffered:
+            provider_lat, provider_lon = buffered['lat'], buffered['lon']
+        else:
+            provider_lat = u.latitude if u.latitude is not None else 28.6139  # Delhi default
+            provider_lon = u.longitude if u.longitude is not None else 77.2090  # Delhi default
+        provider = profiles.get(u.provider_profile.id) if u.provider_profile else None
         if not provider:
-            print(f"  No provider profile found for {u.name}")
+            logger.debug("No provider profile for user %s", str(u.id), extra={'sample_every': 20})
             continue
             
         skills = provider.skills if provider.skills else []
-        print(f"  Skills: {skills}")
         
         # Filter by service type if provided
         if service_type:
-            print(f"  Filtering by service type: {service_type}")
-            # Check if provider has the requested service - improved matching
-            service_match = False
-            
-            # Exact match
-            if service_type in [skill.lower() for skill in skills]:
-                service_match = True
-            
-            # Partial match (e.g., "electrician" matches "Electrical")
-            if not service_match:
-                for skill in skills:
-                    if (service_type in skill.lower() or 
-                        skill.lower() in service_type or
-                        service_type.replace(' ', '') in skill.lower().replace(' ', '') or
-                        skill.lower().replace(' ', '') in service_type.replace(' ', '')):
-                        service_match = True
-                        break
-            
-            # Category-based matching
-            if not service_match and service_type:
-                service_categories = {
-                    'electrician': ['electrical', 'electric', 'wiring', 'power'],
-                    'plumber': ['plumbing', 'water', 'pipe', 'drain'],
-                    'carpenter': ['carpentry', 'wood', 'furniture', 'cabinet'],
-                    'cleaner': ['cleaning', 'housekeeping', 'maid'],
-                    'painter': ['painting', 'paint', 'wall', 'decor'],
-                    'ac': ['air conditioning', 'cooling', 'refrigerator', 'hvac']
-                }
-                
-                for category, keywords in service_categories.items():
-                    if category in service_type:
-                        for keyword in keywords:
-                            if any(keyword in skill.lower() for skill in skills):
-                                service_match = True
-                                break
-                        if service_match:
-                            break
-            
-            if not service_match:
-                print(f"  Service mismatch for {u.name}")
+            if not skills_match(service_type, skills):
+                logger.debug("Provider %s skills %s do not match %r", str(u.id), skills, service_type,
+                             extra={'sample_every': 20})
                 continue
-            else:
-                print(f"  Service match found for {u.name}")
-        
-        # Calculate hourly rate based on skills and experience
-        base_rate = 300  # Base rate in INR
-        skill_multiplier = len(skills) * 50
-        hourly_rate = base_rate + skill_multiplier
-        
-        # Get jobs count from bookings
-        from models import Booking
-        jobs_count = Booking.objects(provider=provider).count()
         
+        hourly_rate = hourly_rate_for(skills)
         results.append({
             'id': str(provider.id),
             'name': u.name,
@@ -105,16 +121,23 @@ def providers_nearby():
             'price': hourly_rate,  # For backward compatibility
             'lat': provider_lat,
             'lon': provider_lon,
-            'jobs_count': jobs_count,
-            'distance_km': round(dist, 2),
+            'jobs_count': 0,
             'avatar': u.avatar_path,
-            'availability': provider.availability
+            'availability': provider.availability,
+            'online': str(u.id) in online
         })
+
+    logger.debug("Nearby %s,%s service=%r: %d of %d providers match", lat, lon, service_type, len(results), len(users))
+    results = rank_nearby(results, lat, lon)
     
-    # Sort by distance first, then by rating
-    results.sort(key=lambda x: (x['distance_km'], -x['rating']))
-    print(f"Returning {len(results)} providers")
-    return jsonify(results[:50])
+    # Jobs count from bookings, for the returned providers in one aggregation
+    if results:
+        jobs = Booking.objects(provider__in=[ObjectId(r['id']) for r in results]).using(HOT_READ_ALIAS).aggregate(
+            [{'$group': {'_id': '$provider', 'count': {'$sum': 1}}}])
+        counts = {str(row['_id']): row['count'] for row in jobs}
+        for r in results:
+            r['jobs_count'] = counts.get(r['id'], 0)
+    return jsonify(results)
 
 
 @provider_bp.get('/nearby')
@@ -142,18 +165,19 @@ def update_provider_location():
         # Optional human-readable address
         if 'address' in data:
             user.address = data.get('address')
+        user.location_updated_at = datetime.utcnow()
         user.save()
+        location_buffer.discard(user.id)
         # Broadcast provider location update to clients
         try:
-            room = f"provider_{user.id}"
-            socketio.emit('provider_location', {
+            emit_provider_location('provider_location', {
                 'user_id': str(user.id),
                 'name': user.name,
                 'lat': user.latitude,
                 'lon': user.longitude,
                 'address': user.address,
                 'rating': user.rating
-            })
+            }, str(user.id))
         except Exception:
             pass
         return jsonify({'message': 'Location updated', 'address': user.address})
@@ -186,6 +210,7 @@ def add_provider_service():
         if service_name not in provider.skills:
             provider.skills.append(service_name)
             provider.save()
+            suggest_index.skills_changed(added=[service_name])
             
             # Broadcast provider update
             try:
@@ -229,6 +254,7 @@ def remove_provider_service():
         if service_name in provider.skills:
             provider.skills.remove(service_name)
             provider.save()
+            suggest_index.skills_changed(removed=[service_name])
             
             # Broadcast provider update
             try:
@@ -294,20 +320,29 @@ def debug_providers():
 
 
 @provider_bp.get('/debug/bookings')
+@query_budget(5)  # bookings, providers, user names, catalog version and reload
 def debug_bookings():
     """Debug endpoint to check recent bookings"""
     try:
-        from models import Booking
-        recent_bookings = Booking.objects.order_by('-created_at').limit(10)
+        recent_bookings = list(Booking.objects.order_by('-created_at').limit(10).no_dereference())
+        
+        # Referenced documents in one query per collection instead of one per booking
+        providers = {p.id: p for p in Provider.objects(
+            id__in=[b.provider.id for b in recent_bookings if b.provider]).no_dereference().only('user')}
+        user_ids = [b.user.id for b in recent_bookings if b.user] + [p.user.id for p in providers.values() if p.user]
+        names = {u.id: u.name for u in User.objects(id__in=user_ids).only('name')}
+        catalog = service_catalog.current()
         
         bookings_data = []
         for booking in recent_bookings:
+            provider = providers.get(booking.provider.id) if booking.provider else None
+            service = catalog.get(booking.service.id) if booking.service else None
             bookings_data.append({
                 'id': str(booking.id),
-                'user_name': booking.user.name if booking.user else 'Unknown',
-                'provider_name': booking.provider.user.name if booking.provider and booking.provider.user else 'Unassigned',
-                'service_name': booking.service.name if booking.service else 'Unknown',
-                'service_category': booking.service.category if booking.service else 'Unknown',
+                'user_name': names.get(booking.user.id, 'Unknown') if booking.user else 'Unknown',
+                'provider_name': names.get(provider.user.id, 'Unassigned') if provider and provider.user else 'Unassigned',
+                'service_name': service.name if service else 'Unknown',
+                'service_category': service.category if service else 'Unknown',
                 'status': booking.status,
                 'price': booking.price,
                 'created_at': booking.created_at.isoformat() if booking.created_at else None,
@@ -329,7 +364,7 @@ def debug_bookings():
 def create_test_providers():
     """Create test providers for debugging"""
     try:
-        from models import User, Provider
+        from models import User, Provider, Booking
         from flask_bcrypt import Bcrypt
         bcrypt = Bcrypt()
         
@@ -369,7 +404,7 @@ def create_test_providers():
             # Check if user already exists
             existing_user = User.objects(email=provider_data['email']).first()
             if existing_user:
-                print(f"User {provider_data['name']} already exists")
+                logger.info("User %s already exists", provider_data['name'])
                 continue
                 
             # Create user
@@ -392,13 +427,14 @@ def create_test_providers():
                 availability=True
             )
             provider.save()
+            suggest_index.skills_changed(added=provider.skills)
             
             # Update user with provider reference
             user.provider_profile = provider
             user.save()
             
             created_count += 1
-            print(f"Created provider: {provider_data['name']}")
+            logger.info("Created provider: %s", provider_data['name'])
         
         return jsonify({
             'message': f'Created {created_count} test providers',
@@ -417,46 +453,83 @@ def update_provider_tracking_location():
     user_id = str(ident) if isinstance(ident, str) else str(ident.get('id') or ident)
     
     try:
-        user = User.objects(id=ObjectId(user_id)).first()
-        if not user or user.role != 'provider':
+        if not ObjectId.is_valid(user_id):
+            return jsonify({'message': 'Invalid user ID'}), 400
+        # Role and name come from the token so a ping does not load the user
+        claims = get_jwt()
+        role, name = claims.get('role'), claims.get('name')
+        if role is None:
+            user = User.objects(id=ObjectId(user_id)).only('role', 'name').first()
+            role, name = (user.role, user.name) if user else (None, None)
+        if role != 'provider':
             return jsonify({'message': 'Provider not found'}), 404
         
-        data = request.get_json() or {}
-        latitude = data.get('lat')
-        longitude = data.get('lon')
-        
-        if latitude is None or longitude is None:
-            return jsonify({'message': 'Latitude and longitude are required'}), 400
-        
-        # Update user location
-        user.latitude = float(latitude)
-        user.longitude = float(longitude)
-        user.save()
-        
-        # Broadcast location update to clients tracking this provider
+        # One fix {lat, lon} or a batch {fixes: [...]}, same format as the provider_ping socket event
         try:
-            from datetime import datetime
-            socketio.emit('provider_location_update', {
-                'provider_id': str(user.id),
-                'name': user.name,
-                'lat': latitude,
-                'lon': longitude,
-                'timestamp': datetime.utcnow().isoformat()
-            })
-        except Exception:
-            pass
+            fixes = parse_fixes(request.get_json(silent=True) or {})
+        except ValueError as e:
+            return jsonify({'message': str(e)}), 400
+        
+        # Buffered; written to Mongo (and each active booking's trail) in batches by location_buffer
+        position = record_provider_fixes(user_id, name, fixes)
         
         return jsonify({
             'message': 'Location updated successfully',
-            'lat': latitude,
-            'lon': longitude
+            'lat': position['lat'],
+            'lon': position['lon']
         })
         
     except Exception as e:
         return jsonify({'message': 'Invalid request'}), 400
 
 
+@provider_bp.get('/admin/location-buffer')
+@jwt_required()
+def location_buffer_stats():
+    """Pings absorbed vs. writes issued by the location write-behind buffer"""
+    ident = get_jwt_identity()
+    user_id = str(ident) if isinstance(ident, str) else str(ident.get('id') or ident)
+    try:
+        user = User.objects(id=ObjectId(user_id)).only('role').first()
+        if not user or user.role != 'admin':
+            return jsonify({'message': 'Admin only'}), 403
+    except Exception:
+        return jsonify({'message': 'Invalid user ID'}), 400
+    return jsonify(location_buffer.snapshot())
+
+
+@provider_bp.get('/admin/presence')
+@jwt_required()
+def presence_stats():
+    """Providers with a live socket, across workers"""
+    ident = get_jwt_identity()
+    user_id = str(ident) if isinstance(ident, str) else str(ident.get('id') or ident)
+    try:
+        user = User.objects(id=ObjectId(user_id)).only('role').first()
+        if not user or user.role != 'admin':
+            return jsonify({'message': 'Admin only'}), 403
+    except Exception:
+        return jsonify({'message': 'Invalid user ID'}), 400
+    return jsonify(presence.snapshot())
+
+
+@provider_bp.get('/admin/db-pool')
+@jwt_required()
+def db_pool_stats():
+    """MongoDB connection pool statistics per connection alias"""
+    ident = get_jwt_identity()
+    user_id = str(ident) if isinstance(ident, str) else str(ident.get('id') or ident)
+    try:
+        user = User.objects(id=ObjectId(user_id)).only('role').first()
+        if not user or user.role != 'admin':
+            return jsonify({'message': 'Admin only'}), 403
+    except Exception:
+        return jsonify({'message': 'Invalid user ID'}), 400
+    return jsonify(pool_snapshot())
+
+
 @provider_bp.get('/providers/<provider_id>/track')
+@query_budget(2)  # provider, current user
 @jwt_required()
 def track_provider(provider_id):
     """Get current location and ETA for a specific provider"""
@@ -464,6 +537,10 @@ def track_provider(provider_id):
         provider_user = User.objects(id=ObjectId(provider_id)).first()
         if not provider_user or provider_user.role != 'provider':
             return jsonify({'message': 'Provider not found'}), 404
+        # Pings not yet flushed to Mongo are newer than the stored position
+        buffered = location_buffer.get(provider_user.id)
+        if buffered:
+            provider_user.latitude, provider_user.longitude = buffered['lat'], buffered['lon']
         
         # Get current user location (for ETA calculation)
         ident = get_jwt_identity()
@@ -473,17 +550,12 @@ def track_provider(provider_id):
         if not current_user:
             return jsonify({'message': 'User not found'}), 404
         
-        # Calculate ETA (simple distance-based calculation)
         if (provider_user.latitude and provider_user.longitude and 
             current_user.latitude and current_user.longitude):
             
-            # Calculate distance in km
-            lat_diff = provider_user.latitude - current_user.latitude
-            lon_diff = provider_user.longitude - current_user.longitude
-            distance_km = math.sqrt(lat_diff**2 + lon_diff**2) * 111
-            
-            # Estimate ETA (assuming average speed of 25 km/h in city traffic)
-            eta_minutes = max(5, int((distance_km / 25) * 60))
+            # Haversine distance and ETA from the learned hour-of-day speeds
+            distance_km, eta_minutes = eta((provider_user.latitude, provider_user.longitude),
+                                           (current_user.latitude, current_user.longitude))
             
             return jsonify({
                 'provider_id': str(provider_user.id),
@@ -493,8 +565,9 @@ def track_provider(provider_id):
                     'lon': provider_user.longitude,
                     'address': provider_user.address
                 },
-                'distance_km': round(distance_km, 2),
+                'distance_km': distance_km,
                 'eta_minutes': eta_minutes,
+                'online': presence.is_online(provider_user.id),
                 'status': 'On the way',
                 'last_updated': datetime.utcnow().isoformat()
             })
@@ -1,25 +1,48 @@
-from flask import Blueprint, request, jsonify, url_for
+from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from werkzeug.utils import secure_filename
-from models import Service, User, Booking
+from models import Service, User
+from rollups import booking_stats
+from catalog import service_catalog
+from metrics import query_budget
+from autocomplete import suggest_index
 from bson import ObjectId
+from datetime import datetime, timedelta
 import os
 
 service_bp = Blueprint('service', __name__)
 
 
 @service_bp.get('/services')
+@query_budget(2)  # catalog version and reload
 def list_services():
-    services = Service.objects()
-    return jsonify([{
-        'id': str(s.id),
-        'name': s.name,
-        'category': s.category,
-        'base_price': s.base_price,
-        'image_url': url_for('static', filename=s.image_path, _external=False) if s.image_path else None,
-        'location_lat': s.location_lat,
-        'location_lon': s.location_lon,
-    } for s in services])
+    snapshot = service_catalog.current()
+    if snapshot.etag in request.if_none_match:
+        response = current_app.response_class(status=304)
+    elif request.accept_encodings['gzip']:
+        response = current_app.response_class(snapshot.gzip_bytes, mimetype='application/json')
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = current_app.response_class(snapshot.json_bytes, mimetype='application/json')
+    response.set_etag(snapshot.etag)
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+@service_bp.get('/services/suggest')
+def suggest_services():
+    query = (request.args.get('q') or '').strip()
+    limit = min(max(request.args.get('limit', 10, type=int), 1), 50)
+    if not query:
+        return jsonify({'query': query, 'suggestions': []})
+    
+    snapshot = service_catalog.current()
+    suggestions = suggest_index.suggest(query, limit)
+    for s in suggestions:
+        if s['kind'] == 'service':
+            service = snapshot.by_name.get(s['text'].lower())
+            s['service_id'] = str(service.id) if service else None
+    return jsonify({'query': query, 'suggestions': suggestions})
 
 
 @service_bp.post('/services')
@@ -53,6 +76,7 @@ def create_service():
         s.image_path = os.path.join('images', 'services', filename).replace('\\', '/')
 
     s.save()
+    service_catalog.invalidate()
     return jsonify({'id': str(s.id)})
 
 
@@ -68,7 +92,13 @@ def admin_stats():
     except Exception:
         return jsonify({'message': 'Invalid user ID'}), 400
     
-    total_users = User.objects.count()
-    total_bookings = Booking.objects.count()
-    revenue = sum([b.price or 0 for b in Booking.objects()])
-    return jsonify({'users': total_users, 'bookings': total_bookings, 'revenue': revenue})
+    # Optional filters: ?from=YYYY-MM-DD&to=YYYY-MM-DD (inclusive) &category=...
+    try:
+        start = datetime.strptime(request.args['from'], '%Y-%m-%d') if request.args.get('from') else None
+        end = datetime.strptime(request.args['to'], '%Y-%m-%d') + timedelta(days=1) if request.args.get('to') else None
+    except ValueError:
+        return jsonify({'message': 'Dates must be YYYY-MM-DD'}), 400
+    
+    stats = booking_stats(start=start, end=end, category=request.args.get('category') or None)
+    stats['users'] = User.objects.count()
+    return jsonify(stats)
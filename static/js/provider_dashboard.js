@@ -10,7 +10,7 @@
     const userId = claims?.id || claims?.user_id || claims?.sub || '';
     const role = claims?.role || '';
     if (role === 'provider' && window.io){
-      socket = io();
+      socket = io({ auth: { token } });
       
       // Join provider-specific room
       socket.emit('join_provider_room', { provider_id: userId });
@@ -657,21 +657,23 @@
       const images = modal.querySelector('#completionImages').files;
       
       try {
-        const formData = new FormData();
-        formData.append('booking_id', jobId);
-        formData.append('completion_notes', completionNotes);
-        
-        // Add images to form data
+        // Send each image through the resumable upload protocol first
+        const uploadIds = [];
         for (let i = 0; i < images.length; i++) {
-          formData.append('images', images[i]);
+          uploadIds.push(await uploadResumable(images[i]));
         }
         
         const response = await fetch('/completion/upload', {
           method: 'POST',
           headers: {
-            'Authorization': `Bearer ${token}`
+            'Authorization': `Bearer ${token}`,
+            'Content-Type': 'application/json'
           },
-          body: formData
+          body: JSON.stringify({
+            booking_id: jobId,
+            completion_notes: completionNotes,
+            upload_ids: uploadIds
+          })
         });
         
         const result = await response.json();
@@ -706,6 +708,50 @@
     modal.addEventListener('hidden.bs.modal', () => modal.remove());
   };
 
+  // Upload one file in chunks, resuming from the last acknowledged offset after a failure
+  async function uploadResumable(file, maxRetries = 5) {
+    const authHeaders = { 'Authorization': `Bearer ${token}` };
+    const initRes = await fetch('/completion/uploads', {
+      method: 'POST',
+      headers: { ...authHeaders, 'Content-Type': 'application/json' },
+      body: JSON.stringify({ filename: file.name, size: file.size })
+    });
+    const upload = await initRes.json();
+    if (!initRes.ok) throw new Error(upload.message || 'Failed to start upload');
+    
+    let offset = upload.offset;
+    let retries = 0;
+    while (offset < file.size) {
+      const chunk = file.slice(offset, offset + upload.chunk_size);
+      try {
+        const res = await fetch(`/completion/uploads/${upload.upload_id}`, {
+          method: 'PUT',
+          headers: { ...authHeaders, 'Content-Type': 'application/octet-stream', 'Upload-Offset': String(offset) },
+          body: chunk
+        });
+        const body = await res.json();
+        if (res.ok || res.status === 409) {
+          offset = body.offset;
+          retries = 0;
+          continue;
+        }
+        throw new Error(body.message || 'Chunk upload failed');
+      } catch (error) {
+        if (++retries > maxRetries) throw error;
+        await new Promise(resolve => setTimeout(resolve, 1000 * retries));
+        const status = await fetch(`/completion/uploads/${upload.upload_id}`, { headers: authHeaders });
+        if (status.ok) offset = (await status.json()).offset;
+      }
+    }
+    
+    const finalRes = await fetch(`/completion/uploads/${upload.upload_id}/finalize`, {
+      method: 'POST',
+      headers: authHeaders
+    });
+    if (!finalRes.ok) throw new Error('Failed to finalize upload');
+    return upload.upload_id;
+  }
+
   window.removeService = async function(serviceName) {
     if (!confirm(`Are you sure you want to remove "${serviceName}" from your services?`)) {
       return;
@@ -82,14 +82,12 @@
   // Initialize Socket.IO for real-time updates
   async function initializeSocket() {
     try {
-      socket = io();
+      // The token authenticates the socket; the server joins user_<id> itself
+      socket = io({ auth: { token: localStorage.getItem('token') || '' } });
       
       socket.on('connect', () => {
         console.log('Connected to server');
-        if (currentUserId) {
-          socket.emit('join', { room: `user_${currentUserId}` });
-          console.log(`User ${currentUserId} joined socket room`);
-        }
+        joinActiveBookingRooms();
       });
 
       socket.on('disconnect', () => {
@@ -122,6 +120,13 @@
     }
   }
 
+  // Provider locations are only sent to the rooms of active bookings
+  let activeBookingIds = [];
+  function joinActiveBookingRooms() {
+    if (!socket || !socket.connected) return;
+    activeBookingIds.forEach(id => socket.emit('join_booking_room', { booking_id: id }));
+  }
+
   // Load user data and statistics
   async function loadUserData() {
     const token = localStorage.getItem('token');
@@ -237,6 +242,10 @@
         const bookings = await response.json();
         console.log('Bookings loaded:', bookings);
         renderUserBookings(bookings);
+        activeBookingIds = bookings
+          .filter(b => b.status === 'Accepted' || b.status === 'In Progress')
+          .map(b => b.id);
+        joinActiveBookingRooms();
       } else {
         const error = await response.text();
         console.error('Error loading bookings:', response.status, error);
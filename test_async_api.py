@@ -0,0 +1,38 @@
+"""
+Tests for the async read tier's routing and auth, without MongoDB
+"""
+import asyncio
+import json
+
+from async_api import AsyncAPI
+
+
+def call(app, path, headers=()):
+    scope = {'type': 'http', 'method': 'GET', 'path': path, 'query_string': b'',
+             'headers': [(k.encode(), v.encode()) for k, v in headers]}
+    sent = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b''}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(app(scope, receive, send))
+    return sent[0]['status'], sent[1]['body']
+
+
+def test_hot_paths_need_a_valid_token_before_any_lookup():
+    app = AsyncAPI()
+    assert call(app, '/bookings/user') == (401, b'{"msg":"Missing Authorization Header"}')
+    status, body = call(app, '/providers/not-an-id/track', [('Authorization', 'Bearer junk')])
+    assert status == 422 and 'msg' in json.loads(body)
+
+
+def test_other_paths_fall_through_to_the_fallback():
+    async def fallback(scope, receive, send):
+        await send({'type': 'http.response.start', 'status': 200, 'headers': []})
+        await send({'type': 'http.response.body', 'body': scope['path'].encode()})
+
+    assert call(AsyncAPI(fallback=fallback), '/bookings/create') == (200, b'/bookings/create')
+    assert call(AsyncAPI(), '/bookings/create')[0] == 404
@@ -0,0 +1,42 @@
+"""
+Tests for the suggestion trie
+"""
+from autocomplete import PrefixTrie
+
+
+def _texts(results):
+    return [text for text, kind, count in results]
+
+
+def test_prefix_matches_any_word_in_key_order():
+    trie = PrefixTrie()
+    for text in ['Plumber', 'Plumbing', 'HVAC Technician', 'Electrician']:
+        trie.add(text, 'service')
+
+    assert _texts(trie.prefix('plumb')) == ['Plumber', 'Plumbing']
+    assert _texts(trie.prefix('TECH')) == ['HVAC Technician']
+    assert trie.prefix('xyz') == []
+
+
+def test_fuzzy_tolerates_one_edit():
+    trie = PrefixTrie()
+    trie.add('Plumber', 'service')
+    trie.add('Cleaner', 'service')
+
+    assert _texts(trie.fuzzy('plumer')) == ['Plumber']  # missing character
+    assert _texts(trie.fuzzy('cleanner')) == ['Cleaner']  # extra character
+    assert _texts(trie.fuzzy('clexner')) == ['Cleaner']  # wrong character
+    assert trie.fuzzy('clxxner') == []
+
+
+def test_refcounted_remove_prunes_entries():
+    trie = PrefixTrie()
+    trie.add('Tiling', 'skill')
+    trie.add('Tiling', 'skill')
+    trie.remove('Tiling', 'skill')
+    assert trie.prefix('til') == [('Tiling', 'skill', 1)]
+
+    trie.remove('Tiling', 'skill')
+    assert trie.prefix('til') == []
+    assert trie.size == 0
+    assert trie.root.children == {}
@@ -0,0 +1,60 @@
+"""
+Tests for streaming backup and restore
+"""
+import gzip
+from datetime import datetime
+
+import bson
+import pytest
+
+from backup import _json_line, _read_documents, backup, restore
+
+DOCS = [{'_id': bson.ObjectId(), 'name': f'doc {i}', 'price': i * 1.5, 'count': i,
+         'at': datetime(2026, 1, 1, 12, 0, i)} for i in range(5)]
+
+
+@pytest.mark.parametrize('compression', ['gzip', 'none'])
+def test_bson_files_read_back_document_by_document(tmp_path, compression):
+    path = tmp_path / 'docs.bson'
+    data = b''.join(bson.encode(doc) for doc in DOCS)
+    if compression == 'gzip':
+        path.write_bytes(gzip.compress(data))
+    else:
+        path.write_bytes(data)
+
+    read = [(dict(doc), size) for doc, size in _read_documents(str(path), 'bson', compression)]
+
+    assert [doc for doc, _ in read] == DOCS
+    assert sum(size for _, size in read) == len(data)
+
+
+def test_ndjson_keeps_types(tmp_path):
+    path = tmp_path / 'docs.ndjson.gz'
+    path.write_bytes(gzip.compress(b''.join(_json_line(doc) for doc in DOCS)))
+
+    read = [doc for doc, _ in _read_documents(str(path), 'ndjson', 'gzip')]
+
+    assert read == DOCS
+    assert isinstance(read[0]['count'], int) and isinstance(read[0]['price'], float)
+
+
+@pytest.mark.parametrize('fmt', ['ndjson', 'bson'])
+def test_backup_then_restore_round_trips(app, tmp_path, fmt):
+    from models import Service, User
+
+    with app.app_context():
+        Service(name='Plumber', category='Plumbing', base_price=18.0).save()
+        for i in range(7):
+            User(name=f'u{i}', email=f'backup-{fmt}-{i}@example.com', role='user', password_hash='x').save()
+        before = [u.to_mongo().to_dict() for u in User.objects.order_by('id')]
+        services = [s.to_mongo().to_dict() for s in Service.objects.order_by('id')]
+
+        manifest = backup(str(tmp_path), ['users', 'services'], fmt, 'gzip', page_size=3, workers=2)
+        assert manifest['collections']['users']['documents'] == len(before)
+
+        with pytest.raises(RuntimeError, match='already exists'):
+            restore(str(tmp_path), ['users'], page_size=3)
+        restore(str(tmp_path), page_size=3, drop=True)
+
+        assert [u.to_mongo().to_dict() for u in User.objects.order_by('id')] == before
+        assert [s.to_mongo().to_dict() for s in Service.objects.order_by('id')] == services
@@ -0,0 +1,85 @@
+"""
+Versioned service catalog: snapshots, invalidation, and ETag / gzip negotiation on GET /services
+"""
+import gzip
+import json
+import uuid
+
+import pytest
+from bson import ObjectId
+
+from catalog import CATALOG_CACHE, CatalogSnapshot, ServiceCatalog, bump_version, get_version
+from models import Service, User
+
+
+def test_snapshot_encodes_the_catalog_once():
+    services = [Service(id=ObjectId(), name='Plumber', category='Plumbing', base_price=18.0, image_path='img/p.png'),
+                Service(id=ObjectId(), name='Leak Fix', category='Plumbing', base_price=12.0)]
+
+    snapshot = CatalogSnapshot(7, services, image_url=lambda path: f'/static/{path}')
+
+    assert snapshot.etag == 'services-7'
+    assert json.loads(snapshot.json_bytes) == snapshot.items
+    assert gzip.decompress(snapshot.gzip_bytes) == snapshot.json_bytes
+    assert snapshot.items[0]['image_url'] == '/static/img/p.png' and snapshot.items[1]['image_url'] is None
+    assert snapshot.get(services[1].id) is services[1] and snapshot.get(None) is None
+    assert snapshot.by_name['plumber'] is services[0]
+    assert snapshot.by_category['plumbing'] == services
+    assert snapshot.first_matching(['Leak Fix']) is services[1]
+    assert snapshot.first_matching(['Plumbing']) is services[0]
+
+
+def test_snapshot_is_rebuilt_only_when_the_version_moves(app):
+    with app.test_request_context():
+        catalog = ServiceCatalog(check_interval=0)
+        first = catalog.current()
+        assert catalog.current() is first
+        assert first.version == get_version(CATALOG_CACHE)
+
+        service = Service(name=f'Catalog {uuid.uuid4().hex[:8]}', category='Testing', base_price=1.0).save()
+        assert catalog.current() is first
+        bump_version(CATALOG_CACHE)
+        second = catalog.current()
+        assert second.version == first.version + 1
+        assert second.get(service.id).name == service.name
+
+
+def test_version_checks_are_rate_limited_until_invalidated(app):
+    with app.test_request_context():
+        catalog = ServiceCatalog(check_interval=3600)
+        first = catalog.current()
+
+        bump_version(CATALOG_CACHE)  # another worker's write
+        assert catalog.current() is first
+
+        catalog.invalidate()  # this worker's write
+        assert catalog.current().version == first.version + 2
+
+
+@pytest.fixture
+def admin_headers(app, auth_headers):
+    admin = User(name='Catalog Admin', email=f'admin_{uuid.uuid4().hex[:8]}@test.com',
+                 role='admin', password_hash='x').save()
+    return auth_headers(admin)
+
+
+def test_services_negotiate_etag_and_gzip(client, admin_headers):
+    plain = client.get('/services')
+    etag = plain.headers['ETag']
+    assert plain.status_code == 200 and 'Content-Encoding' not in plain.headers
+    assert 'Accept-Encoding' in plain.headers['Vary']
+
+    compressed = client.get('/services', headers={'Accept-Encoding': 'gzip'})
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(compressed.data) == plain.data
+
+    not_modified = client.get('/services', headers={'If-None-Match': etag})
+    assert not_modified.status_code == 304 and not_modified.data == b''
+    assert not_modified.headers['ETag'] == etag
+
+    name = f'Catalog {uuid.uuid4().hex[:8]}'
+    assert client.post('/services', headers=admin_headers,
+                       data={'name': name, 'category': 'Testing', 'base_price': '9'}).status_code == 200
+    changed = client.get('/services', headers={'If-None-Match': etag})
+    assert changed.status_code == 200 and changed.headers['ETag'] != etag
+    assert name in [s['name'] for s in changed.get_json()]
@@ -0,0 +1,173 @@
+"""
+Tests for the service completion upload endpoint and the resumable upload protocol
+"""
+import os
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+
+from models import User, Provider, Service, Booking, ServiceCompletion, CompletionUpload
+from routes.completion import APPEND_CLAIM_TIMEOUT
+
+
+@pytest.fixture
+def in_progress_booking(app):
+    suffix = uuid.uuid4().hex[:8]
+    provider_user = User(name='Test Provider', email=f'provider_{suffix}@test.com',
+                         role='provider', password_hash='x').save()
+    provider = Provider(user=provider_user, skills=['Plumber']).save()
+    provider_user.provider_profile = provider
+    provider_user.save()
+    customer = User(name='Test Customer', email=f'customer_{suffix}@test.com',
+                    role='user', password_hash='x').save()
+    service = Service(name='Plumber', category='Plumbing', base_price=18.0).save()
+    booking = Booking(user=customer, provider=provider, service=service,
+                      status='In Progress', price=500).save()
+    return provider_user, booking
+
+
+def test_completion_is_one_update_plus_one_insert(client, auth_headers, mongo_commands, in_progress_booking):
+    provider_user, booking = in_progress_booking
+    headers = auth_headers(provider_user)
+    client.get('/services')  # warm the catalog cache
+    mongo_commands.reset()
+
+    response = client.post('/completion/upload', headers=headers, json={
+        'booking_id': str(booking.id),
+        'completion_notes': 'Fixed the leak',
+    })
+
+    assert response.status_code == 200, response.get_json()
+    writes = [(name, coll) for name, coll in mongo_commands.commands
+              if name in ('insert', 'update', 'findAndModify', 'delete') and coll != 'booking_rollups']
+    assert writes == [('update', 'bookings'), ('insert', 'service_completions')]
+    # provider, booking, update, insert, customer name, rollup
+    assert mongo_commands.count <= 6, mongo_commands.commands
+
+    booking.reload()
+    assert booking.status == 'Completed'
+    assert booking.completion_notes == 'Fixed the leak'
+    assert ServiceCompletion.objects(booking=booking).count() == 1
+
+
+def test_completion_rejects_second_upload(client, auth_headers, in_progress_booking):
+    provider_user, booking = in_progress_booking
+    headers = auth_headers(provider_user)
+    payload = {'booking_id': str(booking.id), 'completion_notes': 'Done'}
+
+    assert client.post('/completion/upload', headers=headers, json=payload).status_code == 200
+    assert client.post('/completion/upload', headers=headers, json=payload).status_code == 400
+    assert ServiceCompletion.objects(booking=booking).count() == 1
+
+
+DATA = b'0123456789abcdefghijXYZ'
+
+
+def put_chunk(client, headers, upload_id, offset, data):
+    return client.put(f'/completion/uploads/{upload_id}', data=data,
+                      headers={**headers, 'Upload-Offset': str(offset)})
+
+
+@pytest.fixture
+def started_upload(client, auth_headers, in_progress_booking):
+    provider_user, booking = in_progress_booking
+    headers = auth_headers(provider_user)
+    response = client.post('/completion/uploads', headers=headers, json={'filename': 'leak.png', 'size': len(DATA)})
+    assert response.status_code == 201, response.get_json()
+    return headers, booking, response.get_json()['upload_id']
+
+
+def test_chunks_resume_from_the_acknowledged_offset(app, client, started_upload):
+    headers, booking, upload_id = started_upload
+
+    assert put_chunk(client, headers, upload_id, 0, DATA[:10]).get_json()['offset'] == 10
+    # A retry of the acknowledged chunk is refused and leaves the file alone
+    retry = put_chunk(client, headers, upload_id, 0, b'x' * 10)
+    assert retry.status_code == 409 and retry.get_json()['offset'] == 10
+    assert client.get(f'/completion/uploads/{upload_id}', headers=headers).get_json()['offset'] == 10
+    assert client.post(f'/completion/uploads/{upload_id}/finalize', headers=headers).status_code == 409
+    assert put_chunk(client, headers, upload_id, 10, DATA[10:] + b'!').status_code == 413
+
+    assert put_chunk(client, headers, upload_id, 10, DATA[10:]).get_json()['offset'] == len(DATA)
+    finalized = client.post(f'/completion/uploads/{upload_id}/finalize', headers=headers).get_json()
+    assert finalized['status'] == 'Finalized'
+    path = os.path.join(app.static_folder, finalized['path'])
+    try:
+        with open(path, 'rb') as f:
+            assert f.read() == DATA
+
+        response = client.post('/completion/upload', headers=headers, json={
+            'booking_id': str(booking.id), 'completion_notes': 'Done', 'upload_ids': [upload_id]})
+        assert response.status_code == 200, response.get_json()
+        assert response.get_json()['images'] == [finalized['path']]
+        assert CompletionUpload.objects(id=upload_id).first().status == 'Attached'
+    finally:
+        os.remove(path)
+
+
+def test_append_waits_for_a_concurrent_claim_at_the_same_offset(app, client, started_upload):
+    headers, _, upload_id = started_upload
+    assert put_chunk(client, headers, upload_id, 0, DATA[:10]).status_code == 200
+    part_path = os.path.join(app.instance_path, 'uploads', f'{upload_id}.part')
+
+    # Another request holds the claim at offset 10 and is copying its chunk
+    CompletionUpload.objects(id=upload_id).update_one(set__append_started_at=datetime.utcnow())
+    response = put_chunk(client, headers, upload_id, 10, b'z' * 13)
+    assert response.status_code == 409 and response.get_json()['offset'] == 10
+    with open(part_path, 'rb') as f:
+        assert f.read() == DATA[:10]
+
+    # An abandoned claim expires
+    CompletionUpload.objects(id=upload_id).update_one(
+        set__append_started_at=datetime.utcnow() - APPEND_CLAIM_TIMEOUT - timedelta(seconds=1))
+    assert put_chunk(client, headers, upload_id, 10, DATA[10:]).get_json()['offset'] == len(DATA)
+    with open(part_path, 'rb') as f:
+        assert f.read() == DATA
+    os.remove(part_path)
+
+
+def test_an_upload_is_attached_to_one_completion_only(client, auth_headers, in_progress_booking):
+    provider_user, booking = in_progress_booking
+    headers = auth_headers(provider_user)
+    other = Booking(user=booking.user, provider=booking.provider, service=booking.service,
+                    status='In Progress', price=300).save()
+    upload = CompletionUpload(owner=provider_user, filename='leak.png', size=1, received=1,
+                              status='Finalized', path='uploads/completions/leak.png').save()
+
+    # A missing upload fails the claim and hands back the one that was claimed
+    missing = client.post('/completion/upload', headers=headers, json={
+        'booking_id': str(other.id), 'upload_ids': [str(upload.id), str(ObjectId())]})
+    assert missing.status_code == 400
+    upload.reload()
+    assert upload.status == 'Finalized' and upload.attached_at is None
+
+    first = client.post('/completion/upload', headers=headers, json={
+        'booking_id': str(booking.id), 'upload_ids': [str(upload.id)]})
+    second = client.post('/completion/upload', headers=headers, json={
+        'booking_id': str(other.id), 'upload_ids': [str(upload.id)]})
+
+    assert first.status_code == 200 and first.get_json()['images'] == [upload.path]
+    assert second.status_code == 400
+    assert other.reload().status == 'In Progress'
+    assert CompletionUpload.objects(id=upload.id).first().status == 'Attached'
+
+
+def test_abandoned_uploads_expire_and_open_uploads_are_capped(app, client, started_upload):
+    headers, _, upload_id = started_upload
+    assert put_chunk(client, headers, upload_id, 0, DATA[:10]).status_code == 200
+    part_path = os.path.join(app.instance_path, 'uploads', f'{upload_id}.part')
+    expiry = timedelta(hours=app.config['UPLOAD_EXPIRY_HOURS'], seconds=1)
+    CompletionUpload.objects(id=upload_id).update_one(set__created_at=datetime.utcnow() - expiry)
+
+    def start():
+        return client.post('/completion/uploads', headers=headers, json={'filename': 'leak.png', 'size': 10})
+
+    assert start().status_code == 201
+    assert CompletionUpload.objects(id=upload_id).first() is None and not os.path.exists(part_path)
+
+    for _ in range(app.config['UPLOAD_MAX_OPEN'] - 1):
+        assert start().status_code == 201
+    refused = start()
+    assert refused.status_code == 429 and refused.get_json()['max_open'] == app.config['UPLOAD_MAX_OPEN']
@@ -0,0 +1,47 @@
+"""
+Tests for MongoDB connection settings and pool statistics
+"""
+from types import SimpleNamespace
+
+from database import HOT_READ_ALIAS, PoolStats, connection_settings
+
+
+def test_settings_come_from_the_environment(monkeypatch):
+    monkeypatch.setenv('MONGODB_URI', 'mongodb://db.internal:27017/hofix')
+    monkeypatch.setenv('MONGO_MAX_POOL_SIZE', '50')
+    monkeypatch.setenv('MONGO_HOT_MAX_POOL_SIZE', '200')
+    monkeypatch.setenv('MONGO_WAIT_QUEUE_TIMEOUT_MS', '2000')
+    monkeypatch.setenv('MONGO_COMPRESSORS', 'zstd,snappy')
+    monkeypatch.setenv('MONGO_WRITE_CONCERN', 'majority')
+    monkeypatch.setenv('MONGO_HOT_READ_PREFERENCE', 'nearest')
+
+    default = connection_settings()
+    hot = connection_settings(HOT_READ_ALIAS)
+
+    assert default['host'] == hot['host'] == 'mongodb://db.internal:27017/hofix'
+    assert (default['maxPoolSize'], hot['maxPoolSize']) == (50, 200)
+    assert default['waitQueueTimeoutMS'] == 2000
+    assert default['compressors'] == 'zstd,snappy'
+    assert default['w'] == 'majority'
+    assert default['read_preference'].mongos_mode == 'primary'
+    assert hot['read_preference'].mongos_mode == 'nearest'
+
+
+def test_pool_stats_track_checkouts():
+    stats = PoolStats('default')
+    event = SimpleNamespace(address=('localhost', 27017), connection_id=1, reason='timeout')
+
+    for _ in range(2):
+        stats.connection_created(event)
+        stats.connection_check_out_started(event)
+        stats.connection_checked_out(event)
+    stats.connection_checked_in(event)
+    stats.connection_check_out_started(event)
+    stats.connection_check_out_failed(event)
+
+    snapshot = stats.snapshot()
+    assert snapshot['open'] == 2
+    assert snapshot['in_use'] == 1
+    assert snapshot['max_in_use'] == 2
+    assert snapshot['checkouts'] == 2
+    assert snapshot['checkout_failures'] == {'timeout': 1}
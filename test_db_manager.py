@@ -0,0 +1,64 @@
+"""
+Tests for db_manager stats
+"""
+import json
+from datetime import datetime
+
+
+def test_stats_breakdowns_cover_every_document(app, capsys, monkeypatch):
+    import rollups
+    from db_manager import collect_stats, show_stats
+    from models import Booking, CacheVersion, Service, User
+
+    with app.app_context():
+        service = Service(name='Cleaner', category='Cleaning', base_price=15.0).save()
+        user = User(name='s', email='stats@example.com', role='user', password_hash='x').save()
+        Booking(user=user, service=service, status='Cancelled').save()
+        # Before the first rollup rebuild bookings are grouped on their status index
+        CacheVersion.objects(name=rollups.ROLLUPS_BUILT).delete()
+        monkeypatch.setattr(rollups, '_built', False)
+
+        stats = collect_stats()
+
+        assert sum(stats['breakdowns']['users_by_role'].values()) == User.objects.count()
+        assert sum(stats['breakdowns']['bookings_by_status'].values()) == Booking.objects.count()
+        assert stats['breakdowns']['bookings_by_status']['Cancelled'] >= 1
+        assert stats['breakdowns']['services_by_category']['Cleaning'] >= 1
+        assert stats['storage']['bookings']['index_bytes'] > 0
+
+        show_stats(as_json=True)
+        assert json.loads(capsys.readouterr().out)['counts']['bookings'] >= 1
+
+
+def test_stats_read_bookings_by_status_from_the_rollups(app):
+    from db_manager import collect_stats
+    from models import Booking, BookingRollup
+    from rollups import rebuild_rollups
+
+    with app.app_context():
+        rebuild_rollups()
+        # A rollup row the bookings do not back shows the breakdown comes from the rollups
+        BookingRollup(day=datetime(2020, 1, 1), category='Stats', status='Disputed', count=2).save()
+        BookingRollup(day=datetime(2020, 1, 1), category='Stats', status='Emptied', count=0).save()
+
+        by_status = collect_stats()['breakdowns']['bookings_by_status']
+
+        assert by_status['Disputed'] == 2 and 'Emptied' not in by_status
+        assert sum(by_status.values()) == Booking.objects.count() + 2
+        BookingRollup.objects(category='Stats').delete()
+
+
+def test_stats_breakdowns_do_not_need_the_indexes(app):
+    from db_manager import _breakdown, _indexed_breakdown
+    from mongoengine.connection import get_db
+
+    with app.app_context():
+        db = get_db()
+        collection = db['stats_without_indexes']
+        collection.drop()
+        collection.insert_many([{'kind': 'a'}, {'kind': 'a'}, {'kind': 'b'}, {}])
+
+        assert _breakdown(_indexed_breakdown(db, 'stats_without_indexes', 'kind')) == {'a': 2, 'b': 1, 'None': 1}
+        collection.create_index('kind')
+        assert _breakdown(_indexed_breakdown(db, 'stats_without_indexes', 'kind')) == {'a': 2, 'b': 1, 'None': 1}
+        collection.drop()
@@ -0,0 +1,44 @@
+"""
+Tests for haversine distances, batch ETAs and the learned speed table
+"""
+from datetime import datetime, timedelta
+
+from eta import haversine_km, eta_batch, eta_cache, learn_speed_table, DEFAULT_SPEED_KMH
+
+
+def test_haversine_is_correct_away_from_the_equator():
+    # One degree of longitude at 60N is half of one at the equator
+    assert 55.5 < haversine_km(60.0, 10.0, 60.0, 11.0) < 55.8
+    assert 111.1 < haversine_km(0.0, 10.0, 0.0, 11.0) < 111.3
+    # Delhi -> Mumbai
+    assert 1140 < haversine_km(28.6139, 77.2090, 19.0760, 72.8777) < 1160
+
+
+def test_eta_batch_matches_single_pairs_and_caches_cells():
+    eta_cache.clear()
+    at = datetime(2024, 1, 1, 6, 30)
+    origins = [(28.61, 77.20), (28.70, 77.10), (28.6101, 77.2001)]
+    destination = (28.55, 77.25)
+
+    results = eta_batch(origins, [destination] * 3, at=at)
+
+    assert [r[0] for r in results] == [round(haversine_km(*o, *destination), 2) for o in origins]
+    assert all(m >= 5 for _, m in results)
+    # The third origin shares the first one's cell
+    assert results[2][1] == results[0][1]
+    hits = eta_cache.hits
+    assert eta_batch(origins, [destination] * 3, at=at) == results
+    assert eta_cache.hits == hits + 3
+    assert eta_batch([], [], at=at) == []
+
+
+def test_learn_speed_table_uses_median_per_hour_and_falls_back():
+    start = datetime(2024, 1, 1, 3, 0)  # 08:30 IST
+    # ~111 m every 20 s is 20 km/h
+    trail = [(28.6 + i * 0.001, 77.2, start + timedelta(seconds=20 * i)) for i in range(40)]
+
+    table = learn_speed_table([trail], min_samples=30)
+
+    assert table['samples'][8] == 39
+    assert 19.5 < table['speeds_kmh'][8] < 20.5
+    assert table['speeds_kmh'][9] == DEFAULT_SPEED_KMH
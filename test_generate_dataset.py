@@ -0,0 +1,65 @@
+"""
+Tests for the synthetic dataset generator (no database needed)
+"""
+from datetime import datetime
+
+from bson import ObjectId
+
+from generate_dataset import DatasetSpec, OPEN_WINDOW
+
+SERVICES = [{'_id': ObjectId(), 'name': name, 'base_price': price}
+            for name, price in [('Electrician', 20.0), ('Plumber', 18.0), ('Cleaner', 15.0), ('Painter', 16.0)]]
+
+
+def spec(services=SERVICES, seed=7):
+    return DatasetSpec(seed, users=500, providers=200, bookings=2000, until=datetime(2026, 1, 1), days=60,
+                       services=services, password_hash='$2b$12$hash')
+
+
+def test_documents_depend_only_on_seed_and_index():
+    a, b = spec(), spec(services=list(reversed(SERVICES)))
+
+    assert a.user_doc(42) == b.user_doc(42)
+    assert a.provider_docs(17) == b.provider_docs(17)
+    assert a.booking_docs(1234) == b.booking_docs(1234)
+    assert spec(seed=8).booking_docs(1234) != a.booking_docs(1234)
+
+
+def test_bookings_reference_accounts_that_exist_and_offer_the_service():
+    s = spec()
+    users = {s.user_id(i): s.user_doc(i) for i in range(s.users)}
+    providers = {p['_id']: (u, p) for u, p in (s.provider_docs(i) for i in range(s.providers))}
+    names = {svc['_id']: svc['name'] for svc in SERVICES}
+
+    for j in range(s.bookings):
+        booking, payment, completion = s.booking_docs(j)
+        user = users[booking['user']]
+        assert user['created_at'] <= booking['created_at'] < s.until
+        assert (booking['location_lat'], booking['location_lon']) == (user['latitude'], user['longitude'])
+        if 'provider' in booking:
+            provider_user, provider = providers[booking['provider']]
+            assert provider_user['created_at'] <= booking['created_at']
+            assert names[booking['service']] in provider['skills']
+        elif booking['status'] != 'Pending':
+            raise AssertionError(f"{booking['status']} booking without a provider")
+        if booking['status'] in ('Pending', 'Accepted', 'In Progress'):
+            assert s.until - booking['created_at'] < OPEN_WINDOW
+        if payment:
+            assert booking['status'] == 'Completed'
+            assert booking['payment'] == payment['_id'] and payment['booking'] == booking['_id']
+            assert payment['amount'] == booking['price']
+        if completion:
+            assert completion['booking'] == booking['_id'] and completion['provider'] == booking['provider']
+
+
+def test_ids_are_unique_across_kinds():
+    s = spec()
+    ids = [s.user_id(i) for i in range(s.users)]
+    for i in range(s.providers):
+        user, provider = s.provider_docs(i)
+        assert user['provider_profile'] == provider['_id'] and provider['user'] == user['_id']
+        ids += [user['_id'], provider['_id']]
+    for j in range(s.bookings):
+        ids += [doc['_id'] for doc in s.booking_docs(j) if doc]
+
+    assert len(ids) == len(set(ids))
@@ -0,0 +1,57 @@
+"""
+Tracking pings are absorbed in memory and flushed as one write per provider
+"""
+import uuid
+from datetime import datetime, timedelta
+
+from location_buffer import LocationBuffer
+from models import User
+
+
+def test_pings_coalesce_into_one_conditional_write(app, mongo_commands):
+    user = User(name='Moving Provider', email=f'moving_{uuid.uuid4().hex[:8]}@test.com',
+                role='provider', password_hash='x').save()
+    buffer = LocationBuffer(flush_interval=3600)
+    mongo_commands.reset()
+
+    for i in range(20):
+        buffer.record(user.id, 28.60 + i / 1000, 77.20)
+    assert mongo_commands.count == 0
+    assert buffer.get(user.id)['lat'] == 28.619
+
+    assert buffer.flush() == 1
+    assert [name for name, _ in mongo_commands.commands] == ['update']
+    user.reload()
+    assert user.latitude == 28.619
+
+    # An older fix never replaces a newer one in memory
+    buffer.record(user.id, 1.0, 1.0, at=datetime.utcnow() - timedelta(hours=1))
+    assert buffer.get(user.id)['lat'] == 28.619
+
+    snapshot = buffer.snapshot()
+    assert snapshot['pings'] == 21 and snapshot['writes'] == 1
+
+
+def test_out_of_order_flushes_keep_the_newest_fix(app):
+    user = User(name='Roaming Provider', email=f'roaming_{uuid.uuid4().hex[:8]}@test.com',
+                role='provider', password_hash='x').save()
+    now = datetime.utcnow().replace(microsecond=0)
+    # Two workers each buffered a fix; the one holding the newer fix flushes first
+    newer, older = LocationBuffer(flush_interval=3600), LocationBuffer(flush_interval=3600)
+    newer.record(user.id, 28.70, 77.10, at=now)
+    older.record(user.id, 1.0, 1.0, at=now - timedelta(seconds=30))
+
+    assert newer.flush() == 1
+    older.flush()
+
+    user.reload()
+    assert (user.latitude, user.longitude, user.location_updated_at) == (28.70, 77.10, now)
+
+    # In the other order the newer fix overwrites the older one
+    older.record(user.id, 2.0, 2.0, at=now + timedelta(seconds=10))
+    newer.record(user.id, 28.80, 77.30, at=now + timedelta(seconds=20))
+    older.flush()
+    newer.flush()
+
+    user.reload()
+    assert (user.latitude, user.longitude) == (28.80, 77.30)
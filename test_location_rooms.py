@@ -0,0 +1,73 @@
+"""
+Provider location events reach only authorized watchers
+"""
+import time
+import uuid
+
+import msgpack
+import pytest
+from flask_jwt_extended import create_access_token
+
+from extensions import socketio
+from models import User, Provider, Service, Booking
+
+
+def _token(app, user):
+    with app.app_context():
+        return create_access_token(identity=str(user.id), additional_claims={'role': user.role, 'name': user.name})
+
+
+@pytest.fixture
+def accepted_booking(app):
+    suffix = uuid.uuid4().hex[:8]
+    provider_user = User(name='Tracked Provider', email=f'tracked_{suffix}@test.com',
+                         role='provider', password_hash='x').save()
+    provider = Provider(user=provider_user, skills=['Plumber']).save()
+    customer = User(name='Customer', email=f'watcher_{suffix}@test.com', role='user', password_hash='x').save()
+    stranger = User(name='Stranger', email=f'stranger_{suffix}@test.com', role='user', password_hash='x').save()
+    service = Service(name='Plumber', category='Plumbing', base_price=18.0).save()
+    booking = Booking(user=customer, provider=provider, service=service, status='Accepted', price=300).save()
+    return provider_user, customer, stranger, booking
+
+
+def test_location_goes_to_watchers_only(app, client, accepted_booking):
+    provider_user, customer, stranger, booking = accepted_booking
+    watcher = socketio.test_client(app, auth={'token': _token(app, customer)})
+    outsider = socketio.test_client(app, auth={'token': _token(app, stranger)})
+    anonymous = socketio.test_client(app)
+
+    assert watcher.emit('track_provider', {'provider_id': str(provider_user.id)}, callback=True)['ok']
+    assert not outsider.emit('track_provider', {'provider_id': str(provider_user.id)}, callback=True)['ok']
+    assert not outsider.emit('join_booking_room', {'booking_id': str(booking.id)}, callback=True)['ok']
+    assert not anonymous.emit('join', {'room': f'booking_{booking.id}'}, callback=True)['ok']
+    for c in (watcher, outsider, anonymous):
+        c.get_received()
+
+    response = client.post('/providers/update-tracking-location', json={'lat': 28.61, 'lon': 77.21},
+                           headers={'Authorization': f'Bearer {_token(app, provider_user)}'})
+    assert response.status_code == 200
+
+    assert [p['name'] for p in watcher.get_received()] == ['provider_location_update']
+    assert outsider.get_received() == []
+    assert anonymous.get_received() == []
+
+
+def test_provider_ping_batches_fixes_over_the_socket(app, accepted_booking):
+    provider_user, customer, stranger, booking = accepted_booking
+    watcher = socketio.test_client(app, auth={'token': _token(app, customer)})
+    device = socketio.test_client(app, auth={'token': _token(app, provider_user)})
+    intruder = socketio.test_client(app, auth={'token': _token(app, stranger)})
+    assert watcher.emit('join_booking_room', {'booking_id': str(booking.id)}, callback=True)['ok']
+    watcher.get_received()
+
+    now = time.time()
+    fixes = [[28.600, 77.200, now - 10], [28.602, 77.201, now - 5], [28.604, 77.202, now]]
+    ack = device.emit('provider_ping', msgpack.packb(fixes), callback=True)
+    assert ack['ok'] and ack['accepted'] == 3
+    assert not device.emit('provider_ping', {'fixes': [{'lat': 95, 'lon': 77}]}, callback=True)['ok']
+    assert not intruder.emit('provider_ping', {'lat': 28.6, 'lon': 77.2}, callback=True)['ok']
+
+    # One broadcast per message, carrying the newest fix
+    updates = [p for p in watcher.get_received() if p['name'] == 'provider_location_update']
+    assert len(updates) == 1
+    assert (updates[0]['args'][0]['lat'], updates[0]['args'][0]['lon']) == (28.604, 77.202)
@@ -0,0 +1,24 @@
+"""
+Tests for trail simplification
+"""
+from location_trail import simplify, distance_m
+
+
+def test_simplify_keeps_corners_and_drops_collinear_points():
+    # North for ~550 m, then east for ~490 m, one fix every ~5 m
+    points = [(28.6 + i * 0.00005, 77.2) for i in range(100)]
+    points += [(28.6 + 99 * 0.00005, 77.2 + i * 0.00005) for i in range(1, 100)]
+
+    simplified = simplify(points, tolerance_m=5)
+
+    assert simplified == [points[0], points[99], points[-1]]
+    assert simplify(points, tolerance_m=0) == points
+
+
+def test_simplify_respects_tolerance():
+    # A 30 m detour survives a 15 m tolerance but not a 50 m one
+    points = [(28.6, 77.2), (28.6 + 0.00027, 77.2005), (28.6, 77.201)]
+    assert 29 < distance_m(28.6, 77.2005, 28.6 + 0.00027, 77.2005) < 31
+
+    assert len(simplify(points, tolerance_m=15)) == 3
+    assert len(simplify(points, tolerance_m=50)) == 2
@@ -0,0 +1,35 @@
+"""
+Tests for the buffered logging filters and handler
+"""
+import logging
+import queue
+
+from logging_config import BufferedHandler, RequestIdFilter, SampleFilter
+
+
+def record(level=logging.DEBUG, lineno=10, msg='event %s', args=('a',), **extra):
+    r = logging.LogRecord('routes.provider', level, 'provider.py', lineno, msg, args, None)
+    r.__dict__.update(extra)
+    return r
+
+
+def test_debug_records_are_sampled_per_call_site():
+    sample = SampleFilter(every=10)
+    kept = [sample.filter(record()) for _ in range(100)]
+    assert sum(kept) == 10
+    assert sum(sample.filter(record(lineno=20, sample_every=50)) for _ in range(100)) == 2
+    assert all(sample.filter(record(level=logging.WARNING)) for _ in range(5))
+
+
+def test_handler_defers_formatting_and_stamps_request_ids():
+    handler = BufferedHandler(queue.Queue(maxsize=2))
+    handler.addFilter(RequestIdFilter())
+    handler.handle(record())
+    handler.handle(record(msg='skills %s', args=(['Plumber'],)))
+    handler.handle(record())
+
+    immutable, mutable = handler.queue.get_nowait(), handler.queue.get_nowait()
+    assert (immutable.msg, immutable.args) == ('event %s', ('a',))
+    assert (mutable.msg, mutable.args) == ("skills ['Plumber']", None)
+    assert immutable.request_id == '-'
+    assert handler.dropped == 1
@@ -0,0 +1,34 @@
+"""
+Tests for request and Mongo command metrics
+"""
+from types import SimpleNamespace
+
+from flask import Flask
+
+from metrics import command_metrics, init_metrics, metrics
+
+
+def test_requests_are_timed_with_their_mongo_commands():
+    app = Flask(__name__)
+    init_metrics(app)
+
+    @app.get('/items')
+    def items():
+        for _ in range(3):
+            command_metrics.succeeded(SimpleNamespace(command_name='find', duration_micros=2000))
+        return {'ok': True}
+
+    metrics.reset()
+    client = app.test_client()
+    client.get('/items')
+    client.get('/missing')
+    command_metrics.failed(SimpleNamespace(command_name='update', duration_micros=500))
+    body = client.get('/metrics').get_data(as_text=True)
+
+    labels = f'worker="{metrics.worker}",endpoint="items",method="GET"'
+    assert f'hofix_http_responses_total{{{labels},status="200"}} 1' in body
+    assert f'hofix_http_request_mongo_commands_bucket{{{labels},le="2"}} 0' in body
+    assert f'hofix_http_request_mongo_commands_bucket{{{labels},le="5"}} 1' in body
+    assert f'hofix_mongo_commands_total{{worker="{metrics.worker}",command="find"}} 3' in body
+    assert f'hofix_mongo_command_failures_total{{worker="{metrics.worker}",command="update"}} 1' in body
+    assert 'endpoint="unmatched",method="GET",status="404"} 1' in body
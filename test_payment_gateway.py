@@ -0,0 +1,102 @@
+"""
+Retries, timeouts and the circuit breaker of the Razorpay gateway adapter, against FakeRazorpayServer
+"""
+import time
+
+import pytest
+import razorpay
+
+from payment_gateway import CircuitBreaker, FakeRazorpayServer, GatewayUnavailable, RazorpayGateway
+
+
+@pytest.fixture
+def server():
+    fake = FakeRazorpayServer().start()
+    yield fake
+    fake.stop()
+
+
+def gateway_for(server, **kwargs):
+    kwargs.setdefault('backoff_base', 0.001)
+    return RazorpayGateway('rzp_test_key', server.key_secret, base_url=server.base_url, **kwargs)
+
+
+def test_server_errors_are_retried(server):
+    gateway = gateway_for(server, max_retries=2)
+    order = gateway.create_order({'amount': 100, 'currency': 'INR', 'receipt': 'r1'})
+    server.requests = 0
+    server.fail_requests = 2
+
+    assert gateway.fetch_order(order['id'])['id'] == order['id']
+    assert server.requests == 3
+    assert gateway.metrics.snapshot()['fetch_order']['retries'] == 2
+
+
+def test_retries_are_bounded(server):
+    gateway = gateway_for(server, max_retries=2)
+    server.fail_requests = 10
+
+    with pytest.raises(GatewayUnavailable):
+        gateway.find_orders_by_receipt('r1')
+    assert server.requests == 3
+
+
+def test_client_errors_are_not_retried(server):
+    gateway = gateway_for(server, max_retries=2, breaker=CircuitBreaker(failure_threshold=1))
+
+    with pytest.raises(razorpay.errors.BadRequestError):
+        gateway.fetch_order('order_missing')
+    assert server.requests == 1
+    assert gateway.breaker.state == 'closed'
+
+
+def test_read_timeouts_retry_reads_but_not_order_creation(server):
+    gateway = gateway_for(server, max_retries=1, read_timeout=0.05)
+    server.latency = 0.2
+
+    with pytest.raises(GatewayUnavailable):
+        gateway.find_orders_by_receipt('r1')
+    assert server.requests == 2
+
+    server.requests = 0
+    with pytest.raises(GatewayUnavailable):
+        gateway.create_order({'amount': 100, 'currency': 'INR', 'receipt': 'r2'})
+    # The order may exist on the gateway, so the POST is not sent again
+    assert server.requests == 1
+
+
+def test_breaker_opens_then_lets_one_probe_through(server):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.1)
+    gateway = gateway_for(server, max_retries=0, breaker=breaker)
+    server.fail_requests = 3
+
+    for _ in range(2):
+        with pytest.raises(GatewayUnavailable):
+            gateway.find_orders_by_receipt('r1')
+    assert breaker.state == 'open'
+    with pytest.raises(GatewayUnavailable, match='circuit is open'):
+        gateway.find_orders_by_receipt('r1')
+    assert server.requests == 2
+    assert gateway.metrics.snapshot()['find_orders']['rejected'] == 1
+
+    # A failed probe opens the circuit again
+    time.sleep(0.15)
+    with pytest.raises(GatewayUnavailable):
+        gateway.find_orders_by_receipt('r1')
+    assert breaker.state == 'open' and server.requests == 3
+
+    # A successful probe closes it
+    time.sleep(0.15)
+    assert gateway.find_orders_by_receipt('r1') == []
+    assert breaker.state == 'closed'
+
+
+def test_half_open_breaker_allows_a_single_probe():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.0)
+    breaker.record_failure()
+
+    assert breaker.allow() is True
+    assert breaker.state == 'half_open'
+    assert breaker.allow() is False
+    breaker.record_success()
+    assert breaker.allow() is True
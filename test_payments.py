@@ -0,0 +1,170 @@
+"""
+Payment state machine: idempotent order creation, webhook dedupe, verification and reconciliation
+"""
+import hashlib
+import hmac
+import json
+import uuid
+
+import pytest
+
+from models import User, Provider, Service, Booking, Payment, PaymentEvent
+from payment_gateway import FakeRazorpayServer, RazorpayGateway, sign_payment
+from payment_reconciliation import reconcile_pending_payments
+
+SECRET = 'test_secret_key'
+
+
+@pytest.fixture
+def fake_gateway(monkeypatch):
+    server = FakeRazorpayServer(key_secret=SECRET).start()
+    gateway = RazorpayGateway('rzp_test_key', SECRET, base_url=server.base_url, max_retries=0)
+    monkeypatch.setattr('payment_gateway._gateway', gateway)
+    yield server, gateway
+    server.stop()
+
+
+@pytest.fixture
+def completed_booking(app):
+    suffix = uuid.uuid4().hex[:8]
+    provider_user = User(name='Pay Provider', email=f'pay_provider_{suffix}@test.com',
+                         role='provider', password_hash='x').save()
+    provider = Provider(user=provider_user, skills=['Plumber']).save()
+    customer = User(name='Pay Customer', email=f'pay_customer_{suffix}@test.com',
+                    role='user', password_hash='x').save()
+    service = Service(name='Plumber', category='Plumbing', base_price=18.0).save()
+    booking = Booking(user=customer, provider=provider, service=service, status='Completed', price=250).save()
+    return customer, booking
+
+
+def create_order(client, headers, booking):
+    return client.post('/payments/razorpay/create-order', headers=headers, json={'booking_id': str(booking.id)})
+
+
+def post_webhook(client, event, event_id):
+    body = json.dumps(event).encode('utf-8')
+    signature = hmac.new(SECRET.encode('utf-8'), body, hashlib.sha256).hexdigest()
+    return client.post('/payments/razorpay/webhook', data=body, content_type='application/json',
+                       headers={'X-Razorpay-Signature': signature, 'X-Razorpay-Event-Id': event_id})
+
+
+def captured_event(order_id, payment_id):
+    return {'event': 'payment.captured', 'payload': {'payment': {'entity': {
+        'id': payment_id, 'order_id': order_id, 'status': 'captured'}}}}
+
+
+def test_order_creation_replays_the_same_order(client, auth_headers, fake_gateway, completed_booking):
+    server, _ = fake_gateway
+    customer, booking = completed_booking
+    headers = auth_headers(customer)
+
+    first = create_order(client, headers, booking)
+    second = create_order(client, headers, booking)
+
+    assert first.status_code == 200, first.get_json()
+    assert first.headers['Idempotent-Replayed'] == 'false'
+    assert second.headers['Idempotent-Replayed'] == 'true'
+    assert second.get_json()['order_id'] == first.get_json()['order_id']
+    assert first.get_json()['amount'] == 25000
+    assert len(server.orders) == 1
+    assert Payment.objects(booking=booking).count() == 1
+
+
+def test_webhook_events_are_applied_once(client, auth_headers, fake_gateway, completed_booking):
+    server, _ = fake_gateway
+    customer, booking = completed_booking
+    order_id = create_order(client, auth_headers(customer), booking).get_json()['order_id']
+    payment_id, _ = server.capture_payment(order_id)
+    event_id = f'evt_{uuid.uuid4().hex[:12]}'
+
+    first = post_webhook(client, captured_event(order_id, payment_id), event_id)
+    replayed = post_webhook(client, captured_event(order_id, payment_id), event_id)
+
+    assert first.get_json() == {'message': 'Event recorded', 'settled': True}
+    assert replayed.get_json() == {'message': 'Event already recorded'}
+    assert PaymentEvent.objects(event_id=event_id).count() == 1
+    payment = Payment.objects(booking=booking).first()
+    assert (payment.status, payment.razorpay_payment_id) == ('Success', payment_id)
+
+    bad = client.post('/payments/razorpay/webhook', data=b'{}', content_type='application/json',
+                      headers={'X-Razorpay-Signature': 'forged'})
+    assert bad.status_code == 400
+
+
+@pytest.mark.parametrize('event', [[1, 2], 'captured', 7, {'event': ['payment.captured']}])
+def test_signed_webhooks_that_are_not_events_are_rejected(client, fake_gateway, event):
+    assert post_webhook(client, event, f'evt_{uuid.uuid4().hex[:12]}').status_code == 400
+
+
+def test_webhook_payload_nesting_that_is_not_an_object_is_recorded_without_settling(client, fake_gateway):
+    event_id = f'evt_{uuid.uuid4().hex[:12]}'
+    event = {'event': 'payment.captured', 'payload': {'payment': ['pay_1']}}
+
+    assert post_webhook(client, event, event_id).get_json() == {'message': 'Event recorded', 'settled': False}
+    record = PaymentEvent.objects(event_id=event_id).first()
+    assert record.razorpay_order_id is None and record.processed_at is not None
+
+
+def test_failed_verification_does_not_undo_a_settled_payment(client, auth_headers, fake_gateway, completed_booking):
+    server, _ = fake_gateway
+    customer, booking = completed_booking
+    headers = auth_headers(customer)
+    created = create_order(client, headers, booking).get_json()
+    payment_id, signature = server.capture_payment(created['order_id'])
+    post_webhook(client, captured_event(created['order_id'], payment_id), f'evt_{uuid.uuid4().hex[:12]}')
+
+    forged = client.post('/payments/razorpay/verify', headers=headers, json={
+        'payment_id': created['payment_id'], 'razorpay_payment_id': payment_id, 'razorpay_signature': 'forged'})
+    assert forged.status_code == 400
+    assert Payment.objects(booking=booking).first().status == 'Success'
+
+    late = client.post('/payments/razorpay/verify', headers=headers, json={
+        'payment_id': created['payment_id'], 'razorpay_payment_id': payment_id, 'razorpay_signature': signature})
+    assert late.status_code == 200 and late.get_json()['status'] == 'Success'
+
+
+def test_verification_settles_a_pending_payment_once(client, auth_headers, fake_gateway, completed_booking):
+    server, _ = fake_gateway
+    customer, booking = completed_booking
+    headers = auth_headers(customer)
+    created = create_order(client, headers, booking).get_json()
+    payment_id, signature = server.capture_payment(created['order_id'])
+    payload = {'payment_id': created['payment_id'], 'razorpay_payment_id': payment_id,
+               'razorpay_signature': signature}
+
+    assert client.post('/payments/razorpay/verify', headers=headers, json=payload).status_code == 200
+    payment = Payment.objects(booking=booking).first()
+    assert (payment.status, payment.razorpay_payment_id) == ('Success', payment_id)
+    assert payment.settled_at is not None
+    assert sign_payment(SECRET, created['order_id'], payment_id) == payment.razorpay_signature
+
+
+def test_reconcile_settles_from_events_then_the_gateway(app, fake_gateway):
+    server, gateway = fake_gateway
+    suffix = uuid.uuid4().hex[:8]
+    customer = User(name='Reconcile Customer', email=f'reconcile_{suffix}@test.com',
+                    role='user', password_hash='x').save()
+    service = Service(name='Cleaner', category='Cleaning', base_price=15.0).save()
+    payments = []
+    for i in range(3):
+        booking = Booking(user=customer, service=service, status='Completed', price=100 + i).save()
+        order_id = gateway.create_order({'amount': 10000 + i, 'currency': 'INR', 'receipt': f'booking_{booking.id}'})['id']
+        payments.append(Payment(booking=booking, amount=100 + i, method='Razorpay', status='Pending',
+                                razorpay_order_id=order_id).save())
+    by_event, by_gateway, unpaid = payments
+    PaymentEvent(event_id=f'evt_{suffix}', event='payment.captured', razorpay_order_id=by_event.razorpay_order_id,
+                 razorpay_payment_id='pay_from_event', payment_status='captured').save()
+    gateway_payment_id, _ = server.capture_payment(by_gateway.razorpay_order_id)
+
+    summary = reconcile_pending_payments(gateway=gateway, page_size=2, log=lambda *_: None)
+
+    assert summary['settled'] == 2
+    for payment in payments:
+        payment.reload()
+    assert (by_event.status, by_event.razorpay_payment_id) == ('Success', 'pay_from_event')
+    assert (by_gateway.status, by_gateway.razorpay_payment_id) == ('Success', gateway_payment_id)
+    assert unpaid.status == 'Pending'
+    assert PaymentEvent.objects(event_id=f'evt_{suffix}').first().processed_at is not None
+
+    # Settled payments are not touched again
+    assert reconcile_pending_payments(gateway=gateway, log=lambda *_: None)['settled'] == 0
@@ -0,0 +1,59 @@
+"""
+Tests for the provider presence registry
+"""
+import time
+
+from presence import PresenceRegistry
+
+
+def test_provider_stays_online_until_last_session_goes():
+    registry = PresenceRegistry(url=None)
+    registry.connect('p1', 'tab-1')
+    registry.connect('p1', 'tab-2')
+    registry.connect('p2', 'phone')
+
+    assert registry.online_among(['p1', 'p2', 'p3']) == {'p1', 'p2'}
+    registry.disconnect('tab-1')
+    assert registry.is_online('p1')
+    registry.disconnect('tab-2')
+    registry.disconnect('tab-2')
+    assert not registry.is_online('p1')
+    assert registry.snapshot()['local_sessions'] == 1
+
+
+def test_silent_sessions_are_swept():
+    registry = PresenceRegistry(url=None, session_ttl=0.05)
+    registry.connect('p1', 'quiet')
+    registry.connect('p2', 'chatty')
+    time.sleep(0.06)
+    assert registry.heartbeat('chatty')
+    assert not registry.heartbeat('unknown')
+
+    assert registry.sweep() == ['p1']
+    assert registry.online_among(['p1', 'p2']) == {'p2'}
+
+
+def test_other_workers_announcements():
+    registry = PresenceRegistry(url=None, sync_interval=0.02)
+    registry.handle({'worker': 'w2', 'full': ['p1', 'p2']})
+    registry.handle({'worker': 'w2', 'down': ['p1'], 'up': ['p3']})
+    registry.handle({'worker': registry.worker_id, 'up': ['p9']})
+    assert registry.online_among(['p1', 'p2', 'p3', 'p9']) == {'p2', 'p3'}
+
+    registry.handle({'worker': 'w3', 'full': ['p4']})
+    registry.handle({'worker': 'w3', 'gone': True})
+    assert not registry.is_online('p4')
+
+    # A worker that stops syncing ages out after three intervals
+    time.sleep(0.07)
+    assert registry.online_among(['p2', 'p3']) == set()
+
+
+def test_quiet_sessions_with_an_open_socket_stay_online():
+    registry = PresenceRegistry(url=None, session_ttl=0.05, is_connected=lambda sid: sid == 'open-tab')
+    registry.connect('p1', 'open-tab')
+    registry.connect('p2', 'lost-disconnect')
+    time.sleep(0.06)
+
+    assert registry.sweep() == ['p2']
+    assert registry.online_among(['p1', 'p2']) == {'p1'}
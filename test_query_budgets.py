@@ -0,0 +1,72 @@
+"""
+Hot read endpoints stay within their @query_budget however many rows they return
+"""
+import uuid
+
+import pytest
+
+from catalog import service_catalog
+from models import User, Provider, Service, Booking, Payment, CompletionUpload
+
+
+@pytest.fixture
+def busy_customer(app):
+    suffix = uuid.uuid4().hex[:8]
+    service = Service(name=f'Plumber {suffix}', category='Plumbing', base_price=18.0).save()
+    service_catalog.invalidate()  # other tests may have cached the catalog without it
+    customer = User(name='Busy Customer', email=f'busy_{suffix}@test.com', role='user', password_hash='x',
+                    latitude=28.60, longitude=77.20).save()
+    providers = []
+    for i in range(5):
+        user = User(name=f'Provider {i}', email=f'p{i}_{suffix}@test.com', role='provider', password_hash='x',
+                    latitude=28.61 + i / 100, longitude=77.21).save()
+        user.provider_profile = Provider(user=user, skills=[service.name]).save()
+        user.save()
+        providers.append(user)
+    for i, provider_user in enumerate(providers * 2):
+        booking = Booking(user=customer, provider=provider_user.provider_profile, service=service, price=100).save()
+        if i % 2:
+            booking.payment = Payment(booking=booking, amount=100, method='Cash', status='Success').save()
+            booking.save()
+    Booking(user=customer, service=service, price=100).save()
+    return customer, providers
+
+
+def test_hot_reads_fit_their_budgets(budgeted_client, auth_headers, busy_customer):
+    customer, providers = busy_customer
+    headers = auth_headers(customer)
+
+    bookings = budgeted_client.get('/bookings/user', headers=headers).get_json()
+    assert len(bookings) == 11
+    assert sum(b['payment_status'] == 'Success' for b in bookings) == 5
+    assert all(b['service_name'] for b in bookings)
+
+    nearby = budgeted_client.get('/providers/nearby?lat=28.6&lon=77.2').get_json()
+    assert {p['name']: p['jobs_count'] for p in nearby if p['name'].startswith('Provider ')} == \
+        {f'Provider {i}': 2 for i in range(5)}
+
+    assignments = budgeted_client.get('/bookings/provider', headers=auth_headers(providers[0])).get_json()
+    assert len(assignments) == 3  # two assigned, one open for the provider's skill
+
+    assert budgeted_client.get(f'/providers/{providers[0].id}/track', headers=headers).status_code == 200
+    assert len(budgeted_client.get('/debug/bookings').get_json()['recent_bookings']) == 10
+    assert budgeted_client.get('/services').status_code == 200
+
+
+def test_completion_with_resumable_uploads_fits_its_budget(budgeted_client, auth_headers, busy_customer):
+    customer, providers = busy_customer
+    provider_user = providers[0]
+    booking = Booking.objects(provider=provider_user.provider_profile).first()
+    booking.update(set__status='In Progress')
+    uploads = [CompletionUpload(owner=provider_user, filename=f'{i}.png', size=3, received=3, status='Finalized',
+                                path=f'uploads/completions/{uuid.uuid4().hex}.png').save() for i in range(3)]
+
+    response = budgeted_client.post('/completion/upload', headers=auth_headers(provider_user), json={
+        'booking_id': str(booking.id),
+        'completion_notes': 'Done',
+        'upload_ids': [str(u.id) for u in uploads],
+    })
+
+    assert response.status_code == 200, response.get_json()
+    assert response.get_json()['images'] == [u.path for u in uploads]
+    assert CompletionUpload.objects(id__in=[u.id for u in uploads], status='Attached').count() == 3
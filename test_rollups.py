@@ -0,0 +1,93 @@
+"""
+Booking rollups: fallback before the first rebuild, and status changes that never go negative
+"""
+import uuid
+from datetime import datetime
+
+import pytest
+
+import rollups
+from models import Booking, BookingRollup, CacheVersion, Service, User
+from rollups import booking_stats, rebuild_rollups, record_booking_created, record_status_change
+
+
+@pytest.fixture
+def category_bookings(app):
+    """Factory of bookings in a category of their own, so stats are not shared with other tests"""
+    suffix = uuid.uuid4().hex[:8]
+    category = f'Rollup {suffix}'
+    service = Service(name=f'Rollup service {suffix}', category=category, base_price=10.0).save()
+    customer = User(name='Rollup Customer', email=f'rollup_{suffix}@test.com', role='user', password_hash='x').save()
+
+    def make(status='Pending', price=100.0, record=True):
+        booking = Booking(user=customer, service=service, status=status, price=price,
+                          created_at=datetime.utcnow()).save()
+        if record:
+            record_booking_created(booking, category)
+        return booking
+
+    return category, make
+
+
+@pytest.fixture
+def unbuilt_rollups(app, monkeypatch):
+    """Rollups as they are right after deploying them, before `db_manager.py rollups`"""
+    CacheVersion.objects(name=rollups.ROLLUPS_BUILT).delete()
+    BookingRollup.objects.delete()
+    monkeypatch.setattr(rollups, '_built', False)
+
+
+def test_stats_group_bookings_until_the_rollups_are_built(unbuilt_rollups, category_bookings):
+    category, make = category_bookings
+    make(price=100.0, record=False)
+    old = make(price=50.0, record=False)
+    # A booking made after deploy, and a status change of an older one, leave partial rollups
+    make(price=25.0)
+    old.update(set__status='Accepted')
+    record_status_change(old, 'Pending', 'Accepted', category)
+
+    assert [row.count for row in BookingRollup.objects(category=category, status='Pending')] == [0]
+    stats = booking_stats(category=category)
+    assert stats['bookings'] == 3 and stats['revenue'] == 175.0
+    assert stats['by_status'] == {'Pending': {'count': 2, 'revenue': 125.0},
+                                  'Accepted': {'count': 1, 'revenue': 50.0}}
+
+    rebuild_rollups()
+    assert rollups.rollups_built()
+    make(price=10.0)
+    stats = booking_stats(category=category)
+    assert stats['bookings'] == 4 and stats['revenue'] == 185.0
+    assert stats['by_status']['Pending'] == {'count': 3, 'revenue': 135.0}
+
+
+def test_status_change_of_an_uncounted_booking_does_not_go_negative(app, category_bookings):
+    category, make = category_bookings
+    rebuild_rollups()
+    counted = make(price=40.0)
+    missed = make(price=60.0, record=False)
+
+    record_status_change(counted, 'Pending', 'Accepted', category)
+    record_status_change(counted, 'Accepted', 'Completed', category)
+    record_status_change(missed, 'Pending', 'Accepted', category)
+
+    rows = {row.status: row.count for row in BookingRollup.objects(category=category)}
+    assert min(rows.values()) >= 0
+    assert booking_stats(category=category)['by_status'] == {
+        'Accepted': {'count': 1, 'revenue': 60.0},
+        'Completed': {'count': 1, 'revenue': 40.0},
+    }
+
+
+def test_clearing_the_database_clears_the_stats(app, category_bookings, monkeypatch):
+    from db_manager import clear_database
+
+    _, make = category_bookings
+    rebuild_rollups()
+    make(price=30.0)
+    assert booking_stats()['bookings'] >= 1
+
+    monkeypatch.setattr('builtins.input', lambda prompt: 'yes')
+    clear_database()
+
+    assert Booking.objects.count() == 0
+    assert booking_stats()['bookings'] == 0 and rollups.rollups_built()
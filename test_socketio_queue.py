@@ -0,0 +1,88 @@
+"""
+Cross-process Socket.IO delivery through the Redis message queue.
+
+Runs against TEST_REDIS_URL and is skipped when no server is reachable there.
+"""
+import os
+import threading
+import time
+import uuid
+
+import pytest
+import socketio as socketio_client
+from flask import Flask
+from flask_socketio import SocketIO, join_room
+from werkzeug.serving import make_server
+
+TEST_REDIS_URL = os.getenv('TEST_REDIS_URL', 'redis://localhost:6379/15')
+
+
+@pytest.fixture
+def redis_client():
+    redis = pytest.importorskip('redis')
+    client = redis.Redis.from_url(TEST_REDIS_URL, socket_connect_timeout=0.5)
+    try:
+        client.ping()
+    except redis.RedisError:
+        pytest.skip(f'Redis not reachable at {TEST_REDIS_URL}')
+    return client
+
+
+def _worker(channel):
+    app = Flask(__name__)
+    server = SocketIO(app, async_mode='threading', message_queue=TEST_REDIS_URL, channel=channel)
+
+    @server.on('join')
+    def on_join(data):
+        join_room(data['room'])
+        return 'joined'
+
+    return app, server
+
+
+@pytest.fixture
+def worker_b_url():
+    """Worker B serving real clients on a random port"""
+    channel = f'hofix-test-{uuid.uuid4().hex}'
+    app, _ = _worker(channel)
+    httpd = make_server('127.0.0.1', 0, app, threaded=True)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{httpd.server_port}', channel
+    httpd.shutdown()
+
+
+def _wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def test_emit_reaches_client_on_another_worker(redis_client, worker_b_url):
+    url, channel = worker_b_url
+    received = []
+    client = socketio_client.Client()
+    client.on('booking_updated', lambda data: received.append(('booking_updated', data)))
+    client.on('payment_updated', lambda data: received.append(('payment_updated', data)))
+    client.connect(url, transports=['polling'])
+    try:
+        assert client.call('join', {'room': 'booking_42'}, timeout=5) == 'joined'
+        # Worker B's listener must be subscribed before anything is published
+        assert _wait_for(lambda: redis_client.pubsub_numsub(channel)[0][1] >= 1)
+
+        app_a, worker_a = _worker(channel)
+        with app_a.app_context():
+            worker_a.emit('booking_updated', {'status': 'Accepted'}, to='booking_42')
+        assert _wait_for(lambda: received)
+        assert received == [('booking_updated', {'status': 'Accepted'})]
+
+        # A write-only emitter (CLI job, background worker) reaches the same client
+        emitter = SocketIO(message_queue=TEST_REDIS_URL, channel=channel)
+        emitter.emit('payment_updated', {'status': 'Success'}, to='booking_42')
+        assert _wait_for(lambda: len(received) == 2)
+        assert received[1] == ('payment_updated', {'status': 'Success'})
+    finally:
+        client.disconnect()
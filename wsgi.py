@@ -0,0 +1,26 @@
+"""
+Production entry point.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+With SOCKETIO_ASYNC_MODE=gevent (the default here) the standard library is
+monkey-patched before anything else is imported, so pymongo, requests and
+the Socket.IO server all cooperate with gevent's event loop.
+"""
+import os
+
+os.environ.setdefault('SOCKETIO_ASYNC_MODE', 'gevent')
+
+if os.environ['SOCKETIO_ASYNC_MODE'] == 'gevent':
+    from gevent import monkey
+    monkey.patch_all()
+
+from app import create_app  # noqa: E402
+from extensions import socketio  # noqa: E402
+
+app = create_app()
+
+
+if __name__ == '__main__':
+    # Single process without gunicorn, e.g. for a quick production-mode check
+    socketio.run(app, host='0.0.0.0', port=int(os.getenv('PORT', 5000)))